@@ -1,4 +1,16 @@
 from expr import *
+from primitives import prim_binary_funcs, prim_other_funcs, impure_prims, \
+                       trapping_prims
+
+import copy
+
+
+# Map from each operation of a ListOp expression to the library routine that
+# runs it on the host.
+list_op_funcs = {'fill': 'std::fill',
+                 'zero': 'memset',
+                 'copy': 'memmove',
+                 'compare': 'memcmp'}
 
 
 class Analyzer:
@@ -7,6 +19,11 @@ class Analyzer:
     def __init__(self, _parsed_exprs):
         self.parsed_exprs = _parsed_exprs  # Type list of Expr's
         self.parallelized = False
+        self._set_names = []   # Names of the variables set anywhere
+        self._list_sizes = {}  # Map from (list name, environment index) to
+                               # the literal size of the list, or None
+        self._size_vars = {}   # Map from (variable name, environment index)
+                               # to the key of the list whose size it holds
 
 
     def __deep_find_calls(self, expr):
@@ -64,6 +81,24 @@ class Analyzer:
             return funcs
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             return [expr.name]
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            # The operation runs as a call to a library routine.
+            funcs = [list_op_funcs[expr.op]]
+            funcs += self.__deep_find_calls(expr.start_index)
+            funcs += self.__deep_find_calls(expr.end_index)
+
+            if expr.val is not None:
+                funcs += self.__deep_find_calls(expr.val)
+
+            return funcs
+        elif expr.exprClass == ExprEnum.SELECT:
+            funcs = self.__deep_find_calls(expr.cond)
+            funcs += self.__deep_find_calls(expr.then_val)
+            funcs += self.__deep_find_calls(expr.else_val)
+
+            return funcs
+        elif expr.exprClass == ExprEnum.BREAK:
+            return []
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -128,6 +163,28 @@ class Analyzer:
             return sets
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             return []
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            # A fill or copy sets the elements from the start index up to the
+            # end index.
+            sets = []
+            if expr.op != 'compare':
+                sets.append((expr.name, expr.start_index))
+
+            sets += self.__deep_find_sets(expr.start_index)
+            sets += self.__deep_find_sets(expr.end_index)
+
+            if expr.val is not None:
+                sets += self.__deep_find_sets(expr.val)
+
+            return sets
+        elif expr.exprClass == ExprEnum.SELECT:
+            sets = self.__deep_find_sets(expr.cond)
+            sets += self.__deep_find_sets(expr.then_val)
+            sets += self.__deep_find_sets(expr.else_val)
+
+            return sets
+        elif expr.exprClass == ExprEnum.BREAK:
+            return []
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -191,6 +248,30 @@ class Analyzer:
             return list_ats
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             return []
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            # A copy or compare reads the elements from the start index up to
+            # the end index.
+            list_ats = []
+            if expr.op == 'compare':
+                list_ats.append((expr.name, expr.start_index))
+            if expr.src is not None:
+                list_ats.append((expr.src, expr.start_index))
+
+            list_ats += self.__deep_find_list_ats(expr.start_index)
+            list_ats += self.__deep_find_list_ats(expr.end_index)
+
+            if expr.val is not None:
+                list_ats += self.__deep_find_list_ats(expr.val)
+
+            return list_ats
+        elif expr.exprClass == ExprEnum.SELECT:
+            list_ats = self.__deep_find_list_ats(expr.cond)
+            list_ats += self.__deep_find_list_ats(expr.then_val)
+            list_ats += self.__deep_find_list_ats(expr.else_val)
+
+            return list_ats
+        elif expr.exprClass == ExprEnum.BREAK:
+            return []
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -275,6 +356,25 @@ class Analyzer:
             used = u1 + u2 + [expr.name]
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             pass
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            (u1, created) = self.__deep_used_not_created(expr.start_index,
+                                                         created)
+            (u2, created) = self.__deep_used_not_created(expr.end_index,
+                                                         created)
+            used = u1 + u2 + [expr.name]
+
+            if expr.src is not None:
+                used.append(expr.src)
+
+            if expr.val is not None:
+                (u3, created) = self.__deep_used_not_created(expr.val, created)
+                used += u3
+        elif expr.exprClass == ExprEnum.SELECT:
+            for e in [expr.cond, expr.then_val, expr.else_val]:
+                (u, created) = self.__deep_used_not_created(e, created)
+                used += u
+        elif expr.exprClass == ExprEnum.BREAK:
+            pass
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -293,6 +393,77 @@ class Analyzer:
         return (used_not_created, created)
 
 
+    def __loop_changed_vars(self, expr):
+        '''
+        Return the names of the variables that are set or created by the loop,
+        including the loop index, and '<name>.size' for each variable created
+        by the loop.
+        '''
+
+        all_sets = self.__deep_find_sets(expr)
+        (_, created) = self.__deep_used_not_created(expr, [])
+
+        return [x[0] for x in all_sets] + created + \
+               [f'{x}.size' for x in created]
+
+
+    def __is_invariant_term(self, expr, changed):
+        '''
+        Return true if the expression has the same value in every iteration of
+        a loop that changes the variables named in 'changed'. The size of a
+        list only changes if the list is created in the loop, in which case
+        '<name>.size' is in 'changed'.
+        '''
+
+        if not self.__is_pure_term(expr):
+            return False
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            return True
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            return expr.name not in changed
+        elif expr.exprClass == ExprEnum.CALL:
+            return all(self.__is_invariant_term(p, changed)
+                       for p in expr.params)
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            return expr.name not in changed and \
+                   self.__is_invariant_term(expr.index, changed)
+
+        return False
+
+
+    def __is_one_to_one_index(self, expr, index_name, changed):
+        '''
+        Return true if the list index expression has a different value for
+        each value of the loop index, such as `index' or `index + offset' where
+        the offset is the same in every iteration. The loop changes the
+        variables named in 'changed'.
+        '''
+
+        if expr.exprClass == ExprEnum.GET_VAR:
+            return expr.name == index_name
+
+        if expr.exprClass != ExprEnum.CALL or len(expr.params) != 2:
+            return False
+
+        (left, right) = expr.params
+
+        if expr.name == '+' or expr.name == '-':
+            if self.__is_one_to_one_index(left, index_name, changed) and \
+               self.__is_invariant_term(right, changed):
+                return True
+
+            return self.__is_one_to_one_index(right, index_name, changed) and \
+                   self.__is_invariant_term(left, changed)
+        elif expr.name == '*':
+            for (scale, other) in [(left, right), (right, left)]:
+                if scale.exprClass == ExprEnum.LITERAL and scale.val != 0 and \
+                   self.__is_one_to_one_index(other, index_name, changed):
+                    return True
+
+        return False
+
+
     def __maybe_parallelize_loop(self, expr):
         '''
         Parallelize the loop expression if it can be, and update
@@ -308,24 +479,21 @@ class Analyzer:
         if 'rand' in self.__deep_find_calls(expr):
             return
 
-        # Determine the number of iterations.
-        index_name = None
-        start_val_expr = None
-        end_val_expr = None
-
-        referenced_variables = []
+        # A fill, copy, or comparison uses a range of list elements in each
+        # iteration, so the iterations are only independent if the user says
+        # so with par_loop.
+        if not expr.trusted and \
+           any([f in list_op_funcs.values()
+                for f in self.__deep_find_calls(expr)]):
+            return
 
         # Get the start expression.
         if expr.init.exprClass != ExprEnum.CREATE_VAR and \
            expr.init.exprClass != ExprEnum.SET_VAR:
             return
-        if expr.init.val.exprClass == ExprEnum.GET_VAR:
-            referenced_variables.append(expr.init.val.name)
-        elif expr.init.val.exprClass != ExprEnum.LITERAL:
-            return
 
-        start_val_expr = expr.init.val
         index_name = expr.init.name
+        init_val_expr = expr.init.val
 
         # Determine the stop criterion.
         if expr.test.exprClass != ExprEnum.CALL:
@@ -351,43 +519,17 @@ class Analyzer:
             else:
                 return inequality
 
-        # The comparison should be between the loop index and either or literal
-        # or a variable. Store the end expression, which is the expression in
-        # the test that does not use the index. The end expression may have to
-        # be updated if the test uses something like '<=' instead of '<'.
-        test_lit_val = None
-        test_vars_names = [None, None]
-        for i in range(2):
-            if expr.test.params[i].exprClass == ExprEnum.LITERAL:
-                if test_lit_val is not None:
-                    # We already read a literal, so the comparison is between
-                    # two literals and isn't worth parallelizing.
-                    return
-
-                test_lit_val = expr.test.params[i].val
-                end_val_expr = expr.test.params[i]
-            elif expr.test.params[i].exprClass == ExprEnum.GET_VAR:
-                test_vars_names[i] = expr.test.params[i].name
-
-                if expr.test.params[i].name is not index_name:
-                    end_val_expr = expr.test.params[i]
-                    referenced_variables.append(expr.test.params[i].name)
-                elif expr.test.params[i].name == index_name and i == 1:
-                    # Flip the inequality so that instead of something like
-                    # `10 > index', we get `index < 10'.
-                    test_call_name = flip_inequality(test_call_name)
-            else:
-                # Something unexpected was found.
-                return
-
-        # Exactly 2 non-None values should be in test_vars_names and
-        # test_lit_val combined.
-        combined = [test_lit_val] + test_vars_names
-        if sum([0 if x is None else 1 for x in combined]) != 2:
-            return
-
-        # The test should involve the index variable.
-        if index_name not in test_vars_names:
+        # The comparison should be between the loop index and a bound. The
+        # bound is checked to be the same in every iteration below.
+        (left, right) = expr.test.params
+        if left.exprClass == ExprEnum.GET_VAR and left.name == index_name:
+            bound_expr = right
+        elif right.exprClass == ExprEnum.GET_VAR and right.name == index_name:
+            # Flip the inequality so that instead of something like
+            # `10 > index', we get `index < 10'.
+            bound_expr = left
+            test_call_name = flip_inequality(test_call_name)
+        else:
             return
 
         # The update should be addition or subtraction of a literal from the
@@ -421,7 +563,7 @@ class Analyzer:
         if update_val is None or update_var_name is None:
             return
 
-        if update_var_name is not index_name:
+        if update_var_name != index_name:
             return
 
         # Make sure the update is not something like i = 1 - i.
@@ -433,38 +575,72 @@ class Analyzer:
         if update_val != 1:
             return
 
-        # TODO: check for infinite loops.
+        # A loop that moves the index away from the bound never ends.
+        if update_call_name == '+' and test_call_name in ['>', '>=']:
+            return
+        if update_call_name == '-' and test_call_name in ['<', '<=']:
+            return
 
-        # Determine the end value expression so that the parallel loop can go
-        # from the start index value (inclusive) to the end index value
-        # (excusive).
-        if test_call_name == '<=' and update_call_name == '+':
-            # Increment end_val_expr.
-            one_expr = Literal(end_val_expr.loc, Type.INT, 1)
-            end_val_expr = Call(end_val_expr.loc, '+', [end_val_expr, one_expr])
-        elif test_call_name == '>=' and update_call_name == '-':
-            # Decrement end_val_expr.
-            one_expr = Literal(end_val_expr.loc, Type.INT, 1)
-            end_val_expr = Call(end_val_expr.loc, '-', [end_val_expr, one_expr])
+        # Determine the start and end value expressions so that the parallel
+        # loop can go from the start index value (inclusive) to the end index
+        # value (exclusive). We want to start the parallelized iterations at the
+        # lowest index, for simplicity.
+        def plus_one(e):
+            call = Call(e.loc, '+', [e, Literal(e.loc, Type.INT, 1)])
+            call.type = Type.INT
+            return call
+
+        if update_call_name == '+':
+            start_val_expr = init_val_expr
+            end_val_expr = bound_expr
+
+            if test_call_name == '<=':
+                end_val_expr = plus_one(bound_expr)
+        else:
+            start_val_expr = bound_expr
+            end_val_expr = plus_one(init_val_expr)
 
-        if update_call_name == '-':
-            # We want to start the parallelized iterations at the lowest index,
-            # for simplicity.
-            tmp = start_val_expr
-            start_val_expr = end_val_expr
-            end_val_expr = tmp
+            if test_call_name != '>=':
+                start_val_expr = plus_one(bound_expr)
+
+        # The bound is evaluated once before the parallelized iterations, so it
+        # must have the same value in every iteration. The start value is also
+        # evaluated once, so it only needs to not have side effects.
+        if not self.__is_invariant_term(bound_expr,
+                                        self.__loop_changed_vars(expr)):
+            return
+
+        if not self.__is_pure_term(init_val_expr):
+            return
+
+        referenced_variables = []
+        for e in [start_val_expr, end_val_expr]:
+            (used, _) = self.__deep_used_not_created(e, [])
+            referenced_variables += used
 
         # Make sure the index is not set inside the loop.
         all_sets = []
         for e in expr.body:
             all_sets += self.__deep_find_sets(e)
 
-        if index_name in all_sets:
+        if index_name in [s[0] for s in all_sets]:
             return
 
-        all_list_sets = filter(lambda x : x[1] is not None, all_sets)
+        all_list_sets = [x for x in all_sets if x[1] is not None]
         all_list_ats = self.__deep_find_list_ats(expr);
 
+        # The list rules below are skipped for a par_loop, where the user has
+        # stated that the iterations are independent.
+        if expr.trusted:
+            all_list_sets = []
+
+        # Different iterations must set different elements of a list, so the
+        # index of each list_set must change whenever the loop index changes.
+        changed = self.__loop_changed_vars(expr)
+        for (_, index_expr) in all_list_sets:
+            if not self.__is_one_to_one_index(index_expr, index_name, changed):
+                return
+
         # Check for list setting patterns that indicate the loop may not be
         # correct if parallelized.
         for (name1, index_expr1) in all_list_sets:
@@ -487,6 +663,11 @@ class Analyzer:
         # loop, then the loop cannot be parallelized (yet) due to
         # synchronization issues.
         (used_variables, _) = self.__deep_used_not_created(expr, [])
+
+        # The kernel creates its own index variable.
+        if index_name in used_variables:
+            used_variables.remove(index_name)
+
         for x in used_variables:
             if x in [s[0] for s in all_sets]:
                 x_type = expr.env.lookup_variable(expr.loc, x)
@@ -502,17 +683,829 @@ class Analyzer:
             if var not in used_variables:
                 used_variables.append(var)
 
-        # An expression was parallelized.
-        self.parallelized = True
-
         # Create the parallelized loop expression.
+        written_lists = []
+        for (name, index_expr) in all_sets:
+            if index_expr is not None and name not in written_lists:
+                written_lists.append(name)
+
         parallel_loop = ParallelLoop(expr.loc, index_name, start_val_expr,
-                                     end_val_expr, used_variables, expr.body)
+                                     end_val_expr, used_variables,
+                                     written_lists, expr.body)
         parallel_loop.env = expr.env
 
         return parallel_loop
 
 
+    def __counted_loop_bounds(self, expr):
+        '''
+        Return a tuple (index name, start expression, end expression) if the
+        loop creates an index that counts up by one from the start expression
+        (inclusive) to the end expression (exclusive), where the end has the
+        same value in every iteration. Otherwise, return None.
+        '''
+
+        if expr.init.exprClass != ExprEnum.CREATE_VAR:
+            return None
+
+        index_name = expr.init.name
+        start_val_expr = expr.init.val
+        changed = self.__loop_changed_vars(expr)
+
+        def is_bound(e):
+            if e.exprClass == ExprEnum.GET_VAR and e.name == index_name:
+                return False
+
+            return self.__is_invariant_term(e, changed)
+
+        if not self.__is_pure_term(start_val_expr):
+            return None
+
+        # The test should compare the index to the end, such as `index < end'
+        # or `end > index'.
+        if expr.test.exprClass != ExprEnum.CALL or len(expr.test.params) != 2:
+            return None
+
+        (index_expr, end_val_expr) = expr.test.params
+        test_call_name = expr.test.name
+
+        if end_val_expr.exprClass == ExprEnum.GET_VAR and \
+           end_val_expr.name == index_name:
+            (index_expr, end_val_expr) = (end_val_expr, index_expr)
+            flipped = {'>': '<', '>=': '<=', '<': '>', '<=': '>='}
+            test_call_name = flipped.get(test_call_name)
+
+        if test_call_name not in ['<', '<=']:
+            return None
+
+        if index_expr.exprClass != ExprEnum.GET_VAR or \
+           index_expr.name != index_name or not is_bound(end_val_expr):
+            return None
+
+        if test_call_name == '<=':
+            one_expr = Literal(end_val_expr.loc, Type.INT, 1)
+            end_val_expr = Call(end_val_expr.loc, '+', [end_val_expr, one_expr])
+
+        # The update should add one to the index.
+        update = expr.update
+        if update.exprClass != ExprEnum.SET_VAR or update.name != index_name:
+            return None
+
+        if update.val.exprClass != ExprEnum.CALL or update.val.name != '+':
+            return None
+
+        names = [e.name for e in update.val.params
+                 if e.exprClass == ExprEnum.GET_VAR]
+        vals = [e.val for e in update.val.params
+                if e.exprClass == ExprEnum.LITERAL]
+
+        if names != [index_name] or vals != [1]:
+            return None
+
+        return (index_name, start_val_expr, end_val_expr)
+
+
+    def __substitute_vals(self, expr, vals):
+        '''
+        Return a copy of the expression where each read of a variable in the
+        'vals' dictionary is replaced by the variable's value. Return None if
+        the expression is not made up of only literals, variable reads, list
+        reads, and calls.
+        '''
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            return expr
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            return vals.get(expr.name, expr)
+        elif expr.exprClass == ExprEnum.CALL:
+            params = [self.__substitute_vals(p, vals) for p in expr.params]
+            if None in params:
+                return None
+
+            call = Call(expr.loc, expr.name, params)
+            call.type = expr.type
+            return call
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            index = self.__substitute_vals(expr.index, vals)
+            if index is None:
+                return None
+
+            list_at = ListAt(expr.loc, expr.name, index)
+            list_at.type = expr.type
+            return list_at
+
+        return None
+
+
+    def __reads_list(self, expr, list_name):
+        ''' Return true if the expression reads an element of the list. '''
+
+        return list_name in [name for (name, _) in
+                             self.__deep_find_list_ats(expr)]
+
+
+    def __previous_offset(self, expr, list_name, index_name):
+        '''
+        Return k if the expression reads the element `index - k' of the list,
+        where k is a positive literal. Otherwise, return None.
+        '''
+
+        if expr.exprClass != ExprEnum.LIST_AT or expr.name != list_name:
+            return None
+
+        index = expr.index
+        if index.exprClass != ExprEnum.CALL or index.name != '-':
+            return None
+
+        (var, lit) = index.params
+        if var.exprClass != ExprEnum.GET_VAR or var.name != index_name:
+            return None
+
+        if lit.exprClass != ExprEnum.LITERAL or lit.type != Type.INT or \
+           lit.val <= 0:
+            return None
+
+        return lit.val
+
+
+    def __match_op_update(self, val, list_name, is_old):
+        '''
+        Match `list[i] = old op term' where 'op' is associative and commutative,
+        is_old(old) is true, and the term does not read the list. Return a
+        tuple (op name, term, None) or None if the value does not match.
+        '''
+
+        if val.exprClass != ExprEnum.CALL or \
+           val.name not in ['+', '-', '*', 'and', 'or', 'xor']:
+            return None
+
+        (left, right) = val.params
+        op_names = {'+': 'add', '*': 'mul', 'and': 'and', 'or': 'or',
+                    'xor': 'xor'}
+
+        if is_old(left) and not self.__reads_list(right, list_name):
+            if val.name == '-':
+                # Subtracting each term is the same as adding its negation.
+                zero = Literal(right.loc, Type.INT, 0)
+                return ('add', Call(right.loc, '-', [zero, right]), None)
+
+            return (op_names[val.name], right, None)
+
+        if val.name != '-' and is_old(right) and \
+           not self.__reads_list(left, list_name):
+            return (op_names[val.name], left, None)
+
+        return None
+
+
+    def __match_select_update(self, cond, then_val, else_val, list_name,
+                              is_old):
+        '''
+        Match a minimum or maximum, such as
+        `list[i] = (term < old) ? term : old' where is_old(old) is true and the
+        term does not read the list. Return a tuple (op name, term, None) or
+        None if the values do not match.
+        '''
+
+        if cond.exprClass != ExprEnum.CALL or \
+           cond.name not in ['<', '<=', '>', '>=']:
+            return None
+
+        (left, right) = cond.params
+        less = cond.name in ['<', '<=']
+
+        if Expr.equal(then_val, left) and Expr.equal(else_val, right):
+            op = 'min' if less else 'max'
+        elif Expr.equal(then_val, right) and Expr.equal(else_val, left):
+            op = 'max' if less else 'min'
+        else:
+            return None
+
+        for (old, term) in [(left, right), (right, left)]:
+            if is_old(old) and not self.__reads_list(term, list_name):
+                return (op, term, None)
+
+        return None
+
+
+    def __substituted_update(self, expr, index_name):
+        '''
+        Match a loop body made of val expressions followed by either a single
+        list_set or an if whose branches are each a single list_set of the same
+        list. Return a tuple (list name, list of (index, value) tuples for each
+        list_set, condition of the if or None), where the variables created by
+        the val expressions are replaced by their values. Return None if the
+        body does not have that form.
+        '''
+
+        if len(expr.body) == 0:
+            return None
+
+        vals = {}
+        for e in expr.body[:-1]:
+            if e.exprClass != ExprEnum.CREATE_VAR or e.name == index_name:
+                return None
+
+            val = self.__substitute_vals(e.val, vals)
+            if val is None:
+                return None
+
+            vals[e.name] = val
+
+        last = expr.body[-1]
+        cond = None
+        if last.exprClass == ExprEnum.LIST_SET:
+            sets = [last]
+        elif last.exprClass == ExprEnum.IF and len(last.then) == 1 and \
+             len(last.otherwise) == 1:
+            sets = last.then + last.otherwise
+            cond = self.__substitute_vals(last.cond, vals)
+            if cond is None:
+                return None
+        else:
+            return None
+
+        list_name = sets[0].name
+        updates = []
+        for e in sets:
+            if e.exprClass != ExprEnum.LIST_SET or e.name != list_name:
+                return None
+
+            index = self.__substitute_vals(e.index, vals)
+            val = self.__substitute_vals(e.val, vals)
+            if index is None or val is None:
+                return None
+
+            updates.append((index, val))
+
+        if expr.env.lookup_variable(expr.loc, list_name) != Type.LIST_INT:
+            return None
+
+        return (list_name, updates, cond)
+
+
+    def __match_update(self, update, list_name, is_old):
+        '''
+        Match the updates returned by __substituted_update() against the
+        patterns that combine the old value of the list element with a term.
+        Return a tuple (op name, term, None) or None if nothing matches.
+        '''
+
+        (_, updates, cond) = update
+
+        if cond is None:
+            return self.__match_op_update(updates[0][1], list_name, is_old)
+
+        return self.__match_select_update(cond, updates[0][1], updates[1][1],
+                                          list_name, is_old)
+
+
+    def __is_pure_term(self, expr):
+        '''
+        Return true if the expression only calls primitive functions that have
+        no side effects, so it can be evaluated in parallel.
+        '''
+
+        for name in self.__deep_find_calls(expr):
+            if name not in prim_binary_funcs and name not in prim_other_funcs:
+                return False
+            if name in impure_prims:
+                return False
+
+        return True
+
+
+    def __used_vars(self, exprs, index_name, loop):
+        '''
+        Return the names of the variables used by the expressions, other than
+        the loop index, or None if one of them is a string.
+        '''
+
+        used_variables = []
+        for e in exprs:
+            (used, _) = self.__deep_used_not_created(e, [index_name])
+
+            for var in used:
+                if var not in used_variables:
+                    used_variables.append(var)
+
+        for var in used_variables:
+            var_type = loop.env.lookup_variable(loop.loc, var)
+            if var_type == Type.STRING or var_type == Type.LIST_STRING:
+                return None
+
+        return used_variables
+
+
+    def __linear_terms(self, expr, list_name, index_name):
+        '''
+        Split the expression into the sum
+        `c1 * list[index - 1] + c2 * list[index - 2] + rest', where c1 and c2
+        are literals and 'rest' does not read the list. Return a tuple
+        ([c1, c2], list of expressions summing to 'rest') or None if the
+        expression does not have that form.
+        '''
+
+        offset = self.__previous_offset(expr, list_name, index_name)
+        if offset is not None:
+            if offset > 2:
+                return None
+
+            coeffs = [0, 0]
+            coeffs[offset - 1] = 1
+            return (coeffs, [])
+
+        if not self.__reads_list(expr, list_name):
+            return ([0, 0], [expr])
+
+        if expr.exprClass != ExprEnum.CALL:
+            return None
+
+        if expr.name == '+' or expr.name == '-':
+            left = self.__linear_terms(expr.params[0], list_name, index_name)
+            right = self.__linear_terms(expr.params[1], list_name, index_name)
+            if left is None or right is None:
+                return None
+
+            if expr.name == '+':
+                coeffs = [a + b for (a, b) in zip(left[0], right[0])]
+                return (coeffs, left[1] + right[1])
+
+            coeffs = [a - b for (a, b) in zip(left[0], right[0])]
+            negated = [Call(e.loc, '-', [Literal(e.loc, Type.INT, 0), e])
+                       for e in right[1]]
+            return (coeffs, left[1] + negated)
+
+        if expr.name == '*':
+            (left, right) = expr.params
+            for (scale, other) in [(left, right), (right, left)]:
+                if scale.exprClass != ExprEnum.LITERAL:
+                    continue
+
+                terms = self.__linear_terms(other, list_name, index_name)
+                if terms is None:
+                    return None
+
+                scaled = [Call(e.loc, '*', [scale, e]) for e in terms[1]]
+                return ([scale.val * c for c in terms[0]], scaled)
+
+        return None
+
+
+    def __match_linear_recurrence(self, val, list_name, index_name):
+        '''
+        Match `list[index] = c1 * list[index - 1] + c2 * list[index - 2] + term'
+        where c1 and c2 are literals and the term does not read the list. Such a
+        recurrence is a running product of 3x3 matrices. Return a tuple
+        ('linear', term, [c1, c2]) or None if the value does not match.
+        '''
+
+        terms = self.__linear_terms(val, list_name, index_name)
+        if terms is None:
+            return None
+
+        (coeffs, rest) = terms
+        if coeffs == [0, 0]:
+            return None
+
+        term = None
+        for e in rest:
+            term = e if term is None else Call(e.loc, '+', [term, e])
+
+        return ('linear', term, coeffs)
+
+
+    def __maybe_scan_loop(self, expr):
+        '''
+        Turn the loop into a Scan expression if each iteration only sets
+        `list[index]' from the previous elements of the same list with a
+        recurrence that can be computed by a parallel scan, such as a prefix
+        sum, a running maximum, or a linear recurrence like the Fibonacci
+        numbers. Return None if the loop is not such a recurrence.
+        '''
+
+        if expr.no_para:
+            return None
+
+        bounds = self.__counted_loop_bounds(expr)
+        if bounds is None:
+            return None
+
+        (index_name, start_val_expr, end_val_expr) = bounds
+
+        # Substitute the variables created in the body into the final list_set
+        # so that the recurrence is a single expression.
+        update = self.__substituted_update(expr, index_name)
+        if update is None:
+            return None
+
+        (list_name, updates, cond) = update
+        for (index, _) in updates:
+            if index.exprClass != ExprEnum.GET_VAR or index.name != index_name:
+                return None
+
+        def is_previous(e):
+            return self.__previous_offset(e, list_name, index_name) == 1
+
+        match = self.__match_update(update, list_name, is_previous)
+        if match is None and cond is None:
+            match = self.__match_linear_recurrence(updates[0][1], list_name,
+                                                   index_name)
+
+        if match is None:
+            return None
+
+        (op, term, coeffs) = match
+
+        # The terms are computed in parallel, so they must not have side
+        # effects.
+        terms = [] if term is None else [term]
+        if term is not None and not self.__is_pure_term(term):
+            return None
+
+        used_variables = self.__used_vars(terms, index_name, expr)
+        if used_variables is None:
+            return None
+
+        scan = Scan(expr.loc, index_name, start_val_expr, end_val_expr,
+                    list_name, op, term, coeffs, used_variables)
+        scan.env = expr.env
+
+        return scan
+
+
+    def __maybe_scatter_loop(self, expr):
+        '''
+        Turn the loop into a ScatterLoop expression if each iteration only
+        combines a term into one element of a list with a commutative
+        operation, such as `hist[key[i]] = hist[key[i]] + 1'. The iterations
+        can then run in parallel as long as the updates are atomic. Return
+        None if the loop is not such an update.
+        '''
+
+        if expr.no_para:
+            return None
+
+        bounds = self.__counted_loop_bounds(expr)
+        if bounds is None:
+            return None
+
+        (index_name, start_val_expr, end_val_expr) = bounds
+
+        update = self.__substituted_update(expr, index_name)
+        if update is None:
+            return None
+
+        (list_name, updates, _) = update
+        key = updates[0][0]
+        for (index, _) in updates:
+            if not Expr.equal(index, key):
+                return None
+
+        def is_old(e):
+            return e.exprClass == ExprEnum.LIST_AT and e.name == list_name \
+                   and Expr.equal(e.index, key)
+
+        match = self.__match_update(update, list_name, is_old)
+        if match is None:
+            return None
+
+        (op, term, _) = match
+
+        # The key and term are computed in parallel, so they must not have
+        # side effects or depend on the list being updated.
+        if self.__reads_list(key, list_name):
+            return None
+
+        if not self.__is_pure_term(key) or not self.__is_pure_term(term):
+            return None
+
+        used_variables = self.__used_vars([key, term], index_name, expr)
+        if used_variables is None:
+            return None
+
+        if list_name not in used_variables:
+            used_variables.append(list_name)
+
+        scatter_loop = ScatterLoop(expr.loc, index_name, start_val_expr,
+                                   end_val_expr, list_name, key, op, term,
+                                   used_variables)
+        scatter_loop.env = expr.env
+
+        return scatter_loop
+
+
+    def __breaks_loop(self, expr):
+        '''
+        Return true if the statement contains a Break that leaves the loop
+        the statement is in, rather than a loop nested in the statement.
+        '''
+
+        if expr.exprClass == ExprEnum.BREAK:
+            return True
+        elif expr.exprClass == ExprEnum.IF:
+            return any([self.__breaks_loop(e)
+                        for e in expr.then + expr.otherwise])
+
+        return False
+
+
+    def __maybe_find_loop(self, expr):
+        '''
+        Turn the loop into a FindLoop expression if it searches for the first
+        index where a condition holds: the body must be some variables created
+        with values without side effects, followed by an If that breaks out of
+        the loop when the condition holds and does nothing otherwise. The If
+        may run other statements before the break, which then run once for
+        the first index found. Return None if the loop is not such a search.
+        '''
+
+        if expr.no_para or len(expr.body) == 0:
+            return None
+
+        bounds = self.__counted_loop_bounds(expr)
+        if bounds is None:
+            return None
+
+        (index_name, start_val_expr, end_val_expr) = bounds
+
+        # Every iteration up to the one that breaks out only computes values,
+        # so they can all run at once.
+        body = expr.body[:-1]
+        for e in body:
+            if e.exprClass != ExprEnum.CREATE_VAR or e.name == index_name or \
+               not self.__is_pure_term(e.val):
+                return None
+
+        last = expr.body[-1]
+        if last.exprClass != ExprEnum.IF or len(last.otherwise) != 0 or \
+           len(last.then) == 0 or last.then[-1].exprClass != ExprEnum.BREAK:
+            return None
+
+        found = last.then[:-1]
+        if any([self.__breaks_loop(e) for e in found]):
+            return None
+
+        if not self.__is_pure_term(last.cond):
+            return None
+
+        # The indices after the one that breaks out are tested too, so the
+        # tests must not crash for them.
+        if not all([self.__cannot_trap(e, expr, bounds)
+                    for e in [v.val for v in body] + [last.cond]]):
+            return None
+
+        # The kernel only needs the variables used to test each index.
+        used_variables = []
+        created = [index_name]
+        for e in body + [last.cond]:
+            (used, created) = self.__deep_used_not_created(e, created)
+
+            for x in used:
+                if x not in created and x not in used_variables:
+                    used_variables.append(x)
+
+        for x in used_variables:
+            x_type = expr.env.lookup_variable(expr.loc, x)
+            if x_type not in [Type.INT, Type.FLOAT, Type.LIST_INT,
+                              Type.LIST_FLOAT]:
+                return None
+
+        find_loop = FindLoop(expr.loc, index_name, start_val_expr,
+                             end_val_expr, used_variables, body, last.cond,
+                             found)
+        find_loop.env = expr.env
+
+        return find_loop
+
+
+    def __size_of(self, expr, env):
+        '''
+        Return the (list name, environment index) key of the list whose size
+        the expression reads, either directly or through a variable that is
+        never set, or None if it does not read the size of a list that is
+        never set to another list.
+        '''
+
+        if expr.exprClass != ExprEnum.GET_VAR:
+            return None
+
+        if expr.name.endswith('.size'):
+            name = expr.name[:-len('.size')]
+            if name in self._set_names:
+                return None
+
+            return (name, env.get_index_for_name(name))
+
+        return self._size_vars.get((expr.name,
+                                    env.get_index_for_name(expr.name)))
+
+
+    def __cannot_trap(self, expr, loop, bounds):
+        '''
+        Return true if evaluating the expression for any index of the loop
+        cannot crash the program: it only divides by literals other than zero,
+        and only reads list elements at the loop index when the loop counts
+        from a literal that is not negative to the size of the list. 'bounds'
+        is the tuple returned by __counted_loop_bounds() for the loop.
+        '''
+
+        (index_name, start_val_expr, end_val_expr) = bounds
+
+        if expr.exprClass == ExprEnum.LITERAL or \
+           expr.exprClass == ExprEnum.GET_VAR:
+            return True
+        elif expr.exprClass == ExprEnum.CALL:
+            if expr.name in trapping_prims:
+                divisor = expr.params[1]
+                if divisor.exprClass != ExprEnum.LITERAL or divisor.val == 0:
+                    return False
+
+            return all([self.__cannot_trap(p, loop, bounds)
+                        for p in expr.params])
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            if expr.index.exprClass != ExprEnum.GET_VAR or \
+               expr.index.name != index_name or \
+               start_val_expr.exprClass != ExprEnum.LITERAL or \
+               start_val_expr.val < 0:
+                return False
+
+            if loop.env is None:
+                return False
+
+            key = (expr.name, loop.env.get_index_for_name(expr.name))
+            if end_val_expr.exprClass == ExprEnum.GET_VAR:
+                return self.__size_of(end_val_expr, loop.env) == key
+
+            size = self._list_sizes.get(key)
+            return end_val_expr.exprClass == ExprEnum.LITERAL and \
+                   size is not None and end_val_expr.val <= size
+
+        return False
+
+
+    def __match_list_op(self, expr):
+        '''
+        Return a ListOp expression that does the same as the loop if each
+        iteration only sets `list[index]' to a value that is the same in every
+        iteration, copies `other[index]' into `list[index]', or, for int
+        lists, runs the same variable sets whenever `list[index]' and
+        `other[index]' differ. Return None if the loop is not one of these.
+        '''
+
+        if expr.trusted:
+            return None
+
+        bounds = self.__counted_loop_bounds(expr)
+        if bounds is None:
+            return None
+
+        (index_name, start_val_expr, end_val_expr) = bounds
+
+        def is_index(e):
+            return e.exprClass == ExprEnum.GET_VAR and e.name == index_name
+
+        def is_elem(e):
+            return e.exprClass == ExprEnum.LIST_AT and is_index(e.index)
+
+        # A value that is the same in every iteration. It is computed once
+        # even if the loop does not run, so it may not divide.
+        def is_invariant(e):
+            return self.__is_pure_term(e) and \
+                   len(self.__deep_find_list_ats(e)) == 0 and \
+                   index_name not in self.__deep_used_not_created(e, [])[0] and \
+                   all([f not in trapping_prims
+                        for f in self.__deep_find_calls(e)])
+
+        def plus(e, offset):
+            if offset is None:
+                return e
+
+            call = Call(e.loc, '+', [e, offset])
+            call.type = Type.INT
+            call.env = expr.env
+            return call
+
+        # Substitute the variables created in the body into the last
+        # expression.
+        vals = {}
+        for e in expr.body[:-1]:
+            if e.exprClass != ExprEnum.CREATE_VAR or e.name == index_name:
+                return None
+
+            val = self.__substitute_vals(e.val, vals)
+            if val is None:
+                return None
+
+            vals[e.name] = val
+
+        if len(expr.body) == 0:
+            return None
+
+        last = expr.body[-1]
+        list_op = None
+
+        if last.exprClass == ExprEnum.LIST_SET:
+            index = self.__substitute_vals(last.index, vals)
+            val = self.__substitute_vals(last.val, vals)
+            if index is None or val is None:
+                return None
+
+            # A fill may set the elements after an offset, like a row of a
+            # list used as a matrix.
+            offset = None
+            if not is_index(index):
+                if index.exprClass != ExprEnum.CALL or index.name != '+' or \
+                   len(index.params) != 2:
+                    return None
+
+                (first, second) = index.params
+                if is_index(second):
+                    (first, second) = (second, first)
+                if not is_index(first) or not is_invariant(second):
+                    return None
+
+                offset = second
+
+            list_type = expr.env.lookup_variable(expr.loc, last.name)
+            if list_type not in [Type.LIST_INT, Type.LIST_FLOAT]:
+                return None
+
+            if is_elem(val) and val.name != last.name and offset is None:
+                list_op = ListOp(expr.loc, 'copy', start_val_expr,
+                                 end_val_expr, last.name, val.name, None)
+            elif is_invariant(val):
+                op = 'fill'
+                if val.exprClass == ExprEnum.LITERAL and val.val == 0:
+                    op = 'zero'
+
+                list_op = ListOp(expr.loc, op, plus(start_val_expr, offset),
+                                 plus(end_val_expr, copy.deepcopy(offset)),
+                                 last.name, None, val)
+        elif last.exprClass == ExprEnum.IF and len(vals) == 0:
+            cond = last.cond
+            if cond.exprClass != ExprEnum.CALL or \
+               cond.name not in ['!=', '=='] or \
+               not all([is_elem(p) for p in cond.params]):
+                return None
+
+            (first, second) = [p.name for p in cond.params]
+            for name in [first, second]:
+                if expr.env.lookup_variable(expr.loc, name) != Type.LIST_INT:
+                    return None
+
+            # The branch that runs when the elements differ may only set
+            # variables to literals, so running it once is the same as
+            # running it for each element that differs.
+            (differ, same) = (last.then, last.otherwise)
+            if cond.name == '==':
+                (differ, same) = (same, differ)
+
+            if len(same) != 0:
+                return None
+
+            # Breaking out at the first element that differs gives the same
+            # result as running the branch for each such element.
+            if len(differ) > 0 and differ[-1].exprClass == ExprEnum.BREAK:
+                differ = differ[:-1]
+
+            for e in differ:
+                if e.exprClass != ExprEnum.SET_VAR or \
+                   e.name == index_name or \
+                   e.val.exprClass != ExprEnum.LITERAL:
+                    return None
+
+            compare = ListOp(expr.loc, 'compare', start_val_expr,
+                             end_val_expr, first, second, None)
+            compare.env = expr.env
+            list_op = If(last.loc, compare, differ, [])
+
+        if list_op is not None:
+            list_op.env = expr.env
+
+        return list_op
+
+
+    def __recognize_idioms(self, body):
+        '''
+        Replace each loop in the body, or nested in it, that fills, copies, or
+        compares a range of list elements by a ListOp expression.
+        '''
+
+        for (i, e) in enumerate(body):
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__recognize_idioms(e.body)
+            elif e.exprClass == ExprEnum.IF:
+                self.__recognize_idioms(e.then)
+                self.__recognize_idioms(e.otherwise)
+            elif e.exprClass == ExprEnum.LOOP:
+                self.__recognize_idioms(e.body)
+
+                list_op = self.__match_list_op(e)
+                if list_op is not None:
+                    body[i] = list_op
+
+
     def __deep_analyze_expr(self, expr):
         '''
         Try to parallelize the expression and any subexpressions.
@@ -525,8 +1518,18 @@ class Analyzer:
             pass
         elif expr.exprClass == ExprEnum.CREATE_VAR:
             expr.val = self.__deep_analyze_expr(expr.val)
+
+            # Remember variables that hold the size of a list, like the ones
+            # the optimizer moves out of loops.
+            if expr.env is not None:
+                key = (expr.name, expr.env.get_index_for_name(expr.name))
+                if expr.name not in self._set_names:
+                    self._size_vars[key] = self.__size_of(expr.val, expr.env)
+                else:
+                    self._size_vars[key] = None
         elif expr.exprClass == ExprEnum.SET_VAR:
             expr.val = self.__deep_analyze_expr(expr.val)
+
         elif expr.exprClass == ExprEnum.GET_VAR:
             pass
         elif expr.exprClass == ExprEnum.DEFINE:
@@ -545,13 +1548,49 @@ class Analyzer:
                 expr.otherwise[i] = self.__deep_analyze_expr(e)
 
         elif expr.exprClass == ExprEnum.LOOP:
-            # Actually try to parallelize a loop.
-            parallel_loop = self.__maybe_parallelize_loop(expr)
+            breaks = any([self.__breaks_loop(e) for e in expr.body])
+
+            # Actually try to parallelize a loop. A loop that breaks out early
+            # can only run in parallel as a search for the first iteration
+            # that breaks out.
+            if breaks:
+                parallel_loop = self.__maybe_find_loop(expr)
+            else:
+                parallel_loop = self.__maybe_parallelize_loop(expr)
+
+            if parallel_loop is None and expr.trusted:
+                error_str = 'par_loop must count its index by 1 ' + \
+                            'between bounds that do not change in the ' + \
+                            'loop, must not call rand, ' + \
+                            'must not set variables created outside of it, ' + \
+                            'and may only break out after testing a ' + \
+                            'condition that cannot crash for any index'
+                raise error.Parallel(expr.loc, error_str)
+            if parallel_loop is None and not breaks:
+                # A recurrence between iterations may still run in parallel as
+                # a scan.
+                parallel_loop = self.__maybe_scan_loop(expr)
+
+            if parallel_loop is None and not breaks:
+                # So can updates of list elements chosen by each iteration.
+                parallel_loop = self.__maybe_scatter_loop(expr)
+
             if parallel_loop is not None:
+                # An expression was parallelized.
+                self.parallelized = True
                 expr = parallel_loop
 
         elif expr.exprClass == ExprEnum.LIST:
             expr.size = self.__deep_analyze_expr(expr.size)
+
+            # A list that is set to another list may change its size.
+            if expr.env is not None:
+                key = (expr.name, expr.env.get_index_for_name(expr.name))
+                if expr.size.exprClass == ExprEnum.LITERAL and \
+                   expr.name not in self._set_names:
+                    self._list_sizes[key] = expr.size.val
+                else:
+                    self._list_sizes[key] = None
         elif expr.exprClass == ExprEnum.LIST_AT:
             expr.index = self.__deep_analyze_expr(expr.index)
         elif expr.exprClass == ExprEnum.LIST_SET:
@@ -559,6 +1598,10 @@ class Analyzer:
             expr.val = self.__deep_analyze_expr(expr.val)
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             pass
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            pass
+        elif expr.exprClass == ExprEnum.BREAK:
+            pass
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -566,13 +1609,132 @@ class Analyzer:
         return expr
 
 
+    def __is_simple(self, expr):
+        '''
+        Return true if the expression only creates and sets variables and list
+        elements, possibly under a condition, with values that only call
+        primitive functions without side effects, so that SIMD instructions
+        can run it for several iterations at once.
+        '''
+
+        if expr.exprClass == ExprEnum.LITERAL or \
+           expr.exprClass == ExprEnum.GET_VAR:
+            return True
+        elif expr.exprClass == ExprEnum.CREATE_VAR or \
+             expr.exprClass == ExprEnum.SET_VAR:
+            return self.__is_simple(expr.val)
+        elif expr.exprClass == ExprEnum.CALL:
+            if expr.name not in prim_binary_funcs and \
+               expr.name not in prim_other_funcs:
+                return False
+            if expr.name in impure_prims:
+                return False
+
+            return all([self.__is_simple(p) for p in expr.params])
+        elif expr.exprClass == ExprEnum.IF:
+            return all([self.__is_simple(e)
+                        for e in [expr.cond] + expr.then + expr.otherwise])
+        elif expr.exprClass == ExprEnum.SELECT:
+            return all([self.__is_simple(e)
+                        for e in [expr.cond, expr.then_val, expr.else_val]])
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            return self.__is_simple(expr.index)
+        elif expr.exprClass == ExprEnum.LIST_SET:
+            return self.__is_simple(expr.index) and self.__is_simple(expr.val)
+
+        return False
+
+
+    def __maybe_vectorize_loop(self, expr):
+        '''
+        Mark the loop to run with SIMD instructions if its body is simple and
+        its iterations are independent by the same rules as for running them
+        in parallel.
+        '''
+
+        if expr.env is None or \
+           not all([self.__is_simple(e) for e in expr.body]):
+            return
+
+        # The variables that the optimizer created are not in the environment,
+        # but they are never lists, so the loop must not set them if they are
+        # created outside of it.
+        (used, _) = self.__deep_used_not_created(expr, [])
+        sets = [x[0] for x in self.__deep_find_sets(expr)]
+        for name in used:
+            if expr.env.get_entry_for_name(name)[0] is None and name in sets:
+                return
+
+        parallel_loop = self.__maybe_parallelize_loop(expr)
+        if parallel_loop is None:
+            return
+
+        expr.vector_lists = []
+        for name in parallel_loop.used_vars:
+            (_, type_lst, _) = expr.env.get_entry_for_name(name)
+            if type_lst == [Type.LIST_INT] or type_lst == [Type.LIST_FLOAT]:
+                written = name in parallel_loop.written_lists
+                expr.vector_lists.append((name, written))
+
+
+    def __vectorize(self, body):
+        '''
+        Mark each innermost loop in the body, or nested in it, that can run
+        with SIMD instructions. The loops in parallel loops are left alone,
+        since their bodies may become CUDA kernels.
+        '''
+
+        for e in body:
+            if e.exprClass == ExprEnum.DEFINE or \
+               e.exprClass == ExprEnum.TASKS or \
+               e.exprClass == ExprEnum.FORK:
+                self.__vectorize(e.body)
+            elif e.exprClass == ExprEnum.IF:
+                self.__vectorize(e.then)
+                self.__vectorize(e.otherwise)
+            elif e.exprClass == ExprEnum.LOOP:
+                # Only a loop without loops in its body is simple.
+                self.__vectorize(e.body)
+                self.__maybe_vectorize_loop(e)
+
+
+    def recognize_idioms(self):
+        '''
+        Replace the loops that fill, copy, or compare ranges of lists by
+        expressions that the generator turns into calls to library routines,
+        which are faster than the loops. This runs before the loops are
+        parallelized, since on the host these routines are also faster than
+        copying the lists to and from the GPU.
+        '''
+
+        self.__recognize_idioms(self.parsed_exprs)
+
+
     def analyze(self):
         '''
         Try to parallelize each expression. Return true if something was
         parallelized.
         '''
 
+        # Lists that are set to other lists may change their size.
+        for e in self.parsed_exprs:
+            for b in e.body if e.exprClass == ExprEnum.DEFINE else [e]:
+                self._set_names += [name for (name, index)
+                                    in self.__deep_find_sets(b)
+                                    if index is None]
+
         for (i, e) in enumerate(self.parsed_exprs):
             self.parsed_exprs[i] = self.__deep_analyze_expr(e)
 
         return self.parallelized
+
+
+    def vectorize(self):
+        '''
+        Mark the innermost loops that still run sequentially on the host and
+        whose iterations are independent to run with SIMD instructions. This
+        runs after the optimizer, since tiling, unrolling, and strength
+        reduction change the loops.
+        '''
+
+        self.__vectorize(self.parsed_exprs)
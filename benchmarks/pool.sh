@@ -0,0 +1,38 @@
+#!/bin/sh
+
+# Compare the throughput of adding two lists of 10^8 elements (add.zb) and of
+# convolving a list of 10^8 elements with 11 weights (small_conv.zb) compiled
+# without parallelization and for the work stealing thread pool. Both programs
+# print a checksum, which must be the same for both builds, and the number of
+# list elements they update. As in tiling.sh, the programs are built again with
+# -O2 before they are timed. Set THREADS to change the number of pool threads,
+# which is the number of hardware threads by default.
+
+# The lists are created on the stack.
+ulimit -s unlimited 2>/dev/null
+
+cd "$(dirname "$0")"
+
+for bench in add small_conv; do
+    for target in serial pool; do
+        if [ $target = serial ]; then
+            python3 ../main.py ./$bench.zb 0 > /dev/null
+        else
+            python3 ../main.py --pool --threads "${THREADS:-0}" \
+                    ./$bench.zb 1 > /dev/null
+        fi
+
+        make -s clean
+        make -s CXXFLAGS="-O2 -std=c++0x -pthread"
+
+        start=$(date +%s%N)
+        output=$(./$bench)
+        end=$(date +%s%N)
+
+        echo "$output" | awk -v name=$bench -v target=$target \
+                             -v ns=$((end - start)) '{
+            printf "%s, %s: %s %s, %.1f ms, %.1f M updates/s\n",
+                   name, target, $1, $2, ns / 1e6, $4 / (ns / 1e3)
+        }'
+    done
+done
@@ -0,0 +1,41 @@
+#!/bin/sh
+
+# Compare the throughput of adding two lists of 2048 elements 10^6 times
+# (simd_add.zb) and of convolving a list of 4096 elements with 11 weights 50000
+# times (simd_conv.zb) compiled without parallelization, with and without SIMD
+# instructions. The lists fit in the L1 cache, so the loops are limited by the
+# instructions rather than by memory. Both programs print a checksum, which
+# must be the same with and without SIMD instructions, and the number of
+# elements they compute. The number of elements per cycle uses the clock rate
+# in /proc/cpuinfo, or the MHZ environment variable if it is set. As in
+# tiling.sh, the programs are built again with -O2 before they are timed.
+
+# The lists are created on the stack.
+ulimit -s unlimited 2>/dev/null
+
+cd "$(dirname "$0")"
+
+mhz=${MHZ:-$(awk -F: '/^cpu MHz/ { print $2 + 0; exit }' /proc/cpuinfo)}
+
+for bench in simd_add simd_conv; do
+    for simd in off on; do
+        if [ $simd = off ]; then
+            python3 ../main.py ./$bench.zb 0 > /dev/null
+        else
+            python3 ../main.py --simd ./$bench.zb 0 > /dev/null
+        fi
+
+        make -s clean
+        make -s CXXFLAGS="-O2 -std=c++0x -pthread -fopenmp-simd"
+
+        start=$(date +%s%N)
+        output=$(./$bench)
+        end=$(date +%s%N)
+
+        echo "$output" | awk -v name=$bench -v simd=$simd -v mhz=$mhz \
+                             -v ns=$((end - start)) '{
+            printf "%s, simd %s: %s %s, %.1f ms, %.2f elements/cycle\n",
+                   name, simd, $1, $2, ns / 1e6, $4 / (ns * mhz / 1e3)
+        }'
+    done
+done
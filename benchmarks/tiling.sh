@@ -0,0 +1,35 @@
+#!/bin/sh
+
+# Compare the throughput of a large 1-D convolution and a 2-D stencil compiled
+# without parallelization, with and without loop tiling. Both programs print a
+# checksum, which must be the same with and without tiling, and the number of
+# list elements they update. The generated Makefile does not optimize the C++
+# code, so the programs are built again with -O2 before they are timed.
+
+# The lists are created on the stack.
+ulimit -s unlimited 2>/dev/null
+
+cd "$(dirname "$0")"
+
+for bench in conv stencil; do
+    for tiling in off on; do
+        if [ $tiling = off ]; then
+            python3 ../main.py --tile-size 0 ./$bench.zb 0 > /dev/null
+        else
+            python3 ../main.py ./$bench.zb 0 > /dev/null
+        fi
+
+        make -s clean
+        make -s CXXFLAGS="-O2 -std=c++0x -pthread"
+
+        start=$(date +%s%N)
+        output=$(./$bench)
+        end=$(date +%s%N)
+
+        echo "$output" | awk -v name=$bench -v tiling=$tiling \
+                             -v ns=$((end - start)) '{
+            printf "%s, tiling %s: %s %s, %.1f ms, %.1f M updates/s\n",
+                   name, tiling, $1, $2, ns / 1e6, $4 / (ns / 1e3)
+        }'
+    done
+done
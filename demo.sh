@@ -6,6 +6,7 @@ python3 main.py examples/add_lists.zb 0 0;
 python3 main.py examples/add_lists2.zb 0 0;
 python3 main.py examples/small_kernel_conv.zb 0 0;
 python3 main.py examples/not_parallelizable.zb 0 0;
+python3 main.py examples/search_after_zero.zb 0 0;
 
 # Run the add_lists test with parallelization.
 echo "";
@@ -13,4 +14,11 @@ echo "running tests with parallelization ...";
 python3 main.py examples/add_lists.zb 1 1;
 python3 main.py examples/add_lists2.zb 1 1;
 python3 main.py examples/small_kernel_conv.zb 1 1;
-python3 main.py examples/not_parallelizable.zb 1 0;
+python3 main.py examples/not_parallelizable.zb 1 1;
+python3 main.py examples/search_after_zero.zb 1 1;
+
+# Run the tests that check the CPU targets.
+echo "";
+echo "running tests on CPU threads ...";
+python3 main.py --openmp examples/search_after_zero.zb 1 1;
+python3 main.py --simd --unroll 4 examples/add_lists.zb 0 0;
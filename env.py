@@ -87,6 +87,25 @@ class Env:
         return (None, None, None)
 
 
+    def get_index_for_name(self, name):
+        '''
+        Return the index in the environment of the entry for a given name, or
+        None if the name is not in the environment. Two expressions that refer
+        to the same name and get the same index refer to the same entry.
+        '''
+
+        for i in range(len(self.env) - 1, -1, -1):
+            if self.env[i] == None:
+                # Move into the next highest scope.
+                continue
+
+            if self.env[i][0] == name:
+                return i
+
+        # The given name is not in the environment.
+        return None
+
+
     def lookup_variable(self, loc, expr_name):
         ''' Find a variable in the environment and return its type. '''
 
@@ -96,3 +96,13 @@ class Call(Error):
 
     def _print_end(self):
         print(f'call error: {self.msg}')
+
+
+class Parallel(Error):
+    def __init__(self, _loc, _msg):
+        self.loc = _loc     # Type Location
+        self.msg = _msg     # Type string
+
+
+    def _print_end(self):
+        print(f'parallelization error: {self.msg}')
@@ -19,6 +19,14 @@ class ExprEnum(Enum):
     LIST_SET   = 11
     PRIM_FUNC  = 12
     PARA_LOOP  = 13
+    SCAN       = 14
+    SCATTER_LOOP = 15
+    LIST_OP    = 16
+    BREAK      = 17
+    FIND_LOOP  = 18
+    SELECT     = 19
+    TASKS      = 20
+    FORK       = 21
 
 
 class Expr:
@@ -43,7 +51,7 @@ class Literal(Expr):
     def _equal(self, other):
         if self.type != other.type:
             return False
-        if not Expr.equal(self.val, other.val):
+        if self.val != other.val:
             return False
 
         return True
@@ -115,6 +123,8 @@ class Define(Expr):
         self.name = _name         # Type string
         self.args = _args         # Type list of (Type, string) tuples
         self.body = _body         # Type list of Expr's
+        self.memo_size = 0        # Number of results to remember, or 0 if
+                                  # results are not remembered.
 
 
     def _equal(self, other):
@@ -193,7 +203,8 @@ class If(Expr):
 
 
 class Loop(Expr):
-    def __init__(self, _loc, _init, _test, _update, _body, _no_para):
+    def __init__(self, _loc, _init, _test, _update, _body, _no_para,
+                 _trusted):
         self.exprClass = ExprEnum.LOOP
         self.loc = _loc         # Type Location
         self.init = _init       # Type Expr
@@ -202,6 +213,12 @@ class Loop(Expr):
         self.body = _body       # Type list of Expr's
         self.type = Type.NONE   # A Loop expression has no type
         self.no_para = _no_para # True if parallelization should not be tried.
+        self.trusted = _trusted # True if the iterations are known to be
+                                # independent.
+        self.vector_lists = None    # Type list of (string, bool) tuples or
+                                    # None; if the iterations may run in SIMD
+                                    # lanes, the lists the loop uses and
+                                    # whether it sets their elements
 
 
     def _equal(self, other):
@@ -211,7 +228,9 @@ class Loop(Expr):
             return False
         if not Expr.equal(self.update, other.update):
             return False
-        if not Expr.equal(self.no_para, other.no_para):
+        if self.no_para != other.no_para:
+            return False
+        if self.trusted != other.trusted:
             return False
 
         if len(self.body) != len(other.body):
@@ -284,6 +303,17 @@ class ListSet(Expr):
         return True
 
 
+class Break(Expr):
+    def __init__(self, _loc):
+        self.exprClass = ExprEnum.BREAK
+        self.loc = _loc             # Type Location
+        self.type = Type.NONE       # A Break expression has no type
+
+
+    def _equal(self, other):
+        return True
+
+
 class PrimFunc(Expr):
     def __init__(self, _loc, _return_type, _name, _arg_types):
         self.exprClass = ExprEnum.PRIM_FUNC
@@ -311,13 +341,14 @@ class PrimFunc(Expr):
 
 class ParallelLoop(Expr):
     def __init__(self, _loc, _index_name, _start_index, _end_index,
-                 _used_vars, _body):
+                 _used_vars, _written_lists, _body):
         self.exprClass = ExprEnum.PARA_LOOP
         self.loc = _loc                     # Type Location
         self.index_name = _index_name       # Type string
         self.start_index = _start_index     # Type Expr
         self.end_index = _end_index         # Type Expr
         self.used_vars = _used_vars         # List of strings (names)
+        self.written_lists = _written_lists # List of strings (names)
         self.body = _body                   # Type list of Expr's
         self.type = Type.NONE               # A Loop expression has no type
 
@@ -336,6 +367,9 @@ class ParallelLoop(Expr):
             if v1 != v2:
                 return False
 
+        if self.written_lists != other.written_lists:
+            return False
+
         if len(self.body) != len(other.body):
             return False
 
@@ -344,3 +378,244 @@ class ParallelLoop(Expr):
                 return False
 
         return True
+
+
+class Scan(Expr):
+    def __init__(self, _loc, _index_name, _start_index, _end_index, _list,
+                 _op, _term, _coeffs, _used_vars):
+        self.exprClass = ExprEnum.SCAN
+        self.loc = _loc                     # Type Location
+        self.index_name = _index_name       # Type string
+        self.start_index = _start_index     # Type Expr
+        self.end_index = _end_index         # Type Expr
+        self.name = _list                   # Type string; the name of the list
+        self.op = _op                       # Type string; the scan operator
+        self.term = _term                   # Type Expr or None
+        self.coeffs = _coeffs               # Type list of ints or None
+        self.used_vars = _used_vars         # List of strings (names)
+        self.type = Type.NONE               # A Scan expression has no type
+
+
+    def _equal(self, other):
+        if self.index_name != other.index_name:
+            return False
+        if not Expr.equal(self.start_index, other.start_index):
+            return False
+        if not Expr.equal(self.end_index, other.end_index):
+            return False
+        if self.name != other.name or self.op != other.op:
+            return False
+        if (self.term is None) != (other.term is None):
+            return False
+        if self.term is not None and not Expr.equal(self.term, other.term):
+            return False
+        if self.coeffs != other.coeffs:
+            return False
+        if self.used_vars != other.used_vars:
+            return False
+
+        return True
+
+
+class ScatterLoop(Expr):
+    def __init__(self, _loc, _index_name, _start_index, _end_index, _list,
+                 _key, _op, _term, _used_vars):
+        self.exprClass = ExprEnum.SCATTER_LOOP
+        self.loc = _loc                     # Type Location
+        self.index_name = _index_name       # Type string
+        self.start_index = _start_index     # Type Expr
+        self.end_index = _end_index         # Type Expr
+        self.name = _list                   # Type string; the name of the list
+        self.key = _key                     # Type Expr; the index to update
+        self.op = _op                       # Type string; the update operator
+        self.term = _term                   # Type Expr
+        self.used_vars = _used_vars         # List of strings (names)
+        self.type = Type.NONE               # A Loop expression has no type
+
+
+    def _equal(self, other):
+        if self.index_name != other.index_name:
+            return False
+        if not Expr.equal(self.start_index, other.start_index):
+            return False
+        if not Expr.equal(self.end_index, other.end_index):
+            return False
+        if self.name != other.name or self.op != other.op:
+            return False
+        if not Expr.equal(self.key, other.key):
+            return False
+        if not Expr.equal(self.term, other.term):
+            return False
+        if self.used_vars != other.used_vars:
+            return False
+
+        return True
+
+
+class ListOp(Expr):
+    def __init__(self, _loc, _op, _start_index, _end_index, _list, _src,
+                 _val):
+        self.exprClass = ExprEnum.LIST_OP
+        self.loc = _loc                     # Type Location
+        self.op = _op                       # Type string; 'fill', 'zero',
+                                            # 'copy', or 'compare'
+        self.start_index = _start_index     # Type Expr
+        self.end_index = _end_index         # Type Expr
+        self.name = _list                   # Type string; the name of the list
+                                            # that is set or compared
+        self.src = _src                     # Type string or None; the list
+                                            # copied from or compared to
+        self.val = _val                     # Type Expr or None; the value to
+                                            # fill the list with
+
+        # A comparison is 1 if some elements differ and 0 otherwise.
+        self.type = Type.INT if _op == 'compare' else Type.NONE
+
+
+    def _equal(self, other):
+        if self.op != other.op or self.name != other.name or \
+           self.src != other.src:
+            return False
+        if not Expr.equal(self.start_index, other.start_index):
+            return False
+        if not Expr.equal(self.end_index, other.end_index):
+            return False
+        if (self.val is None) != (other.val is None):
+            return False
+        if self.val is not None and not Expr.equal(self.val, other.val):
+            return False
+
+        return True
+
+
+class FindLoop(Expr):
+    def __init__(self, _loc, _index_name, _start_index, _end_index,
+                 _used_vars, _body, _cond, _found):
+        self.exprClass = ExprEnum.FIND_LOOP
+        self.loc = _loc                     # Type Location
+        self.index_name = _index_name       # Type string
+        self.start_index = _start_index     # Type Expr
+        self.end_index = _end_index         # Type Expr
+        self.used_vars = _used_vars         # List of strings (names)
+        self.body = _body                   # Type list of Expr's; run for
+                                            # each index before the condition
+        self.cond = _cond                   # Type Expr; the condition that
+                                            # ends the loop
+        self.found = _found                 # Type list of Expr's; run once
+                                            # for the first index where the
+                                            # condition holds
+        self.type = Type.NONE               # A Loop expression has no type
+
+
+    def _equal(self, other):
+        if self.index_name != other.index_name:
+            return False
+        if not Expr.equal(self.start_index, other.start_index):
+            return False
+        if not Expr.equal(self.end_index, other.end_index):
+            return False
+        if self.used_vars != other.used_vars:
+            return False
+        if not Expr.equal(self.cond, other.cond):
+            return False
+
+        for (l1, l2) in [(self.body, other.body), (self.found, other.found)]:
+            if len(l1) != len(l2):
+                return False
+
+            for (e1, e2) in zip(l1, l2):
+                if not Expr.equal(e1, e2):
+                    return False
+
+        return True
+
+
+class Select(Expr):
+    def __init__(self, _loc, _cond, _then_val, _else_val):
+        self.exprClass = ExprEnum.SELECT
+        self.loc = _loc                 # Type Location
+        self.cond = _cond               # Type Expr
+        self.then_val = _then_val       # Type Expr; the value if the
+                                        # condition is not 0
+        self.else_val = _else_val       # Type Expr; the value if the
+                                        # condition is 0
+        self.type = _then_val.type      # A Select has the type of its values
+
+
+    def _equal(self, other):
+        if not Expr.equal(self.cond, other.cond):
+            return False
+        if not Expr.equal(self.then_val, other.then_val):
+            return False
+        if not Expr.equal(self.else_val, other.else_val):
+            return False
+
+        return True
+
+
+class Tasks(Expr):
+    def __init__(self, _loc, _body, _is_task, _waits, _joins):
+        self.exprClass = ExprEnum.TASKS
+        self.loc = _loc                 # Type Location
+        self.body = _body               # Type list of Expr's
+        self.is_task = _is_task         # Type list of bools; true for each
+                                        # statement in the body that runs
+                                        # as a concurrent task
+        self.waits = _waits             # Type list of lists of ints; the
+                                        # indices of the earlier tasks that
+                                        # each statement must wait for
+        self.joins = _joins             # Type list of ints; the indices of
+                                        # the tasks to wait for after the
+                                        # body
+        self.type = Type.NONE           # A Tasks expression has no type
+
+
+    def _equal(self, other):
+        if self.is_task != other.is_task or self.waits != other.waits or \
+           self.joins != other.joins:
+            return False
+
+        if len(self.body) != len(other.body):
+            return False
+
+        for (e1, e2) in zip(self.body, other.body):
+            if not Expr.equal(e1, e2):
+                return False
+
+        return True
+
+
+class Fork(Expr):
+    def __init__(self, _loc, _body, _decls, _cutoff, _depth):
+        self.exprClass = ExprEnum.FORK
+        self.loc = _loc                 # Type Location
+        self.body = _body               # Type list of Expr's; independent
+                                        # calls that may run at the same time
+        self.decls = _decls             # Type list of (Type, string) tuples;
+                                        # the variables that the calls set,
+                                        # created before the calls
+        self.cutoff = _cutoff           # Type Expr or None; the calls only
+                                        # run at the same time if it is not 0
+        self.depth = _depth             # Type int; the calls only run at the
+                                        # same time in fewer than this many
+                                        # nested forks
+        self.type = Type.NONE           # A Fork expression has no type
+
+
+    def _equal(self, other):
+        if self.decls != other.decls or self.depth != other.depth:
+            return False
+        if (self.cutoff is None) != (other.cutoff is None):
+            return False
+        if self.cutoff is not None and \
+           not Expr.equal(self.cutoff, other.cutoff):
+            return False
+
+        if len(self.body) != len(other.body):
+            return False
+
+        for (e1, e2) in zip(self.body, other.body):
+            if not Expr.equal(e1, e2):
+                return False
+
+        return True
@@ -1,39 +1,784 @@
 from analyzer import Analyzer
 import error
 from expr import ExprEnum
+from optimizer import Optimizer
 from parser import Parser
+from primitives import prim_binary_funcs, prim_other_funcs
 from type import Type
 from type_checker import TypeChecker
 
 import math
 
 
-# Map from primitive binary function name to the cpp equivalent function name.
-# Note: If this is updated, Parser.parse() must also be updated for the new
-# primitive functions to pass type checking and be used.
-prim_binary_funcs = {'+': '+',
-                     '-': '-',
-                     '*': '*',
-                     '/': '/',
-                     '%': '%',
-                     '>': '>',
-                     '>=': '>=',
-                     '<': '<',
-                     '<=': '<=',
-                     '==': '==',
-                     '!=': '!=',
-                     'or': '||',
-                     'and': '&&',
-                     'xor': '^'}
-
-# Map from other primitive functions to the cpp equivalent.
-# Note: If this is updated, Parser.parse() must also be updated for the new
-# primitive functions to pass type checking and be used.
-prim_other_funcs = {'print': 'printf',
-                    'not': '!',
-                    'rand': '(int) random',
-                    'srand': 'srandom',
-                    'time': 'time'}
+# The alignment in bytes of the elements of the lists created in the SIMD mode,
+# which is the size of a cache line and of the widest SIMD registers.
+simd_alignment = 64
+
+# CUDA code for the operators that scans and scatter loops combine values with.
+# It is only written to the CUDA file when one of those expressions is used.
+op_cuda_code = '''#include <limits.h>
+
+// Lists with at most this many elements are updated by scatter loops through a
+// copy of the list in shared memory for each block.
+#define ZB_PRIVATE_BINS 4096
+
+struct zb_add_op {
+    __device__ int identity() const { return 0; }
+    __device__ int operator()(int a, int b) const { return a + b; }
+};
+
+struct zb_mul_op {
+    __device__ int identity() const { return 1; }
+    __device__ int operator()(int a, int b) const { return a * b; }
+};
+
+struct zb_and_op {
+    __device__ int identity() const { return 1; }
+    __device__ int operator()(int a, int b) const { return a && b; }
+};
+
+struct zb_or_op {
+    __device__ int identity() const { return 0; }
+    __device__ int operator()(int a, int b) const { return a || b; }
+};
+
+struct zb_xor_op {
+    __device__ int identity() const { return 0; }
+    __device__ int operator()(int a, int b) const { return a ^ b; }
+};
+
+struct zb_min_op {
+    __device__ int identity() const { return INT_MAX; }
+    __device__ int operator()(int a, int b) const { return b < a ? b : a; }
+};
+
+struct zb_max_op {
+    __device__ int identity() const { return INT_MIN; }
+    __device__ int operator()(int a, int b) const { return b > a ? b : a; }
+};
+
+// Combining a then b gives the matrix product b * a, so that the scan result
+// at index j is the product of every matrix up to j applied in order.
+struct zb_linear_op {
+    __device__ zb_mat3 identity() const {
+        zb_mat3 r = {{{1, 0, 0}, {0, 1, 0}, {0, 0, 1}}};
+        return r;
+    }
+
+    __device__ zb_mat3 operator()(zb_mat3 a, zb_mat3 b) const {
+        zb_mat3 r;
+        for (int i = 0; i < 3; i++) {
+            for (int j = 0; j < 3; j++) {
+                r.m[i][j] = b.m[i][0] * a.m[0][j] + b.m[i][1] * a.m[1][j] +
+                            b.m[i][2] * a.m[2][j];
+            }
+        }
+        return r;
+    }
+};
+
+// Combine val into *addr with an atomic read-modify-write.
+template <typename Op>
+__device__ void zb_atomic_update(int *addr, int val, Op op) {
+    int old = *addr;
+    int assumed;
+
+    do {
+        assumed = old;
+        old = atomicCAS(addr, assumed, op(assumed, val));
+    } while (assumed != old);
+}
+
+__device__ void zb_atomic_update(int *addr, int val, zb_add_op op) {
+    atomicAdd(addr, val);
+}
+
+__device__ void zb_atomic_update(int *addr, int val, zb_min_op op) {
+    atomicMin(addr, val);
+}
+
+__device__ void zb_atomic_update(int *addr, int val, zb_max_op op) {
+    atomicMax(addr, val);
+}
+
+__device__ void zb_atomic_update(int *addr, int val, zb_xor_op op) {
+    atomicXor(addr, val);
+}
+
+'''
+
+# CUDA code to check parallel loops for data races. Each checked list has a
+# shadow array holding the iteration that wrote each element, or -1.
+race_cuda_code = '''#include <stdio.h>
+#include <stdlib.h>
+
+// Record that iteration iter writes data[index] and return the element. If a
+// different iteration wrote the element, store loc in *conflict.
+template <typename T>
+__device__ T &zb_race_write(T *data, int *writers, int index, int iter,
+                            int *conflict, int loc) {
+    int prev = atomicCAS(&writers[index], -1, iter);
+    if (prev != -1 && prev != iter) {
+        atomicCAS(conflict, 0, loc);
+    }
+    return data[index];
+}
+
+// Return data[index]. If a different iteration already wrote the element,
+// store loc in *conflict.
+template <typename T>
+__device__ T zb_race_read(T *data, int *writers, int index, int iter,
+                         int *conflict, int loc) {
+    int writer = writers[index];
+    if (writer != -1 && writer != iter) {
+        atomicCAS(conflict, 0, loc);
+    }
+    return data[index];
+}
+
+'''
+
+# Marks the functions in the header file that both the host and kernels call.
+host_device_code = '''#ifdef __CUDACC__
+#define ZB_HOST_DEVICE __host__ __device__
+#else
+#define ZB_HOST_DEVICE
+#endif
+
+'''
+
+# C++ code for the loops that the analyzer recognized as filling, copying, or
+# comparing a range of list elements. On the host they call the C library,
+# while in a kernel they run as plain loops. It is only written to the header
+# file when one of those loops is used.
+list_op_code = '''#include <string.h>
+#include <algorithm>
+
+// Set the elements from start up to end to zero.
+template <typename T>
+ZB_HOST_DEVICE inline void zb_list_zero(T *data, int start, int end) {
+    if (end <= start) {
+        return;
+    }
+#ifndef __CUDA_ARCH__
+    memset(data + start, 0, (end - start) * sizeof(T));
+#else
+    for (int i = start; i < end; i++) {
+        data[i] = 0;
+    }
+#endif
+}
+
+// Set the elements from start up to end to val.
+template <typename T, typename V>
+ZB_HOST_DEVICE inline void zb_list_fill(T *data, int start, int end, V val) {
+    if (end <= start) {
+        return;
+    }
+#ifndef __CUDA_ARCH__
+    std::fill(data + start, data + end, (T) val);
+#else
+    for (int i = start; i < end; i++) {
+        data[i] = val;
+    }
+#endif
+}
+
+// Copy the elements from start up to end of src into dest.
+template <typename T>
+ZB_HOST_DEVICE inline void zb_list_copy(T *dest, const T *src, int start,
+                                        int end) {
+    if (end <= start) {
+        return;
+    }
+#ifndef __CUDA_ARCH__
+    memmove(dest + start, src + start, (end - start) * sizeof(T));
+#else
+    for (int i = start; i < end; i++) {
+        dest[i] = src[i];
+    }
+#endif
+}
+
+// Return 1 if some element from start up to end differs between a and b, and
+// 0 otherwise.
+template <typename T>
+ZB_HOST_DEVICE inline int zb_list_differs(const T *a, const T *b, int start,
+                                          int end) {
+    if (end <= start) {
+        return 0;
+    }
+#ifndef __CUDA_ARCH__
+    return memcmp(a + start, b + start, (end - start) * sizeof(T)) != 0;
+#else
+    for (int i = start; i < end; i++) {
+        if (a[i] != b[i]) {
+            return 1;
+        }
+    }
+    return 0;
+#endif
+}
+
+'''
+
+# C++ code for the rand_at primitive, which computes the first output word of
+# the Philox-2x32 counter-based generator keyed by the seed. Since the value
+# only depends on the arguments, each iteration of a parallel loop gets the
+# same number as in the sequential loop. The constants must match
+# primitives.rand_at, which computes calls on literals while compiling.
+rand_code = '''// Return a random nonnegative int that only depends on seed and counter.
+ZB_HOST_DEVICE inline int zb_rand_at(int seed, int counter) {
+    unsigned int c0 = (unsigned int) counter;
+    unsigned int c1 = 0;
+    unsigned int key = (unsigned int) seed;
+    for (int round = 0; round < 10; round++) {
+        unsigned long long product = 0xD256D193ull * c0;
+        unsigned int hi = (unsigned int) (product >> 32);
+        unsigned int lo = (unsigned int) product;
+        c0 = hi ^ key ^ c1;
+        c1 = lo;
+        key += 0x9E3779B9u;
+    }
+    return (int) (c0 >> 1);
+}
+
+'''
+
+# C++ code for the nesting depth of forked recursive calls. It is only written
+# to the header file when some recursive calls are run at the same time.
+fork_code = '''// The number of forks of recursive calls that the current thread runs in.
+static thread_local int zb_fork_depth = 0;
+
+'''
+
+# CUDA code for a work-efficient (Blelloch) parallel scan. It is only written
+# to the CUDA file when a loop was turned into a Scan expression.
+scan_cuda_code = '''#define ZB_SCAN_BLOCK 512
+
+// Inclusive scan of each block of 2 * ZB_SCAN_BLOCK elements, using an
+// up-sweep and down-sweep over a balanced tree in shared memory. The total of
+// each block is written to block_sums if it is not NULL.
+template <typename T, typename Op>
+__global__ void zb_scan_block_kernel(T *data, T *block_sums, int n, Op op) {
+    __shared__ T temp[2 * ZB_SCAN_BLOCK];
+
+    int tid = threadIdx.x;
+    int offset = blockIdx.x * 2 * ZB_SCAN_BLOCK;
+    int ai = tid;
+    int bi = tid + ZB_SCAN_BLOCK;
+
+    T orig_a = (offset + ai < n) ? data[offset + ai] : op.identity();
+    T orig_b = (offset + bi < n) ? data[offset + bi] : op.identity();
+    temp[ai] = orig_a;
+    temp[bi] = orig_b;
+
+    int stride = 1;
+    for (int d = ZB_SCAN_BLOCK; d > 0; d >>= 1) {
+        __syncthreads();
+        if (tid < d) {
+            int a = stride * (2 * tid + 1) - 1;
+            int b = stride * (2 * tid + 2) - 1;
+            temp[b] = op(temp[a], temp[b]);
+        }
+        stride <<= 1;
+    }
+
+    if (tid == 0) {
+        if (block_sums != NULL) {
+            block_sums[blockIdx.x] = temp[2 * ZB_SCAN_BLOCK - 1];
+        }
+        temp[2 * ZB_SCAN_BLOCK - 1] = op.identity();
+    }
+
+    for (int d = 1; d <= ZB_SCAN_BLOCK; d <<= 1) {
+        stride >>= 1;
+        __syncthreads();
+        if (tid < d) {
+            int a = stride * (2 * tid + 1) - 1;
+            int b = stride * (2 * tid + 2) - 1;
+            T t = temp[a];
+            temp[a] = temp[b];
+            temp[b] = op(temp[b], t);
+        }
+    }
+    __syncthreads();
+
+    if (offset + ai < n) {
+        data[offset + ai] = op(temp[ai], orig_a);
+    }
+    if (offset + bi < n) {
+        data[offset + bi] = op(temp[bi], orig_b);
+    }
+}
+
+// Combine the scanned totals of the previous blocks into each block.
+template <typename T, typename Op>
+__global__ void zb_scan_add_kernel(T *data, T *block_sums, int n, Op op) {
+    if (blockIdx.x == 0) {
+        return;
+    }
+
+    T prefix = block_sums[blockIdx.x - 1];
+    int offset = blockIdx.x * 2 * ZB_SCAN_BLOCK;
+
+    for (int i = threadIdx.x; i < 2 * ZB_SCAN_BLOCK; i += ZB_SCAN_BLOCK) {
+        if (offset + i < n) {
+            data[offset + i] = op(prefix, data[offset + i]);
+        }
+    }
+}
+
+// Replace the n elements of device array data with their inclusive scan.
+template <typename T, typename Op>
+void zb_scan(T *data, int n, Op op) {
+    int blocks = (n + 2 * ZB_SCAN_BLOCK - 1) / (2 * ZB_SCAN_BLOCK);
+
+    if (blocks == 1) {
+        zb_scan_block_kernel<<<1, ZB_SCAN_BLOCK>>>(data, (T *) NULL, n, op);
+        return;
+    }
+
+    T *block_sums;
+    cudaMalloc((void **) &block_sums, blocks * sizeof(T));
+
+    zb_scan_block_kernel<<<blocks, ZB_SCAN_BLOCK>>>(data, block_sums, n, op);
+    zb_scan(block_sums, blocks, op);
+    zb_scan_add_kernel<<<blocks, ZB_SCAN_BLOCK>>>(data, block_sums, n, op);
+
+    cudaFree(block_sums);
+}
+
+// Apply the scanned matrices of a linear recurrence to the values before the
+// scanned range.
+__global__ void zb_linear_apply_kernel(zb_mat3 *scan_data, int *result, int n,
+                                       int prev1, int prev2) {
+    int j = blockIdx.x * blockDim.x + threadIdx.x;
+
+    while (j < n) {
+        zb_mat3 p = scan_data[j];
+        result[j] = p.m[0][0] * prev1 + p.m[0][1] * prev2 + p.m[0][2];
+        j += gridDim.x * blockDim.x;
+    }
+}
+
+'''
+
+
+# C++ code for the operators and atomic updates used by parallel scans, scatter
+# loops, and searches run on CPU threads. The operators match the ones in
+# op_cuda_code. It is only written to the header file when one of those
+# expressions runs on CPU threads.
+op_cpu_code = '''#include <limits.h>
+
+struct zb_mat3 {
+    int m[3][3];
+};
+
+struct zb_add_op {
+    int identity() const { return 0; }
+    int operator()(int a, int b) const { return a + b; }
+};
+
+struct zb_mul_op {
+    int identity() const { return 1; }
+    int operator()(int a, int b) const { return a * b; }
+};
+
+struct zb_and_op {
+    int identity() const { return 1; }
+    int operator()(int a, int b) const { return a && b; }
+};
+
+struct zb_or_op {
+    int identity() const { return 0; }
+    int operator()(int a, int b) const { return a || b; }
+};
+
+struct zb_xor_op {
+    int identity() const { return 0; }
+    int operator()(int a, int b) const { return a ^ b; }
+};
+
+struct zb_min_op {
+    int identity() const { return INT_MAX; }
+    int operator()(int a, int b) const { return b < a ? b : a; }
+};
+
+struct zb_max_op {
+    int identity() const { return INT_MIN; }
+    int operator()(int a, int b) const { return b > a ? b : a; }
+};
+
+// Combining a then b gives the matrix product b * a, so that the scan result
+// at index j is the product of every matrix up to j applied in order.
+struct zb_linear_op {
+    zb_mat3 identity() const {
+        zb_mat3 r = {{{1, 0, 0}, {0, 1, 0}, {0, 0, 1}}};
+        return r;
+    }
+
+    zb_mat3 operator()(zb_mat3 a, zb_mat3 b) const {
+        zb_mat3 r;
+        for (int i = 0; i < 3; i++) {
+            for (int j = 0; j < 3; j++) {
+                r.m[i][j] = b.m[i][0] * a.m[0][j] + b.m[i][1] * a.m[1][j] +
+                            b.m[i][2] * a.m[2][j];
+            }
+        }
+        return r;
+    }
+};
+
+// Combine val into *addr with an atomic read-modify-write.
+template <typename Op>
+inline void zb_cpu_update(int *addr, int val, Op op) {
+    int old = __atomic_load_n(addr, __ATOMIC_RELAXED);
+    while (!__atomic_compare_exchange_n(addr, &old, op(old, val), true,
+                                        __ATOMIC_RELAXED, __ATOMIC_RELAXED)) {
+    }
+}
+
+inline void zb_cpu_update(int *addr, int val, zb_add_op op) {
+    __atomic_fetch_add(addr, val, __ATOMIC_RELAXED);
+}
+
+'''
+
+# C++ code for the scan used by parallel scans run with OpenMP.
+scan_omp_code = '''#include <omp.h>
+
+// Replace the n elements of data with their inclusive scan. Each thread scans
+// its own block of elements, the totals of the blocks are scanned, and then
+// each block combines the total of the blocks before it. If threads is 0, the
+// default number of threads is used.
+template <typename T, typename Op>
+void zb_omp_scan(T *data, int n, Op op, int threads) {
+    if (threads <= 0) {
+        threads = omp_get_max_threads();
+    }
+
+    T *block_sums = (T *) malloc((threads + 1) * sizeof(T));
+
+    #pragma omp parallel num_threads(threads)
+    {
+        int t = omp_get_thread_num();
+        int nt = omp_get_num_threads();
+        int lo = (int) ((long long) n * t / nt);
+        int hi = (int) ((long long) n * (t + 1) / nt);
+
+        T total = op.identity();
+        for (int j = lo; j < hi; j++) {
+            total = op(total, data[j]);
+            data[j] = total;
+        }
+        block_sums[t + 1] = total;
+
+        #pragma omp barrier
+        #pragma omp single
+        {
+            block_sums[0] = op.identity();
+            for (int k = 1; k <= nt; k++) {
+                block_sums[k] = op(block_sums[k - 1], block_sums[k]);
+            }
+        }
+
+        T prefix = block_sums[t];
+        for (int j = lo; j < hi; j++) {
+            data[j] = op(prefix, data[j]);
+        }
+    }
+
+    free(block_sums);
+}
+
+'''
+
+# C++ code for a work stealing pool of threads that runs parallel loops and
+# forked recursive calls without OpenMP. It is only written to the header file
+# when something runs on the pool, after a definition of ZB_POOL_THREADS, the
+# number of threads, or 0 for one per hardware thread.
+pool_code = '''#include <atomic>
+#include <condition_variable>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// A task counts itself in *pending until it finishes.
+struct zb_task {
+    std::function<void()> run;
+    std::atomic<int> *pending;
+};
+
+// Each worker thread has a queue of tasks. A thread runs the newest task of
+// its own queue first, so it keeps working on the data it just split, and
+// otherwise steals the oldest task of another queue, which is the largest
+// piece of work left there. Threads outside the pool share queue 0. A thread
+// that waits for tasks runs other tasks until they finish, so nested parallel
+// loops and forks use the same threads instead of starting more.
+class zb_pool {
+public:
+    static zb_pool &get() {
+        static zb_pool pool;
+        return pool;
+    }
+
+    int size() const {
+        return (int) queues.size();
+    }
+
+    void push(const zb_task &task) {
+        zb_queue &q = *queues[index()];
+        {
+            std::lock_guard<std::mutex> guard(q.lock);
+            q.tasks.push_back(task);
+        }
+
+        // Taking the lock makes sure that a worker going to sleep sees the
+        // task or is woken up.
+        queued.fetch_add(1);
+        {
+            std::lock_guard<std::mutex> guard(sleep_lock);
+        }
+        wake.notify_one();
+    }
+
+    // Run tasks until pending is 0.
+    void wait(std::atomic<int> &pending) {
+        while (pending.load(std::memory_order_acquire) > 0) {
+            zb_task task;
+            if (take(task)) {
+                run(task);
+            } else {
+                std::this_thread::yield();
+            }
+        }
+    }
+
+    ~zb_pool() {
+        {
+            std::lock_guard<std::mutex> guard(sleep_lock);
+            stopping = true;
+        }
+        wake.notify_all();
+
+        for (size_t i = 0; i < workers.size(); i++) {
+            workers[i].join();
+        }
+        for (size_t i = 0; i < queues.size(); i++) {
+            delete queues[i];
+        }
+    }
+
+private:
+    struct zb_queue {
+        std::mutex lock;
+        std::deque<zb_task> tasks;
+    };
+
+    std::vector<zb_queue *> queues;
+    std::vector<std::thread> workers;
+    std::atomic<int> queued;
+    std::mutex sleep_lock;
+    std::condition_variable wake;
+    bool stopping;
+
+    // The calling thread also runs tasks while it waits, so the pool starts
+    // one thread fewer than it has queues.
+    zb_pool() : queued(0), stopping(false) {
+        int threads = ZB_POOL_THREADS;
+        if (threads <= 0) {
+            threads = (int) std::thread::hardware_concurrency();
+        }
+        if (threads <= 0) {
+            threads = 1;
+        }
+
+        for (int i = 0; i < threads; i++) {
+            queues.push_back(new zb_queue());
+        }
+        for (int i = 1; i < threads; i++) {
+            workers.push_back(std::thread(&zb_pool::work, this, i));
+        }
+    }
+
+    static int &index() {
+        static thread_local int i = 0;
+        return i;
+    }
+
+    void run(zb_task &task) {
+        task.run();
+        task.pending->fetch_sub(1, std::memory_order_release);
+    }
+
+    bool take(zb_task &task) {
+        int me = index();
+        int n = size();
+
+        for (int k = 0; k < n; k++) {
+            zb_queue &q = *queues[(me + k) % n];
+            std::lock_guard<std::mutex> guard(q.lock);
+
+            if (!q.tasks.empty()) {
+                if (k == 0) {
+                    task = q.tasks.back();
+                    q.tasks.pop_back();
+                } else {
+                    task = q.tasks.front();
+                    q.tasks.pop_front();
+                }
+                queued.fetch_sub(1);
+                return true;
+            }
+        }
+
+        return false;
+    }
+
+    void work(int me) {
+        index() = me;
+
+        while (true) {
+            zb_task task;
+            if (take(task)) {
+                run(task);
+                continue;
+            }
+
+            std::unique_lock<std::mutex> guard(sleep_lock);
+            wake.wait(guard, [this]() {
+                return stopping || queued.load() > 0;
+            });
+            if (stopping) {
+                return;
+            }
+        }
+    }
+};
+
+// Run f on the pool, counting it in pending until it finishes.
+template <typename F>
+void zb_spawn(std::atomic<int> &pending, const F &f) {
+    pending.fetch_add(1);
+    zb_task task = {f, &pending};
+    zb_pool::get().push(task);
+}
+
+// Run tasks until every task counted in pending finished.
+inline void zb_wait(std::atomic<int> &pending) {
+    zb_pool::get().wait(pending);
+}
+
+// Call body(i) for each i from start up to but not including end, giving the
+// upper half of the range to the pool until the range is small.
+template <typename F>
+void zb_split(int start, int end, int grain, const F &body,
+              std::atomic<int> &pending) {
+    while (end - start > grain) {
+        int mid = start + (end - start) / 2;
+        zb_spawn(pending, [=, &body, &pending]() {
+            zb_split(mid, end, grain, body, pending);
+        });
+        end = mid;
+    }
+
+    for (int i = start; i < end; i++) {
+        body(i);
+    }
+}
+
+// Call body(i) for each i from start up to but not including end on the pool,
+// in about 8 pieces per thread.
+template <typename F>
+void zb_parallel_for(int start, int end, const F &body) {
+    if (end <= start) {
+        return;
+    }
+
+    int pieces = 8 * zb_pool::get().size();
+    int grain = (int) (((long long) end - start + pieces - 1) / pieces);
+
+    std::atomic<int> pending(0);
+    zb_split(start, end, grain, body, pending);
+    zb_wait(pending);
+}
+
+// Replace the n elements of data with their inclusive scan. Each block of
+// elements is scanned on its own, the totals of the blocks are scanned, and
+// then each block combines the total of the blocks before it.
+template <typename T, typename Op>
+void zb_pool_scan(T *data, int n, Op op) {
+    int blocks = 4 * zb_pool::get().size();
+    if (blocks > n) {
+        blocks = n;
+    }
+
+    T *block_sums = (T *) malloc((blocks + 1) * sizeof(T));
+
+    zb_parallel_for(0, blocks, [&](int b) {
+        int lo = (int) ((long long) n * b / blocks);
+        int hi = (int) ((long long) n * (b + 1) / blocks);
+
+        T total = op.identity();
+        for (int j = lo; j < hi; j++) {
+            total = op(total, data[j]);
+            data[j] = total;
+        }
+        block_sums[b + 1] = total;
+    });
+
+    block_sums[0] = op.identity();
+    for (int k = 1; k <= blocks; k++) {
+        block_sums[k] = op(block_sums[k - 1], block_sums[k]);
+    }
+
+    zb_parallel_for(0, blocks, [&](int b) {
+        int lo = (int) ((long long) n * b / blocks);
+        int hi = (int) ((long long) n * (b + 1) / blocks);
+
+        T prefix = block_sums[b];
+        for (int j = lo; j < hi; j++) {
+            data[j] = op(prefix, data[j]);
+        }
+    });
+
+    free(block_sums);
+}
+
+'''
+
+# C++ code to check parallel loops run on CPU threads for data races, in the
+# same way as race_cuda_code.
+race_cpu_code = '''#include <string.h>
+
+// Record that iteration iter writes data[index] and return the element. If a
+// different iteration wrote the element, store loc in *conflict.
+template <typename T>
+inline T &zb_race_write(T *data, int *writers, int index, int iter,
+                        int *conflict, int loc) {
+    int prev = __sync_val_compare_and_swap(&writers[index], -1, iter);
+    if (prev != -1 && prev != iter) {
+        __sync_val_compare_and_swap(conflict, 0, loc);
+    }
+    return data[index];
+}
+
+// Return data[index]. If a different iteration already wrote the element,
+// store loc in *conflict.
+template <typename T>
+inline T zb_race_read(T *data, int *writers, int index, int iter,
+                      int *conflict, int loc) {
+    int writer = __atomic_load_n(&writers[index], __ATOMIC_RELAXED);
+    if (writer != -1 && writer != iter) {
+        __sync_val_compare_and_swap(conflict, 0, loc);
+    }
+    return data[index];
+}
+
+'''
 
 
 class Generator:
@@ -69,6 +814,37 @@ class Generator:
         self._indent_jump = 4       # The number of spaces a single indent uses
         self._indent = ''           # String of spaces for indenting output code
         self._para_loop_ind = 0     # The number of parallelized loops so far
+        self._scan_ind = 0          # The number of parallel scans so far
+        self._scatter_ind = 0       # The number of scatter loops so far
+        self._find_ind = 0          # The number of parallel searches so far
+        self._check_races = False   # True to check parallel loops for races
+        self._target = 'cuda'       # 'cuda', 'openmp', or 'pool'; where
+                                    # parallel loops run
+        self._omp_schedule = None   # The OpenMP schedule of parallel loops,
+                                    # or None for the default
+        self._threads = None        # The number of OpenMP or pool threads,
+                                    # or None for the default
+        self._pool_uses = 0         # The number of loops and forks run on
+                                    # the pool
+        self._race_checks = 0       # The number of loops checked for races
+        self._race_lists = []       # Names of lists checked in the current
+                                    # kernel
+        self._race_iter = ''        # The iteration number in the current
+                                    # kernel
+        self._race_locs = []        # Locations of the checked list accesses
+        self._list_ops = 0          # The number of fill, copy, and compare
+                                    # loops replaced by library calls
+        self._rand_ats = 0          # The number of calls to rand_at
+        self._task_groups = 0       # The number of function bodies run as
+                                    # concurrent tasks
+        self._forks = 0             # The number of runs of recursive calls
+                                    # run at the same time
+        self._simd = False          # True to run marked loops with SIMD
+                                    # instructions and align lists for them
+        self._simd_loops = 0        # The number of loops run with SIMD
+                                    # instructions
+        self._restricted = {}       # Map from the names of the lists of the
+                                    # current SIMD loop to their pointers
 
 
     def _increase_indent(self):
@@ -132,7 +908,31 @@ class Generator:
             # There is no need to translate primitive functions into C++/CUDA.
             return ('', '')
         elif expr.exprClass == ExprEnum.PARA_LOOP:
+            if self._target != 'cuda':
+                return self.__translate_cpu_parallel_loop_expr(expr, end)
             return self.__translate_parallel_loop_expr(expr, end)
+        elif expr.exprClass == ExprEnum.SCAN:
+            if self._target != 'cuda':
+                return self.__translate_cpu_scan_expr(expr, end)
+            return self.__translate_scan_expr(expr, end)
+        elif expr.exprClass == ExprEnum.SCATTER_LOOP:
+            if self._target != 'cuda':
+                return self.__translate_cpu_scatter_loop_expr(expr, end)
+            return self.__translate_scatter_loop_expr(expr, end)
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            return self.__translate_list_op_expr(expr, end)
+        elif expr.exprClass == ExprEnum.BREAK:
+            return self.__translate_break_expr(expr, end)
+        elif expr.exprClass == ExprEnum.FIND_LOOP:
+            if self._target != 'cuda':
+                return self.__translate_cpu_find_loop_expr(expr, end)
+            return self.__translate_find_loop_expr(expr, end)
+        elif expr.exprClass == ExprEnum.SELECT:
+            return self.__translate_select_expr(expr, end)
+        elif expr.exprClass == ExprEnum.TASKS:
+            return self.__translate_tasks_expr(expr, end)
+        elif expr.exprClass == ExprEnum.FORK:
+            return self.__translate_fork_expr(expr, end)
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -259,8 +1059,14 @@ class Generator:
         cpp = ''
         cuda = ''
 
+        # A function that remembers its results computes them in a separate
+        # function.
+        name = expr.name
+        if expr.memo_size > 0:
+            name = f'zb_memo_{expr.name}'
+
         return_type = Type.enum_to_c_type(expr.loc, expr.type)
-        cpp = f'{return_type} {expr.name}('
+        cpp = f'{return_type} {name}('
 
         # Add the parameters.
         for (arg_type, arg_name) in expr.args[:-1]:
@@ -307,9 +1113,70 @@ class Generator:
         cpp = self._make_indented(cpp)
         cpp = cpp + body_cpp + self._make_indented('}\n\n')
 
+        if expr.memo_size > 0:
+            cpp += self.__translate_memo_function(expr)
+
         return (cpp, cuda)
 
 
+    def __translate_memo_function(self, expr):
+        ''' Get a DEFINE expression for a function that remembers its results
+            and return C++ code for the function. The function looks up its
+            arguments in a direct-mapped table of earlier results, and calls
+            the function that computes the result if they are not there.
+        '''
+
+        return_type = Type.enum_to_c_type(expr.loc, expr.type)
+        arg_names = [arg_name for (arg_type, arg_name) in expr.args]
+        size = expr.memo_size
+
+        cpp = f'{return_type} {expr.name}('
+        cpp += ', '.join([f'int {arg_name}' for arg_name in arg_names])
+        cpp += ')'
+
+        self.cpp_prototypes.append(cpp + ';\n')
+
+        cpp += ' {\n'
+
+        # Each entry of the table has the arguments and result of a call.
+        # Parallel loops run on CPU threads and concurrent tasks may call the
+        # function from several threads, so each thread has its own table.
+        body = 'static thread_local struct {\n'
+        body += '    int used;\n'
+        for i in range(len(arg_names)):
+            body += f'    int arg{i};\n'
+        body += f'    {return_type} result;\n'
+        body += f'{"}"} zb_table[{size}];\n\n'
+
+        body += 'unsigned int zb_hash = 0;\n'
+        for arg_name in arg_names:
+            body += f'zb_hash = (zb_hash ^ (unsigned int) {arg_name}) * ' + \
+                    '2654435761u;\n'
+        body += f'int zb_slot = (zb_hash ^ (zb_hash >> 16)) % {size}u;\n\n'
+
+        found = ' && '.join(['zb_table[zb_slot].used'] +
+                            [f'zb_table[zb_slot].arg{i} == {arg_name}'
+                             for (i, arg_name) in enumerate(arg_names)])
+        body += f'if ({found}) {"{"}\n'
+        body += '    return zb_table[zb_slot].result;\n'
+        body += '}\n\n'
+
+        body += f'{return_type} zb_result = zb_memo_{expr.name}('
+        body += ', '.join(arg_names) + ');\n'
+        body += 'zb_table[zb_slot].used = 1;\n'
+        for (i, arg_name) in enumerate(arg_names):
+            body += f'zb_table[zb_slot].arg{i} = {arg_name};\n'
+        body += 'zb_table[zb_slot].result = zb_result;\n'
+        body += 'return zb_result;\n'
+
+        self._increase_indent()
+        body = self._make_indented(body)
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+        return cpp + body + self._make_indented('}\n\n')
+
+
     def __translate_call_expr(self, expr, end=True):
         ''' Get a single parsed CALL expression and return the equivalent
             C++ and CUDA code.
@@ -362,6 +1229,9 @@ class Generator:
             like semi-colons and newlines, are not added.
         '''
 
+        if expr.name == 'rand_at':
+            self._rand_ats += 1
+
         expr.name = prim_other_funcs[expr.name]
         return self.__translate_call_user_expr(expr, end)
 
@@ -432,6 +1302,28 @@ class Generator:
         return (cpp, cuda)
 
 
+    def __translate_select_expr(self, expr, end=True):
+        ''' Get a single parsed SELECT expression and return the equivalent
+            C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        cpp = ''
+        cuda = ''
+
+        cond = self.__translate_expr(expr.cond, end=False)[0]
+        then_val = self.__translate_expr(expr.then_val, end=False)[0]
+        else_val = self.__translate_expr(expr.else_val, end=False)[0]
+
+        cpp += f'({cond} ? {then_val} : {else_val})'
+        cpp += ';\n' if end else ''
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
     def __translate_loop_expr(self, expr, end=True):
         ''' Get a single parsed LOOP expression and return the equivalent
             C++ and CUDA code.
@@ -440,6 +1332,16 @@ class Generator:
             like semi-colons and newlines, are not added.
         '''
 
+        if self._simd and expr.vector_lists is not None:
+            return self.__translate_simd_loop_expr(expr)
+
+        return self.__translate_for_loop(expr)
+
+
+    def __translate_for_loop(self, expr):
+        ''' Return the C++ and CUDA code of a LOOP expression as a for loop.
+        '''
+
         cpp = 'for '
         cuda = ''
 
@@ -463,6 +1365,213 @@ class Generator:
         return (cpp, cuda)
 
 
+    def __translate_simd_loop_expr(self, expr):
+        ''' Return the C++ and CUDA code of a LOOP expression that the
+            analyzer marked to run with SIMD instructions. The loop uses each
+            list through a __restrict__ pointer, which tells the compiler that
+            its elements do not change through the other pointers, and gets a
+            '#pragma omp simd'. The analyzer treats lists with different names
+            as different lists, so if two of them are the same list while one
+            is written, the loop runs as it is.
+        '''
+
+        self._simd_loops += 1
+
+        decls = ''
+        restricted = {}
+        for (name, written) in expr.vector_lists:
+            list_type = expr.env.lookup_variable(expr.loc, name)
+            elem_type = 'int' if list_type == Type.LIST_INT else 'float'
+            if not written:
+                elem_type = f'const {elem_type}'
+
+            # Every list is created with this alignment in the SIMD mode.
+            pointer = f'simd{self._simd_loops}_{name}'
+            decls += f'{elem_type} *__restrict__ {pointer} = ({elem_type} *) '
+            decls += f'__builtin_assume_aligned({name}.data, '
+            decls += f'{simd_alignment});\n'
+            restricted[name] = pointer
+
+        self._restricted = restricted
+        (loop, cuda) = self.__translate_for_loop(expr)
+        self._restricted = {}
+
+        vector = decls + '#pragma omp simd\n' + loop
+
+        tests = []
+        for (i, (a, a_written)) in enumerate(expr.vector_lists):
+            for (b, b_written) in expr.vector_lists[i + 1:]:
+                if a_written or b_written:
+                    tests.append(f'{a}.data == {b}.data')
+
+        plain = self.__translate_for_loop(expr)[0]
+
+        self._increase_indent()
+        vector = self._make_indented(vector)
+        plain = self._make_indented(plain)
+        self._decrease_indent()
+
+        if len(tests) > 0:
+            cpp = f'if ({" || ".join(tests)}) {"{"}\n' + plain + \
+                  '} else {\n' + vector + '}\n'
+        else:
+            cpp = '{\n' + vector + '}\n'
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_break_expr(self, expr, end=True):
+        ''' Get a single parsed BREAK expression and return the equivalent
+            C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        cpp = 'break'
+        cuda = ''
+
+        cpp += ';\n' if end else ''
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_tasks_expr(self, expr, end=True):
+        ''' Get a single parsed TASKS expression and return the equivalent
+            C++ and CUDA code. Each task runs on its own thread through
+            std::async, and its shared_future is waited for by the statements
+            that depend on it.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        cpp = ''
+        cuda = ''
+
+        self._task_groups += 1
+        names = [f'zb_task{self._task_groups}_{k}'
+                 for k in range(len(expr.body))]
+
+        for (k, e) in enumerate(expr.body):
+            waits = ''.join([f'{names[j]}.wait();\n' for j in expr.waits[k]])
+            (c, cu) = self.__translate_expr(e, True)
+            cuda += cu
+
+            if not expr.is_task[k]:
+                cpp += waits + c
+                continue
+
+            # Each task waits for its own copy of the futures it depends on.
+            captures = ''.join([f', {names[j]}' for j in expr.waits[k]])
+            task_body = waits + c
+
+            self._increase_indent()
+            task_body = self._make_indented(task_body)
+            self._decrease_indent()
+
+            cpp += f'std::shared_future<void> {names[k]} = std::async('
+            cpp += f'std::launch::async, [&{captures}]() {"{"}\n'
+            cpp += task_body
+            cpp += '}).share();\n'
+
+        for k in expr.joins:
+            cpp += f'{names[k]}.wait();\n'
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_fork_expr(self, expr, end=True):
+        ''' Get a single parsed FORK expression and return the equivalent
+            C++ and CUDA code. Every call but the last runs on its own thread
+            through std::async, or as a task of the work stealing pool when
+            parallel loops run on the pool, while the current thread runs the
+            last one, unless the forks are already nested too deeply or the
+            cutoff is 0, in which case the calls run one after another.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        cpp = ''
+        cuda = ''
+
+        self._forks += 1
+        depth = f'zb_fork{self._forks}_depth'
+        names = [f'zb_fork{self._forks}_{k}'
+                 for k in range(len(expr.body) - 1)]
+
+        for (var_type, name) in expr.decls:
+            cpp += f'{Type.enum_to_c_type(expr.loc, var_type)} {name};\n'
+
+        cond = f'zb_fork_depth < {expr.depth}'
+        if expr.cutoff is not None:
+            cutoff = self.__translate_expr(expr.cutoff, end=False)[0]
+            cond += f' && {cutoff}'
+
+        calls = []
+        for e in expr.body:
+            (c, cu) = self.__translate_expr(e, True)
+            calls.append(c)
+            cuda += cu
+
+        # Each thread counts how deeply the forks it runs in are nested. A
+        # thread of the pool runs other tasks while it waits, so each task
+        # puts back the depth it started with.
+        pool = self._target == 'pool'
+        pending = f'zb_fork{self._forks}_pending'
+
+        forked = f'int {depth} = zb_fork_depth + 1;\n'
+        if pool:
+            self._pool_uses += 1
+            forked += f'std::atomic<int> {pending}(0);\n'
+
+        for (name, c) in zip(names, calls):
+            if pool:
+                task_body = 'int zb_outer_depth = zb_fork_depth;\n'
+                task_body += f'zb_fork_depth = {depth};\n' + c
+                task_body += 'zb_fork_depth = zb_outer_depth;\n'
+            else:
+                task_body = f'zb_fork_depth = {depth};\n' + c
+
+            self._increase_indent()
+            task_body = self._make_indented(task_body)
+            self._decrease_indent()
+
+            if pool:
+                forked += f'zb_spawn({pending}, [&]() {"{"}\n'
+            else:
+                forked += f'std::future<void> {name} = std::async('
+                forked += 'std::launch::async, [&]() {\n'
+            forked += task_body
+            forked += '});\n'
+
+        forked += f'zb_fork_depth = {depth};\n'
+        forked += calls[-1]
+        forked += f'zb_fork_depth = {depth} - 1;\n'
+        if pool:
+            forked += f'zb_wait({pending});\n'
+        else:
+            forked += ''.join([f'{name}.wait();\n' for name in names])
+
+        self._increase_indent()
+        forked = self._make_indented(forked)
+        sequential = self._make_indented(''.join(calls))
+        self._decrease_indent()
+
+        cpp += f'if ({cond}) {"{"}\n'
+        cpp += forked
+        cpp += '} else {\n'
+        cpp += sequential
+        cpp += '}\n'
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
     def __translate_list_expr(self, expr, end=True):
         ''' Get a single parsed LIST expression and return the equivalent
             C++ and CUDA code.
@@ -479,6 +1588,8 @@ class Generator:
         elem_type = f'{Type.enum_to_c_type(expr.loc, expr.elem_type)}'
 
         cpp += f'struct {elem_type}_list {name} = {"{"}{size}, 0{"}"};\n'
+        if self._simd:
+            cpp += f'alignas({simd_alignment}) '
         cpp += f'{elem_type} struct_list_{name}_data[{size}];\n'
         cpp += f'{name}.data = struct_list_{name}_data;\n\n'
 
@@ -502,15 +1613,19 @@ class Generator:
         cuda = ''
 
         index = f'{self.__translate_expr(expr.index, end=False)[0]}'
-        cpp += f'{expr.name}.data[{index}]'
+        if expr.name in self._race_lists:
+            cpp += f'zb_race_read({self.__race_args(expr, index)})'
+        else:
+            data = self._restricted.get(expr.name, f'{expr.name}.data')
+            cpp += f'{data}[{index}]'
         cpp += ';\n' if end else ''
 
         cpp = self._make_indented(cpp)
         return (cpp, cuda)
 
 
-    def __translate_list_set_expr(self, expr, end=True):
-        ''' Get a single parsed LIST_SET expression and return the equivalent
+    def __translate_list_op_expr(self, expr, end=True):
+        ''' Get a single parsed LIST_OP expression and return the equivalent
             C++ and CUDA code.
 
             If 'end' is false, then the final characters of the expression,
@@ -520,158 +1635,663 @@ class Generator:
         cpp = ''
         cuda = ''
 
-        index = f'{self.__translate_expr(expr.index, end=False)[0]}'
-        cpp += f'{expr.name}.data[{index}]'
-        cpp += f' = {self.__translate_expr(expr.val, end=False)[0]}'
+        self._list_ops += 1
+
+        start = self.__translate_expr(expr.start_index, end=False)[0]
+        stop = self.__translate_expr(expr.end_index, end=False)[0]
+
+        if expr.op == 'zero':
+            cpp += f'zb_list_zero({expr.name}.data, {start}, {stop})'
+        elif expr.op == 'fill':
+            val = self.__translate_expr(expr.val, end=False)[0]
+            cpp += f'zb_list_fill({expr.name}.data, {start}, {stop}, {val})'
+        elif expr.op == 'copy':
+            cpp += f'zb_list_copy({expr.name}.data, {expr.src}.data, ' + \
+                   f'{start}, {stop})'
+        elif expr.op == 'compare':
+            cpp += f'zb_list_differs({expr.name}.data, {expr.src}.data, ' + \
+                   f'{start}, {stop})'
+        else:
+            error_str = f'unknown list operation: {expr.op}'
+            raise error.InternalError(expr.loc, error_str)
         cpp += ';\n' if end else ''
 
         cpp = self._make_indented(cpp)
         return (cpp, cuda)
 
 
-    def __translate_parallel_loop_expr(self, expr, end=True):
-        ''' Get a single parsed PARA_LOOP expression and return the equivalent
+    def __translate_list_set_expr(self, expr, end=True):
+        ''' Get a single parsed LIST_SET expression and return the equivalent
             C++ and CUDA code.
 
             If 'end' is false, then the final characters of the expression,
             like semi-colons and newlines, are not added.
         '''
 
-        def sub_expr_str(expr):
-            return f'{self.__translate_expr(expr, end=False)[0]}'
-
         cpp = ''
         cuda = ''
 
-        # Get a unique name for the cuda kernel.
-        self._para_loop_ind += 1
-        cuda_kernel_name = f'cuda_loop{self._para_loop_ind}_kernel'
+        index = f'{self.__translate_expr(expr.index, end=False)[0]}'
+        if expr.name in self._race_lists:
+            cpp += f'zb_race_write({self.__race_args(expr, index)})'
+        else:
+            data = self._restricted.get(expr.name, f'{expr.name}.data')
+            cpp += f'{data}[{index}]'
+        cpp += f' = {self.__translate_expr(expr.val, end=False)[0]}'
+        cpp += ';\n' if end else ''
 
-        # Determine the number of blocks and threads to use.
-        iters_str = f'({sub_expr_str(expr.end_index)} - ' + \
-                    f'{sub_expr_str(expr.start_index)})'
-        threads_per_block = f'min(512, {iters_str})'
-        blocks = f'min(32, 1 + {iters_str} / {threads_per_block})'
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
 
-        # Setup the function to call the kernel.
-        args = []
-        for var_name in expr.used_vars:
-            var_type = expr.env.lookup_variable(expr.loc, var_name)
-            c_type = Type.enum_to_c_type(expr.loc, var_type)
 
-            args.append(f'{c_type} {var_name}')
+    def __race_args(self, expr, index):
+        '''
+        Return the arguments to zb_race_read() or zb_race_write() for the
+        LIST_AT or LIST_SET expression with the translated index 'index'.
+        '''
 
-        cuda += f'void call_{cuda_kernel_name}'
-        cuda += f'({", ".join(args)})'
-        self.cuda_prototypes.append(cuda + ';\n')
+        self._race_locs.append(expr.loc.to_string())
 
-        # Call this kernel-calling fucntion in the cpp code.
-        cpp += f'call_{cuda_kernel_name}'
-        cpp += f'({", ".join(expr.used_vars)});\n'
+        return f'{expr.name}.data, race_{expr.name}, {index}, ' + \
+               f'{self._race_iter}, race_conflict, {len(self._race_locs)}'
 
-        cuda += ' {\n'
-        cuda_body = ''
 
-        # Make device variables if necessary.
-        dev_vars = []
-        for var_name in expr.used_vars:
-            dev_name = f'dev_{var_name}'
-            data_name = f'{dev_name}_data'  # Only used for lists.
-            var_type = expr.env.lookup_variable(expr.loc, var_name)
+    def __race_report(self, expr):
+        '''
+        Return code that stops the program if the variable race_loc, the
+        number of a list access of the parallel loop 'expr' that used an
+        element another iteration wrote, is not 0.
+        '''
 
-            if var_type == Type.INT or var_type == Type.FLOAT:
-                dev_vars.append(var_name)
-            elif var_type == Type.LIST_INT:
-                dev_vars.append(dev_name)
+        def c_string(string):
+            string = string.replace('\\', '\\\\').replace('"', '\\"')
+            return f'"{string}"'
 
-                # Allocate memory.
-                size = f'{var_name}.size * sizeof(int)'
-                cuda_body += f'int *{data_name};\n'
-                cuda_body += f'cudaMalloc((void **) &{data_name}, {size});\n'
+        locs = ', '.join([c_string(loc) for loc in self._race_locs])
+        loop_loc = c_string(expr.loc.to_string())
+        message = '"data race in the parallel loop at %s: a list ' + \
+                  'element at %s is used by more than one iteration\\n"'
 
-                # Copy the data from host to device.
-                cuda_body += f'cudaMemcpy({data_name}, {var_name}.data, ' + \
-                             f'{size}, cudaMemcpyHostToDevice);\n'
-                cuda_body += f'int_list {dev_name} = {"{"}{var_name}.size, ' + \
-                             f'{data_name}{"}"};\n\n'
-            elif var_type == Type.LIST_FLOAT:
-                dev_vars.append(dev_name)
+        code = 'if (race_loc != 0) {\n'
+        code += f'    const char *race_locs[] = {"{"}{locs}{"}"};\n'
+        code += f'    fprintf(stderr, {message}, {loop_loc}, '
+        code += 'race_locs[race_loc - 1]);\n'
+        code += '    exit(1);\n'
+        code += '}\n'
+        return code
 
-                # Allocate memory.
-                size = f'{var_name}.size * sizeof(float)'
-                cuda_body += f'float *{data_name};\n'
-                cuda_body += f'cudaMalloc((void **) &{data_name}, {size});\n'
 
-                # Copy the data from host to device.
-                cuda_body += f'cudaMemcpy({data_name}, {var_name}.data, ' + \
-                             f'{size}, cudaMemcpyHostToDevice);\n'
-                cuda_body += f'float_list {dev_name} = {"{"}' + \
-                             f'{var_name}.size, {data_name}{"}"};\n\n'
-            elif var_type == Type.STRING or var_type == Type.LIST_STRING:
-                error_str = 'strings not yet allowed in parallelization'
-                raise error.InternalError(expr.loc, error_str)
+    def __alias_test(self, expr, lists, written):
+        '''
+        Return a C condition that is true if a list in 'written' is the same
+        list as another of the lists of the expression in 'lists', or None if
+        there are no such pairs. The analyzer treats lists with different
+        names as different lists, which only holds for kernels because they
+        read copies of the lists, while loops on CPU threads use the lists
+        themselves. A list is always passed whole, so two lists either have
+        the same elements or none in common.
+        '''
 
-        # Call the kernel.
-        cuda_body += f'{cuda_kernel_name}<<<{blocks}, {threads_per_block}>>>'
-        cuda_body += f'({", ".join(dev_vars)});\n\n'
+        lists = [n for n in dict.fromkeys(lists)
+                 if expr.env.lookup_variable(expr.loc, n) in [Type.LIST_INT,
+                                                              Type.LIST_FLOAT]]
 
-        # Copy the data back from device to host.
-        for var_name in expr.used_vars:
-            dev_name = f'dev_{var_name}'
-            data_name = f'{dev_name}_data'
-            var_type = expr.env.lookup_variable(expr.loc, var_name)
+        tests = []
+        for (i, a) in enumerate(lists):
+            for b in lists[i + 1:]:
+                if a in written or b in written:
+                    tests.append(f'{a}.data == {b}.data')
 
-            if var_type == Type.INT or var_type == Type.FLOAT:
-                # There is no need to copy the variable back, because C++
-                # passes it by value and so the value did not change.
-                pass
-            elif var_type == Type.LIST_INT:
-                size = f'{var_name}.size * sizeof(int)'
+        return ' || '.join(tests) if len(tests) > 0 else None
 
-                # Copy the data from host to device.
-                cuda_body += f'cudaMemcpy({var_name}.data, {data_name}, {size}, '
-                cuda_body += f'cudaMemcpyDeviceToHost);\n'
-            elif var_type == Type.LIST_FLOAT:
-                size = f'{var_name}.size * sizeof(float)'
 
-                # Copy the data from host to device.
-                cuda_body += f'cudaMemcpy({var_name}.data, {data_name}, {size}, '
-                cuda_body += f'cudaMemcpyDeviceToHost);\n'
-            elif var_type == Type.STRING or var_type == Type.LIST_STRING:
-                error_str = 'strings not yet allowed in parallelization'
-                raise error.InternalError(expr.loc, error_str)
+    def __cpu_parallel_for(self, index, start, end, body, scalars=[],
+                           aliased=None):
+        '''
+        Return code that runs 'body', translated code that uses the int
+        variable 'index', on CPU threads for each index from 'start' up to but
+        not including 'end', with an OpenMP parallel for or with the work
+        stealing pool. With OpenMP, each thread has its own copy of the
+        variables in 'scalars'. If 'aliased' is not None, it is a condition
+        from __alias_test, and the indices run in order when it holds.
+        '''
+
+        if aliased is not None:
+            loop = f'for (int {index} = {start}; {index} < {end}; '
+            loop += f'{index}++) {"{"}\n'
+
+            self._increase_indent()
+            loop += self._make_indented(body)
+            parallel = self._make_indented(
+                self.__cpu_parallel_for(index, start, end, body, scalars))
+            loop = self._make_indented(loop + '}\n')
+            self._decrease_indent()
+
+            return f'if ({aliased}) {"{"}\n' + loop + '} else {\n' + \
+                   parallel + '}\n'
+
+        if self._target == 'openmp':
+            clauses = ''
+            if self._omp_schedule is not None:
+                clauses += f' schedule({self._omp_schedule})'
+            if self._threads:
+                clauses += f' num_threads({self._threads})'
+            if len(scalars) > 0:
+                clauses += f' firstprivate({", ".join(scalars)})'
+
+            code = f'#pragma omp parallel for{clauses}\n'
+            code += f'for (int {index} = {start}; {index} < {end}; '
+            code += f'{index}++) {"{"}\n'
+            close = '}\n'
+        else:
+            # The iterations cannot set the variables created outside of the
+            # loop, so they can all use the same variables.
+            self._pool_uses += 1
+            code = f'zb_parallel_for({start}, {end}, [&](int {index}) {"{"}\n'
+            close = '});\n'
 
         self._increase_indent()
-        cuda_body = self._make_indented(cuda_body)
+        code += self._make_indented(body)
         self._decrease_indent()
 
-        cuda += cuda_body + '}\n\n'
+        return code + close
 
-        # Setup the cuda code.
-        # No return value is needed because results are returned via the input
-        # lists.
-        cuda_kernel = f'__global__ void {cuda_kernel_name}'
 
-        # Add the arguments.
-        cuda_kernel += f'({", ".join(args)})'
+    def __translate_cpu_parallel_loop_expr(self, expr, end=True):
+        ''' Get a single parsed PARA_LOOP expression and return the equivalent
+            C++ code, which runs the iterations on CPU threads. The iterations
+            use the lists directly, without copying them.
 
-        # Add this function prototype for use in a header file.
-        self.cuda_prototypes.append(cuda_kernel + ';\n')
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
 
-        cuda_kernel += ' {\n'
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
 
-        # Determine the index in the loop.
-        index = expr.index_name
-        cuda_kernel += f'    int {index} = blockIdx.x * blockDim.x + '
-        cuda_kernel += f'threadIdx.x + {sub_expr_str(expr.start_index)};\n\n'
+        cpp = ''
+        cuda = ''
 
-        # Loop over all indices that this thread is responsible for.
-        max_index = sub_expr_str(expr.end_index)
-        cuda_kernel += f'    while ({index} < {max_index}) {"{"}\n'
+        self._para_loop_ind += 1
 
+        # Translate the body first, since checking for races records the
+        # location of each access to a checked list.
+        race_lists = []
+        if self._check_races:
+            race_lists = [x for x in expr.written_lists if x in expr.used_vars]
+
+        self._race_lists = race_lists
+        self._race_iter = f'({expr.index_name} - para_start)'
+        self._race_locs = []
+
+        body = ''
+        for e in expr.body:
+            (c, cu) = self.__translate_expr(e)
+            body += c
+            cuda += cu
+
+        self._race_lists = []
+
+        block = f'int para_start = {sub_expr_str(expr.start_index)};\n'
+        block += f'int para_end = {sub_expr_str(expr.end_index)};\n'
+
+        # Make the shadow arrays that record which iteration wrote each element
+        # of the checked lists.
+        if len(race_lists) > 0:
+            self._race_checks += 1
+
+            for name in race_lists:
+                size = f'{name}.size * sizeof(int)'
+                block += f'int *race_{name} = (int *) malloc({size});\n'
+                block += f'memset(race_{name}, 0xff, {size});\n'
+
+            block += 'int race_loc = 0;\n'
+            block += 'int *race_conflict = &race_loc;\n'
+
+        # Each thread has its own copy of the variables, as the iterations of a
+        # kernel do.
+        scalars = [name for name in expr.used_vars
+                   if expr.env.lookup_variable(expr.loc, name) in [Type.INT,
+                                                                   Type.FLOAT]]
+        aliased = self.__alias_test(expr, expr.used_vars, expr.written_lists)
+        block += self.__cpu_parallel_for(expr.index_name, 'para_start',
+                                         'para_end', body, scalars, aliased)
+
+        # Stop the program if two iterations used the same element.
+        if len(race_lists) > 0:
+            block += self.__race_report(expr)
+
+            for name in race_lists:
+                block += f'free(race_{name});\n'
+
+        self._increase_indent()
+        cpp += '{\n' + self._make_indented(block) + '}\n'
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_cpu_scan_expr(self, expr, end=True):
+        ''' Get a single parsed SCAN expression and return the equivalent C++
+            code, which computes the element for each index on CPU threads and
+            then scans the elements with zb_omp_scan or zb_pool_scan.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        self._scan_ind += 1
+
+        # The elements of a linear recurrence are scanned as matrices.
+        linear = expr.op == 'linear'
+        elem_type = 'zb_mat3' if linear else 'int'
+        op = f'zb_{expr.op}_op()'
+        name = expr.name
+
+        block = f'int scan_start = {sub_expr_str(expr.start_index)};\n'
+        block += f'int scan_n = {sub_expr_str(expr.end_index)} - scan_start;\n'
+
+        # The values before the scanned range are read first.
+        scan = ''
+        seeds = [f'{name}.data[scan_start - 1]']
+        if linear:
+            seeds.append(f'{name}.data[scan_start - 2]' if expr.coeffs[1] != 0
+                         else '0')
+
+        for (i, seed) in enumerate(seeds):
+            scan += f'int scan_prev{i + 1} = {seed};\n'
+
+        size = f'scan_n * sizeof({elem_type})'
+        scan += f'{elem_type} *scan_data = ({elem_type} *) malloc({size});\n\n'
+
+        # Compute the element for each index. The first element also combines
+        # the value before the scanned range.
+        term = '0' if expr.term is None else sub_expr_str(expr.term)
+        elem = f'int {expr.index_name} = scan_start + scan_j;\n'
+        elem += f'int scan_term = {term};\n'
+
+        if linear:
+            (c1, c2) = expr.coeffs
+            elem += f'zb_mat3 scan_elem = {"{{{"}{c1}, {c2}, scan_term{"}"}, ' + \
+                    f'{"{"}1, 0, 0{"}"}, {"{"}0, 0, 1{"}}}"};\n'
+            elem += 'scan_data[scan_j] = scan_elem;\n'
+        else:
+            elem += 'if (scan_j == 0) {\n'
+            elem += f'    scan_term = {op}(scan_prev1, scan_term);\n'
+            elem += '}\n'
+            elem += 'scan_data[scan_j] = scan_term;\n'
+
+        # Copy the result into the list, applying the scanned matrices of a
+        # linear recurrence to the values before the scanned range.
+        if linear:
+            result = 'zb_mat3 p = scan_data[scan_j];\n'
+            result += f'{name}.data[scan_start + scan_j] = p.m[0][0] * ' + \
+                      'scan_prev1 + p.m[0][1] * scan_prev2 + p.m[0][2];\n'
+        else:
+            result = f'{name}.data[scan_start + scan_j] = scan_data[scan_j];\n'
+
+        scan += self.__cpu_parallel_for('scan_j', '0', 'scan_n', elem)
+        if self._target == 'openmp':
+            threads = self._threads or 0
+            scan += f'zb_omp_scan(scan_data, scan_n, {op}, {threads});\n'
+        else:
+            scan += f'zb_pool_scan(scan_data, scan_n, {op});\n'
+        scan += self.__cpu_parallel_for('scan_j', '0', 'scan_n', result)
+        scan += 'free(scan_data);\n'
+
+        # If the list is the same as a list that the terms read, the terms
+        # must see the elements set before them, as in the original loop.
+        aliased = self.__alias_test(expr, [name] + expr.used_vars, [name])
+        if aliased is not None:
+            index = expr.index_name
+            at = lambda k: f'{name}.data[{index} - {k}]'
+            if linear:
+                (c1, c2) = expr.coeffs
+                val = f'{c1} * {at(1)} + {c2} * {at(2)} + scan_term'
+            else:
+                val = f'{op}({at(1)}, scan_term)'
+
+            loop = f'int scan_term = {term};\n'
+            loop += f'{name}.data[{index}] = {val};\n'
+
+            self._increase_indent()
+            loop = self._make_indented(loop)
+            self._decrease_indent()
+
+            sequential = f'for (int {index} = scan_start; ' + \
+                         f'{index} < scan_start + scan_n; {index}++) {"{"}\n'
+            sequential += loop + '}\n'
+
+            self._increase_indent()
+            scan = f'if ({aliased}) {"{"}\n' + \
+                   self._make_indented(sequential) + '} else {\n' + \
+                   self._make_indented(scan) + '}\n'
+            self._decrease_indent()
+
+        self._increase_indent()
+        block += 'if (scan_n > 0) {\n' + self._make_indented(scan) + '}\n'
+        cpp += '{\n' + self._make_indented(block) + '}\n'
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_cpu_scatter_loop_expr(self, expr, end=True):
+        ''' Get a single parsed SCATTER_LOOP expression and return the
+            equivalent C++ code, which runs the iterations on CPU threads that
+            update the element at each key atomically.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        self._scatter_ind += 1
+
+        op = f'zb_{expr.op}_op()'
+        key = sub_expr_str(expr.key)
+        term = sub_expr_str(expr.term)
+        update = f'zb_cpu_update(&{expr.name}.data[{key}], {term}, {op});\n'
+
+        block = f'int scatter_start = {sub_expr_str(expr.start_index)};\n'
+        block += f'int scatter_end = {sub_expr_str(expr.end_index)};\n'
+        aliased = self.__alias_test(expr, [expr.name] + expr.used_vars,
+                                    [expr.name])
+        block += self.__cpu_parallel_for(expr.index_name, 'scatter_start',
+                                         'scatter_end', update, [], aliased)
+
+        self._increase_indent()
+        cpp += '{\n' + self._make_indented(block) + '}\n'
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __translate_cpu_find_loop_expr(self, expr, end=True):
+        ''' Get a single parsed FIND_LOOP expression and return the equivalent
+            C++ code, which checks the condition for each index on CPU threads
+            that keep the lowest index found, and then runs the statements
+            before the break for that index.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        self._find_ind += 1
+        end_name = f'find_end{self._find_ind}'
+        first_name = f'find_first{self._find_ind}'
+        index = expr.index_name
+
+        # An index is skipped once a lower index was found, since the loop
+        # would have broken out before reaching it.
+        check = ''
+        for e in expr.body:
+            (c, cu) = self.__translate_expr(e)
+            check += c
+            cuda += cu
+
+        check += f'if ({sub_expr_str(expr.cond)}) {"{"}\n'
+        check += f'    zb_cpu_update(&{first_name}, {index}, zb_min_op());\n'
+        check += '}\n'
+
+        self._increase_indent()
+        check = self._make_indented(check)
+        self._decrease_indent()
+
+        test = f'if ({index} < __atomic_load_n(&{first_name}, ' + \
+               f'__ATOMIC_RELAXED)) {"{"}\n' + check + '}\n'
+
+        block = f'int {end_name} = {sub_expr_str(expr.end_index)};\n'
+        block += f'int {first_name} = {end_name};\n'
+        block += self.__cpu_parallel_for(index, sub_expr_str(expr.start_index),
+                                         end_name, test)
+        block += f'if ({first_name} < {end_name}) {"{"}\n'
+
+        found = f'int {index} = {first_name};\n'
+        for e in expr.body + expr.found:
+            (c, cu) = self.__translate_expr(e)
+            found += c
+            cuda += cu
+
+        self._increase_indent()
+        block += self._make_indented(found) + '}\n'
+        cpp += '{\n' + self._make_indented(block) + '}\n'
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+        return (cpp, cuda)
+
+
+    def __copy_vars_to_device(self, expr):
+        '''
+        Return a tuple (code, names) where 'code' is CUDA code that copies the
+        lists in expr.used_vars to the device and 'names' are the names to pass
+        to a kernel for each of the used variables.
+        '''
+
+        cuda_body = ''
+        dev_vars = []
+        for var_name in expr.used_vars:
+            dev_name = f'dev_{var_name}'
+            data_name = f'{dev_name}_data'  # Only used for lists.
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+
+            if var_type == Type.INT or var_type == Type.FLOAT:
+                dev_vars.append(var_name)
+            elif var_type == Type.LIST_INT:
+                dev_vars.append(dev_name)
+
+                # Allocate memory.
+                size = f'{var_name}.size * sizeof(int)'
+                cuda_body += f'int *{data_name};\n'
+                cuda_body += f'cudaMalloc((void **) &{data_name}, {size});\n'
+
+                # Copy the data from host to device.
+                cuda_body += f'cudaMemcpy({data_name}, {var_name}.data, ' + \
+                             f'{size}, cudaMemcpyHostToDevice);\n'
+                cuda_body += f'int_list {dev_name} = {"{"}{var_name}.size, ' + \
+                             f'{data_name}{"}"};\n\n'
+            elif var_type == Type.LIST_FLOAT:
+                dev_vars.append(dev_name)
+
+                # Allocate memory.
+                size = f'{var_name}.size * sizeof(float)'
+                cuda_body += f'float *{data_name};\n'
+                cuda_body += f'cudaMalloc((void **) &{data_name}, {size});\n'
+
+                # Copy the data from host to device.
+                cuda_body += f'cudaMemcpy({data_name}, {var_name}.data, ' + \
+                             f'{size}, cudaMemcpyHostToDevice);\n'
+                cuda_body += f'float_list {dev_name} = {"{"}' + \
+                             f'{var_name}.size, {data_name}{"}"};\n\n'
+            elif var_type == Type.STRING or var_type == Type.LIST_STRING:
+                error_str = 'strings not yet allowed in parallelization'
+                raise error.InternalError(expr.loc, error_str)
+
+        return (cuda_body, dev_vars)
+
+
+    def __translate_parallel_loop_expr(self, expr, end=True):
+        ''' Get a single parsed PARA_LOOP expression and return the equivalent
+            C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        # Get a unique name for the cuda kernel.
+        self._para_loop_ind += 1
+        cuda_kernel_name = f'cuda_loop{self._para_loop_ind}_kernel'
+
+        # Determine the number of blocks and threads to use. The bounds are
+        # computed once on the host and passed to the kernel.
+        iters_str = '(para_end - para_start)'
+        threads_per_block = f'min(512, {iters_str})'
+        blocks = f'min(32, 1 + {iters_str} / {threads_per_block})'
+
+        # Setup the function to call the kernel.
+        args = []
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            c_type = Type.enum_to_c_type(expr.loc, var_type)
+
+            args.append(f'{c_type} {var_name}')
+
+        # Translate the body of the kernel first, since checking for races
+        # records the location of each access to a checked list.
+        race_lists = []
+        if self._check_races:
+            race_lists = [x for x in expr.written_lists if x in expr.used_vars]
+
+        self._race_lists = race_lists
+        self._race_iter = f'({expr.index_name} - para_start)'
+        self._race_locs = []
+
+        kernel_body = ''
         for e in expr.body:
             (c, _) = self.__translate_expr(e);
-            cuda_kernel += c
+            kernel_body += c
+
+        self._race_lists = []
+
+        cuda += f'void call_{cuda_kernel_name}'
+        cuda += f'({", ".join(args)})'
+        self.cuda_prototypes.append(cuda + ';\n')
+
+        # Call this kernel-calling fucntion in the cpp code.
+        cpp += f'call_{cuda_kernel_name}'
+        cpp += f'({", ".join(expr.used_vars)});\n'
+
+        cuda += ' {\n'
+        cuda_body = f'int para_start = {sub_expr_str(expr.start_index)};\n'
+        cuda_body += f'int para_end = {sub_expr_str(expr.end_index)};\n'
+        cuda_body += 'if (para_end <= para_start) {\n'
+        cuda_body += '    return;\n'
+        cuda_body += '}\n\n'
+
+        # Make device variables if necessary.
+        (copy_body, dev_vars) = self.__copy_vars_to_device(expr)
+        cuda_body += copy_body
+
+        # Make the shadow arrays that record which iteration wrote each element
+        # of the checked lists.
+        race_params = []
+        race_args = []
+        if len(race_lists) > 0:
+            self._race_checks += 1
+
+            for name in race_lists:
+                size = f'{name}.size * sizeof(int)'
+                cuda_body += f'int *race_{name};\n'
+                cuda_body += f'cudaMalloc((void **) &race_{name}, {size});\n'
+                cuda_body += f'cudaMemset(race_{name}, 0xff, {size});\n'
+
+                race_params.append(f'int *race_{name}')
+                race_args.append(f'race_{name}')
+
+            cuda_body += 'int *race_conflict;\n'
+            cuda_body += 'cudaMalloc((void **) &race_conflict, sizeof(int));\n'
+            cuda_body += 'cudaMemset(race_conflict, 0, sizeof(int));\n\n'
+
+            race_params.append('int *race_conflict')
+            race_args.append('race_conflict')
+
+        # Call the kernel.
+        cuda_body += f'{cuda_kernel_name}<<<{blocks}, {threads_per_block}>>>'
+        kernel_args = ['para_start', 'para_end'] + dev_vars + race_args
+        cuda_body += f'({", ".join(kernel_args)});\n\n'
+
+        # Stop the program if two iterations used the same element.
+        if len(race_lists) > 0:
+            cuda_body += 'int race_loc = 0;\n'
+            cuda_body += 'cudaMemcpy(&race_loc, race_conflict, sizeof(int), '
+            cuda_body += 'cudaMemcpyDeviceToHost);\n'
+            cuda_body += self.__race_report(expr)
+
+            for arg in race_args:
+                cuda_body += f'cudaFree({arg});\n'
+            cuda_body += '\n'
+
+        # Copy the data back from device to host.
+        for var_name in expr.used_vars:
+            dev_name = f'dev_{var_name}'
+            data_name = f'{dev_name}_data'
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+
+            if var_type == Type.INT or var_type == Type.FLOAT:
+                # There is no need to copy the variable back, because C++
+                # passes it by value and so the value did not change.
+                pass
+            elif var_type == Type.LIST_INT:
+                size = f'{var_name}.size * sizeof(int)'
+
+                # Copy the data from host to device.
+                cuda_body += f'cudaMemcpy({var_name}.data, {data_name}, {size}, '
+                cuda_body += f'cudaMemcpyDeviceToHost);\n'
+            elif var_type == Type.LIST_FLOAT:
+                size = f'{var_name}.size * sizeof(float)'
+
+                # Copy the data from host to device.
+                cuda_body += f'cudaMemcpy({var_name}.data, {data_name}, {size}, '
+                cuda_body += f'cudaMemcpyDeviceToHost);\n'
+            elif var_type == Type.STRING or var_type == Type.LIST_STRING:
+                error_str = 'strings not yet allowed in parallelization'
+                raise error.InternalError(expr.loc, error_str)
+
+        self._increase_indent()
+        cuda_body = self._make_indented(cuda_body)
+        self._decrease_indent()
+
+        cuda += cuda_body + '}\n\n'
+
+        # Setup the cuda code.
+        # No return value is needed because results are returned via the input
+        # lists.
+        cuda_kernel = f'__global__ void {cuda_kernel_name}'
+
+        # Add the arguments.
+        kernel_params = ['int para_start', 'int para_end']
+        cuda_kernel += f'({", ".join(kernel_params + args + race_params)})'
+
+        # Add this function prototype for use in a header file.
+        self.cuda_prototypes.append(cuda_kernel + ';\n')
+
+        cuda_kernel += ' {\n'
+
+        # Determine the index in the loop.
+        index = expr.index_name
+        cuda_kernel += f'    int {index} = blockIdx.x * blockDim.x + '
+        cuda_kernel += 'threadIdx.x + para_start;\n\n'
+
+        # Loop over all indices that this thread is responsible for.
+        cuda_kernel += f'    while ({index} < para_end) {"{"}\n'
+        cuda_kernel += kernel_body
 
         cuda_kernel += f'        {index} += gridDim.x * blockDim.x;\n'
         cuda_kernel += f'    {"}"}\n'
@@ -682,7 +2302,444 @@ class Generator:
         return (cpp, cuda)
 
 
-    def generate(self, try_parallelize):
+    def __translate_scan_expr(self, expr, end=True):
+        ''' Get a single parsed SCAN expression and return the equivalent
+            C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        # Get a unique name for the cuda kernel.
+        self._scan_ind += 1
+        cuda_kernel_name = f'cuda_scan{self._scan_ind}_kernel'
+
+        # The elements of a linear recurrence are scanned as matrices.
+        linear = expr.op == 'linear'
+        elem_type = 'zb_mat3' if linear else 'int'
+        op = f'zb_{expr.op}_op()'
+        name = expr.name
+
+        threads_per_block = 'min(512, scan_n)'
+        blocks = f'min(32, 1 + scan_n / {threads_per_block})'
+
+        # Setup the function to call the kernel. The range of the scan is
+        # computed on the host.
+        args = []
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            c_type = Type.enum_to_c_type(expr.loc, var_type)
+
+            args.append(f'{c_type} {var_name}')
+
+        call_args = [f'int_list {name}', 'int scan_start', 'int scan_end']
+        cuda += f'void call_{cuda_kernel_name}'
+        cuda += f'({", ".join(call_args + args)})'
+        self.cuda_prototypes.append(cuda + ';\n')
+
+        # Call this kernel-calling fucntion in the cpp code.
+        cpp_args = [name, sub_expr_str(expr.start_index),
+                    sub_expr_str(expr.end_index)] + expr.used_vars
+        cpp += f'call_{cuda_kernel_name}({", ".join(cpp_args)});\n'
+
+        cuda += ' {\n'
+        cuda_body = 'int scan_n = scan_end - scan_start;\n'
+        cuda_body += 'if (scan_n <= 0) {\n'
+        cuda_body += '    return;\n'
+        cuda_body += '}\n\n'
+
+        # The values before the scanned range are read on the host.
+        seeds = [f'{name}.data[scan_start - 1]']
+        if linear:
+            seeds.append(f'{name}.data[scan_start - 2]' if expr.coeffs[1] != 0
+                         else '0')
+
+        for (i, seed) in enumerate(seeds):
+            cuda_body += f'int scan_prev{i + 1} = {seed};\n'
+        cuda_body += '\n'
+
+        # Make device variables if necessary.
+        (copy_body, dev_vars) = self.__copy_vars_to_device(expr)
+        cuda_body += copy_body
+
+        # Compute the element for each index, scan the elements, and copy the
+        # result into the list.
+        size = f'scan_n * sizeof({elem_type})'
+        cuda_body += f'{elem_type} *scan_data;\n'
+        cuda_body += f'cudaMalloc((void **) &scan_data, {size});\n'
+
+        kernel_args = ['scan_data', 'scan_start', 'scan_n']
+        if not linear:
+            kernel_args.append('scan_prev1')
+        cuda_body += f'{cuda_kernel_name}<<<{blocks}, {threads_per_block}>>>'
+        cuda_body += f'({", ".join(kernel_args + dev_vars)});\n'
+        cuda_body += f'zb_scan(scan_data, scan_n, {op});\n\n'
+
+        result = 'scan_data'
+        if linear:
+            result = 'scan_result'
+            size = 'scan_n * sizeof(int)'
+            cuda_body += f'int *scan_result;\n'
+            cuda_body += f'cudaMalloc((void **) &scan_result, {size});\n'
+            cuda_body += f'zb_linear_apply_kernel<<<{blocks}, ' + \
+                         f'{threads_per_block}>>>(scan_data, scan_result, ' + \
+                         f'scan_n, scan_prev1, scan_prev2);\n'
+
+        cuda_body += f'cudaMemcpy({name}.data + scan_start, {result}, ' + \
+                     f'scan_n * sizeof(int), cudaMemcpyDeviceToHost);\n'
+
+        cuda_body += 'cudaFree(scan_data);\n'
+        if linear:
+            cuda_body += 'cudaFree(scan_result);\n'
+
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            if var_type == Type.LIST_INT or var_type == Type.LIST_FLOAT:
+                cuda_body += f'cudaFree(dev_{var_name}_data);\n'
+
+        self._increase_indent()
+        cuda_body = self._make_indented(cuda_body)
+        self._decrease_indent()
+
+        cuda += cuda_body + '}\n\n'
+
+        # Setup the kernel that computes the element for each index. The first
+        # element also combines the value before the scanned range.
+        kernel_params = [f'{elem_type} *scan_data', 'int scan_start',
+                         'int scan_n']
+        if not linear:
+            kernel_params.append('int scan_prev1')
+        cuda_kernel = f'__global__ void {cuda_kernel_name}'
+        cuda_kernel += f'({", ".join(kernel_params + args)})'
+
+        # Add this function prototype for use in a header file.
+        self.cuda_prototypes.append(cuda_kernel + ';\n')
+
+        cuda_kernel += ' {\n'
+        cuda_kernel += '    int scan_j = blockIdx.x * blockDim.x + threadIdx.x;\n\n'
+        cuda_kernel += '    while (scan_j < scan_n) {\n'
+        cuda_kernel += f'        int {expr.index_name} = scan_start + scan_j;\n'
+
+        term = '0' if expr.term is None else sub_expr_str(expr.term)
+        cuda_kernel += f'        int scan_term = {term};\n'
+
+        if linear:
+            (c1, c2) = expr.coeffs
+            cuda_kernel += f'        zb_mat3 scan_elem = {"{{{"}{c1}, {c2}, ' + \
+                           f'scan_term{"}"}, {"{"}1, 0, 0{"}"}, ' + \
+                           f'{"{"}0, 0, 1{"}}}"};\n'
+            cuda_kernel += '        scan_data[scan_j] = scan_elem;\n'
+        else:
+            cuda_kernel += '        if (scan_j == 0) {\n'
+            cuda_kernel += f'            scan_term = {op}(scan_prev1, ' + \
+                           'scan_term);\n'
+            cuda_kernel += '        }\n'
+            cuda_kernel += '        scan_data[scan_j] = scan_term;\n'
+
+        cuda_kernel += '        scan_j += gridDim.x * blockDim.x;\n'
+        cuda_kernel += '    }\n'
+        cuda_kernel += '}\n\n'
+
+        cuda += cuda_kernel
+
+        return (cpp, cuda)
+
+
+    def __translate_scatter_loop_expr(self, expr, end=True):
+        ''' Get a single parsed SCATTER_LOOP expression and return the
+            equivalent C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        # Get a unique name for the cuda kernel.
+        self._scatter_ind += 1
+        cuda_kernel_name = f'cuda_scatter{self._scatter_ind}_kernel'
+
+        op = f'zb_{expr.op}_op()'
+        name = expr.name
+
+        # Merging a copy of the list into the list only works for operators
+        # where combining with the identity does not change a value. For the
+        # logical operators it would turn values other than 0 and 1 into 1.
+        can_privatize = expr.op not in ['and', 'or']
+
+        threads_per_block = 'min(512, scatter_n)'
+        blocks = f'min(32, 1 + scatter_n / {threads_per_block})'
+
+        # Setup the function to call the kernel. The range of the loop is
+        # computed on the host.
+        args = []
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            c_type = Type.enum_to_c_type(expr.loc, var_type)
+
+            args.append(f'{c_type} {var_name}')
+
+        call_args = ['int scatter_start', 'int scatter_end']
+        cuda += f'void call_{cuda_kernel_name}'
+        cuda += f'({", ".join(call_args + args)})'
+        self.cuda_prototypes.append(cuda + ';\n')
+
+        # Call this kernel-calling fucntion in the cpp code.
+        cpp_args = [sub_expr_str(expr.start_index),
+                    sub_expr_str(expr.end_index)] + expr.used_vars
+        cpp += f'call_{cuda_kernel_name}({", ".join(cpp_args)});\n'
+
+        cuda += ' {\n'
+        cuda_body = 'int scatter_n = scatter_end - scatter_start;\n'
+        cuda_body += 'if (scatter_n <= 0) {\n'
+        cuda_body += '    return;\n'
+        cuda_body += '}\n\n'
+
+        # Make device variables if necessary.
+        (copy_body, dev_vars) = self.__copy_vars_to_device(expr)
+        cuda_body += copy_body
+
+        # Each block updates its own copy of a small list in shared memory, so
+        # that most atomic updates do not go to global memory.
+        if can_privatize:
+            cuda_body += f'int scatter_private = {name}.size <= ' + \
+                         'ZB_PRIVATE_BINS;\n'
+        else:
+            cuda_body += 'int scatter_private = 0;\n'
+        cuda_body += 'int scatter_shared = scatter_private ? ' + \
+                     f'{name}.size * sizeof(int) : 0;\n'
+
+        kernel_args = ['scatter_start', 'scatter_end', 'scatter_private']
+        cuda_body += f'{cuda_kernel_name}<<<{blocks}, {threads_per_block}, '
+        cuda_body += f'scatter_shared>>>({", ".join(kernel_args + dev_vars)});\n\n'
+
+        # Copy the list back from device to host.
+        size = f'{name}.size * sizeof(int)'
+        cuda_body += f'cudaMemcpy({name}.data, dev_{name}_data, {size}, '
+        cuda_body += f'cudaMemcpyDeviceToHost);\n'
+
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            if var_type == Type.LIST_INT or var_type == Type.LIST_FLOAT:
+                cuda_body += f'cudaFree(dev_{var_name}_data);\n'
+
+        self._increase_indent()
+        cuda_body = self._make_indented(cuda_body)
+        self._decrease_indent()
+
+        cuda += cuda_body + '}\n\n'
+
+        # Setup the cuda code.
+        kernel_params = ['int scatter_start', 'int scatter_end',
+                         'int scatter_private']
+        cuda_kernel = f'__global__ void {cuda_kernel_name}'
+        cuda_kernel += f'({", ".join(kernel_params + args)})'
+
+        # Add this function prototype for use in a header file.
+        self.cuda_prototypes.append(cuda_kernel + ';\n')
+
+        cuda_kernel += ' {\n'
+        cuda_kernel += '    extern __shared__ int scatter_bins[];\n'
+        cuda_kernel += f'    int *scatter_dest = {name}.data;\n\n'
+
+        cuda_kernel += '    if (scatter_private) {\n'
+        cuda_kernel += f'        for (int b = threadIdx.x; b < {name}.size; ' + \
+                       'b += blockDim.x) {\n'
+        cuda_kernel += f'            scatter_bins[b] = {op}.identity();\n'
+        cuda_kernel += '        }\n'
+        cuda_kernel += '        __syncthreads();\n'
+        cuda_kernel += '        scatter_dest = scatter_bins;\n'
+        cuda_kernel += '    }\n\n'
+
+        # Determine the index in the loop.
+        index = expr.index_name
+        cuda_kernel += f'    int {index} = blockIdx.x * blockDim.x + '
+        cuda_kernel += 'threadIdx.x + scatter_start;\n\n'
+
+        # Loop over all indices that this thread is responsible for.
+        key = sub_expr_str(expr.key)
+        term = sub_expr_str(expr.term)
+        cuda_kernel += f'    while ({index} < scatter_end) {"{"}\n'
+        cuda_kernel += f'        zb_atomic_update(&scatter_dest[{key}], ' + \
+                       f'{term}, {op});\n'
+        cuda_kernel += f'        {index} += gridDim.x * blockDim.x;\n'
+        cuda_kernel += '    }\n\n'
+
+        # Merge the block's copy of the list into the list.
+        cuda_kernel += '    if (scatter_private) {\n'
+        cuda_kernel += '        __syncthreads();\n'
+        cuda_kernel += f'        for (int b = threadIdx.x; b < {name}.size; ' + \
+                       'b += blockDim.x) {\n'
+        cuda_kernel += f'            if (scatter_bins[b] != {op}.identity()) ' + \
+                       '{\n'
+        cuda_kernel += f'                zb_atomic_update(&{name}.data[b], ' + \
+                       f'scatter_bins[b], {op});\n'
+        cuda_kernel += '            }\n'
+        cuda_kernel += '        }\n'
+        cuda_kernel += '    }\n'
+        cuda_kernel += '}\n\n'
+
+        cuda += cuda_kernel
+
+        return (cpp, cuda)
+
+
+    def __translate_find_loop_expr(self, expr, end=True):
+        ''' Get a single parsed FIND_LOOP expression and return the equivalent
+            C++ and CUDA code.
+
+            If 'end' is false, then the final characters of the expression,
+            like semi-colons and newlines, are not added.
+        '''
+
+        def sub_expr_str(expr):
+            return f'{self.__translate_expr(expr, end=False)[0]}'
+
+        cpp = ''
+        cuda = ''
+
+        # Get a unique name for the cuda kernel.
+        self._find_ind += 1
+        cuda_kernel_name = f'cuda_find{self._find_ind}_kernel'
+        end_name = f'find_end{self._find_ind}'
+        first_name = f'find_first{self._find_ind}'
+
+        threads_per_block = 'min(512, find_n)'
+        blocks = f'min(32, 1 + find_n / {threads_per_block})'
+
+        # Setup the function to call the kernel. The range of the loop is
+        # computed on the host, and the function returns the first index
+        # found, or the end of the range if there is none.
+        args = []
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            c_type = Type.enum_to_c_type(expr.loc, var_type)
+
+            args.append(f'{c_type} {var_name}')
+
+        call_args = ['int find_start', 'int find_end']
+        cuda += f'int call_{cuda_kernel_name}'
+        cuda += f'({", ".join(call_args + args)})'
+        self.cuda_prototypes.append(cuda + ';\n')
+
+        # Call this kernel-calling function in the cpp code, and run the
+        # statements before the break for the index that was found.
+        cpp_args = [sub_expr_str(expr.start_index), end_name] + expr.used_vars
+        block = f'int {end_name} = {sub_expr_str(expr.end_index)};\n'
+        block += f'int {first_name} = '
+        block += f'call_{cuda_kernel_name}({", ".join(cpp_args)});\n'
+        block += f'if ({first_name} < {end_name}) {"{"}\n'
+
+        found = f'int {expr.index_name} = {first_name};\n'
+        for e in expr.body + expr.found:
+            (c, cu) = self.__translate_expr(e)
+            found += c
+            cuda += cu
+
+        self._increase_indent()
+        block += self._make_indented(found) + '}\n'
+        cpp += '{\n' + self._make_indented(block) + '}\n'
+        self._decrease_indent()
+
+        cpp = self._make_indented(cpp)
+
+        cuda += ' {\n'
+        cuda_body = 'int find_n = find_end - find_start;\n'
+        cuda_body += 'if (find_n <= 0) {\n'
+        cuda_body += '    return find_end;\n'
+        cuda_body += '}\n\n'
+
+        # Make device variables if necessary.
+        (copy_body, dev_vars) = self.__copy_vars_to_device(expr)
+        cuda_body += copy_body
+
+        # The lowest index found so far starts at the end of the range.
+        cuda_body += 'int *dev_find_first;\n'
+        cuda_body += 'cudaMalloc((void **) &dev_find_first, sizeof(int));\n'
+        cuda_body += 'cudaMemcpy(dev_find_first, &find_end, sizeof(int), '
+        cuda_body += 'cudaMemcpyHostToDevice);\n\n'
+
+        kernel_args = ['find_start', 'find_end'] + dev_vars + ['dev_find_first']
+        cuda_body += f'{cuda_kernel_name}<<<{blocks}, {threads_per_block}>>>'
+        cuda_body += f'({", ".join(kernel_args)});\n\n'
+
+        # Copy the index back from device to host. The loop does not change
+        # any list, so the lists are not copied back.
+        cuda_body += 'int find_first;\n'
+        cuda_body += 'cudaMemcpy(&find_first, dev_find_first, sizeof(int), '
+        cuda_body += 'cudaMemcpyDeviceToHost);\n'
+        cuda_body += 'cudaFree(dev_find_first);\n'
+
+        for var_name in expr.used_vars:
+            var_type = expr.env.lookup_variable(expr.loc, var_name)
+            if var_type == Type.LIST_INT or var_type == Type.LIST_FLOAT:
+                cuda_body += f'cudaFree(dev_{var_name}_data);\n'
+        cuda_body += '\nreturn find_first;\n'
+
+        self._increase_indent()
+        cuda_body = self._make_indented(cuda_body)
+        self._decrease_indent()
+
+        cuda += cuda_body + '}\n\n'
+
+        # Setup the cuda code.
+        kernel_params = ['int find_start', 'int find_end']
+        cuda_kernel = f'__global__ void {cuda_kernel_name}'
+        cuda_kernel += f'({", ".join(kernel_params + args)}, int *find_first)'
+
+        # Add this function prototype for use in a header file.
+        self.cuda_prototypes.append(cuda_kernel + ';\n')
+
+        cuda_kernel += ' {\n'
+
+        # Determine the index in the loop.
+        index = expr.index_name
+        cuda_kernel += f'    int {index} = blockIdx.x * blockDim.x + '
+        cuda_kernel += 'threadIdx.x + find_start;\n\n'
+
+        # Each pass of the threads over the next chunk of indices is skipped
+        # once a lower index was found, since the loop would have broken out
+        # before reaching it.
+        kernel_body = ''
+        for e in expr.body:
+            (c, _) = self.__translate_expr(e)
+            kernel_body += c
+
+        kernel_body += f'if ({sub_expr_str(expr.cond)}) {"{"}\n'
+        kernel_body += f'    atomicMin(find_first, {index});\n'
+        kernel_body += '}\n'
+        kernel_body += f'{index} += gridDim.x * blockDim.x;\n'
+
+        self._increase_indent()
+        self._increase_indent()
+        kernel_body = self._make_indented(kernel_body)
+        self._decrease_indent()
+        self._decrease_indent()
+
+        cuda_kernel += f'    while ({index} < find_end && '
+        cuda_kernel += f'{index} < *(volatile int *) find_first) {"{"}\n'
+        cuda_kernel += kernel_body
+        cuda_kernel += '    }\n'
+        cuda_kernel += '}\n\n'
+
+        cuda += cuda_kernel
+
+        return (cpp, cuda)
+
+
+    def generate(self, try_parallelize, check_races=False, tile_size=None,
+                 unroll=1, memo_size=None, target='cuda', omp_schedule=None,
+                 threads=None, simd=False):
         '''
         Get the parsed code from the input file and write equivalent C++ and
         CUDA code to the output file.
@@ -690,10 +2747,47 @@ class Generator:
         If the try_parallelize parameter is false, the code is just converted
         to C++ without any CUDA code to parallelize it.
 
+        If the check_races parameter is true, the parallelized loops check
+        whether two iterations use the same list element while one of them
+        sets it, and stop the program with the location of the access if so.
+        This is meant for testing loops marked with par_loop.
+
+        The tile_size parameter is the number of iterations of each loop in a
+        tile of a tiled loop nest. If it is None, the size is chosen for each
+        nest, and if it is 0, no loops are tiled.
+
+        The unroll parameter is the number of copies of the body that each
+        innermost loop runs per iteration. Loops with a few iterations that
+        are known before the program runs are unrolled completely unless it
+        is 0.
+
+        The memo_size parameter is the number of results that each recursive
+        function without side effects remembers. If it is None, a default
+        size is used, and if it is 0, no results are remembered.
+
+        The target parameter is 'cuda' to run parallel loops as CUDA kernels,
+        'openmp' to run them on the CPU with OpenMP, or 'pool' to run them on
+        the CPU with a work stealing pool of threads written into the header
+        file, which also runs forked recursive calls. The CPU targets use the
+        lists in host memory directly. The omp_schedule parameter is the
+        schedule of the OpenMP loops, like 'static' or 'dynamic,64', and the
+        threads parameter is the number of threads OpenMP or the pool uses. If
+        either is None, or the number of threads is 0, the default is used,
+        which for the pool is one thread per hardware thread.
+
+        If the simd parameter is true, the innermost loops that run on the
+        host and whose iterations are independent run with SIMD instructions,
+        and the elements of each list are aligned for them.
+
         Return true if the code was parallelized and false otherwise.
         '''
 
         parallelized = False  # Nothing was parallelized so far.
+        self._check_races = check_races
+        self._target = target
+        self._omp_schedule = omp_schedule
+        self._threads = threads
+        self._simd = simd
 
         # Get the parsed versino of the code.
         p = Parser(self.in_filename)  # Type list of Expr's
@@ -707,19 +2801,51 @@ class Generator:
             type_checker = TypeChecker(parsed_exprs)
             type_checker.validate_exprs()
 
+            # Rewrite the code into cheaper equivalent code. This is done for
+            # both sequential and parallelized output.
+            optimizer = Optimizer(parsed_exprs)
+            optimizer.optimize()
+            optimizer.memoize_functions(memo_size)
+            optimizer.interchange_loops(try_parallelize)
+
+            # Loops that fill, copy, or compare lists run as library calls.
+            analyzer = Analyzer(parsed_exprs)
+            analyzer.recognize_idioms()
+
             if try_parallelize:
                 # Analyze the code to see if some parts can be marked to run in
                 # parallel.
-                analyzer = Analyzer(parsed_exprs)
                 parallelized = analyzer.analyze()
+
+            # Loops that still run sequentially can use the cache better,
+            # fewer branches and list accesses, and cheaper arithmetic.
+            optimizer.tile_loops(tile_size)
+            optimizer.convert_ifs()
+            optimizer.replace_scalars()
+            optimizer.reduce_strength()
+            optimizer.unroll_loops(unroll)
+
+            if try_parallelize:
+                # Statements that do not use each other's variables and lists
+                # run at the same time on separate CPU threads.
+                optimizer.schedule_tasks()
+
+            if simd:
+                # The innermost loops that still run sequentially may run
+                # several iterations at once in the lanes of SIMD registers.
+                analyzer.vectorize()
         except error.Error as e:
             e.print()
             exit(1)
 
+        # Only parallel loops run as CUDA kernels need CUDA files.
+        uses_cuda = parallelized and target == 'cuda'
+        uses_openmp = parallelized and target == 'openmp'
+
         # Include some useful libraries.
         cpp_file = open(self._filename_no_ext + '.cpp', 'w')
 
-        if parallelized:
+        if uses_cuda:
             cpp_file.write('#include <cuda_runtime.h>\n')
 
         cpp_file.write('#include <stdio.h>\n')
@@ -728,12 +2854,12 @@ class Generator:
         cpp_file.write('\n')
         cpp_file.write(f'#include "{self._base_filename_no_ext + ".hpp"}"\n')
 
-        if parallelized:
+        if uses_cuda:
             cpp_file.write(f'#include "{self._base_filename_no_ext}.cuh"\n')
         cpp_file.write('\n')
 
         # Only make a CUDA file if necessary.
-        if parallelized:
+        if uses_cuda:
             cuda_file = open(self._filename_no_ext + '.cu', 'w')
             cuda_file.write('#include <cuda_runtime.h>\n')
             cuda_file.write('\n')
@@ -742,16 +2868,27 @@ class Generator:
 
         # Convert each expression to C++ and CUDA code, writing the result to
         # the output file.
+        cuda_code = ''
         for expr in parsed_exprs:
             (cpp, cuda) = self.__translate_expr(expr)
             cpp_file.write(cpp)
+            cuda_code += cuda
+
+        if uses_cuda:
+            # The operators and scan templates must come before the code that
+            # uses them.
+            if self._scan_ind > 0 or self._scatter_ind > 0:
+                cuda_file.write(op_cuda_code)
+            if self._scan_ind > 0:
+                cuda_file.write(scan_cuda_code)
+            if self._race_checks > 0:
+                cuda_file.write(race_cuda_code)
 
-            if parallelized:
-                cuda_file.write(cuda)
+            cuda_file.write(cuda_code)
 
         cpp_file.close()
 
-        if parallelized:
+        if uses_cuda:
             cuda_file.close()
 
         # Write the C++ header file.
@@ -775,6 +2912,28 @@ class Generator:
         hpp_file.write('    char *data;\n')
         hpp_file.write('};\n\n')
 
+        if self._list_ops > 0 or self._rand_ats > 0:
+            hpp_file.write(host_device_code)
+        if self._list_ops > 0:
+            hpp_file.write(list_op_code)
+        if self._rand_ats > 0:
+            hpp_file.write(rand_code)
+        if self._task_groups > 0 or self._forks > 0:
+            hpp_file.write('#include <future>\n\n')
+        if self._forks > 0:
+            hpp_file.write(fork_code)
+        uses_cpu = parallelized and target != 'cuda'
+        if uses_cpu and (self._scan_ind > 0 or self._scatter_ind > 0 or
+                         self._find_ind > 0):
+            hpp_file.write(op_cpu_code)
+        if uses_openmp and self._scan_ind > 0:
+            hpp_file.write(scan_omp_code)
+        if self._pool_uses > 0:
+            hpp_file.write(f'#define ZB_POOL_THREADS {self._threads or 0}\n\n')
+            hpp_file.write(pool_code)
+        if uses_cpu and self._race_checks > 0:
+            hpp_file.write(race_cpu_code)
+
         for proto in self.cpp_prototypes:
             hpp_file.write(proto)
         hpp_file.write('\n')
@@ -783,7 +2942,7 @@ class Generator:
         hpp_file.close()
 
         # Write the CUDA header file.
-        if parallelized:
+        if uses_cuda:
             cuh_file = open(self._filename_no_ext + '.cuh', 'w')
             guard = f'{self._base_filename_no_ext.upper()}_CUH'
             cuh_file.write(f'#ifndef {guard}\n')
@@ -791,6 +2950,12 @@ class Generator:
 
             cuh_file.write(f'#include "{self._base_filename_no_ext}.hpp"\n\n')
 
+            if self._scan_ind > 0 or self._scatter_ind > 0:
+                # The element type used to scan linear recurrences.
+                cuh_file.write('struct zb_mat3 {\n')
+                cuh_file.write('    int m[3][3];\n')
+                cuh_file.write('};\n\n')
+
             for proto in self.cuda_prototypes:
                 cuh_file.write(proto)
             cuh_file.write('\n')
@@ -807,7 +2972,7 @@ class Generator:
         cu_name  = self._base_filename_no_ext + '.cu'
         cuh_name = self._base_filename_no_ext + '.cuh'
         m = ''
-        if parallelized:
+        if uses_cuda:
             m += f'CUDA_PATH = /usr/local/cuda\n'
             m += f'CUDA_INC_PATH = $(CUDA_PATH)/include\n'
             m += f'CUDA_BIN_PATH = $(CUDA_PATH)/bin\n'
@@ -818,8 +2983,14 @@ class Generator:
             m += f'CUDA_LINK_FLAGS = -dlink -Wno-deprecated-gpu-targets\n'
             m += f'\n'
         m += f'GPP=g++\n'
-        m += f'CXXFLAGS = -g -Wall -D_REENTRANT -std=c++0x -pthread\n'
-        if parallelized:
+        m += f'CXXFLAGS = -g -Wall -D_REENTRANT -std=c++0x -pthread'
+        if uses_openmp:
+            m += f' -fopenmp'
+        elif self._simd_loops > 0:
+            # The SIMD pragmas do not need the OpenMP runtime.
+            m += f' -fopenmp-simd'
+        m += f'\n'
+        if uses_cuda:
             m += f'INCLUDE = -I$(CUDA_INC_PATH)\n'
             m += f'LIBS = -L$(CUDA_LIB_PATH) -lcudart -lcufft -lsndfile\n'
         m += f'\n'
@@ -828,14 +2999,14 @@ class Generator:
         m += f'{cpp_name}.o: {cpp_name}\n'
         m += f'\t$(GPP) $(CXXFLAGS) -c -o $@ $(INCLUDE) $<\n'
         m += f'\n'
-        if parallelized:
+        if uses_cuda:
             m += f'{cu_name}.o: {cu_name}\n'
             m += f'\t$(NVCC) $(CUDAFLAGS) -c -o $@ $<\n'
             m += f'\n'
             m += f'cuda.o: {cu_name}.o\n'
             m += f'\t$(NVCC) $(CUDA_LINK_FLAGS) -o $@ $^\n'
             m += f'\n'
-        if parallelized:
+        if uses_cuda:
             m += f'{base_name}: {cpp_name}.o {cu_name}.o cuda.o\n'
         else:
             m += f'{base_name}: {cpp_name}.o\n'
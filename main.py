@@ -6,15 +6,115 @@ import sys
 
 
 def usage(filename):
-    print(f'usage: {filename} code_file parallelize [should_parallelize]')
+    print(f'usage: {filename} [--check-races] [--tile-size size] ' + \
+          '[--unroll factor] [--memo-size entries] [--openmp | --pool] ' + \
+          '[--schedule kind[,chunk]] [--threads count] [--simd] ' + \
+          'code_file parallelize [should_parallelize]')
     print("`parallelize' should be 0 or 1")
     print("`should_parallelize' should be 0 or 1 and if it is provided and " + \
           "the code is or is not parallelized in a way that disagrees with " + \
           "`should_parallelize' then the test fails")
+    print("`--check-races' makes the parallelized loops stop the program " + \
+          "if two iterations use the same list element")
+    print("`--tile-size' sets the number of iterations of each loop in a " + \
+          "tile of a tiled loop nest, or turns off tiling if it is 0")
+    print("`--unroll' sets the number of copies of the body that each " + \
+          "innermost loop runs per iteration, or turns off unrolling if " + \
+          "it is 0")
+    print("`--memo-size' sets the number of results that each recursive " + \
+          "function without side effects remembers, or turns off " + \
+          "remembering results if it is 0")
+    print("`--openmp' runs the parallelized loops on the CPU with OpenMP " + \
+          "instead of on the GPU with CUDA")
+    print("`--schedule' sets the OpenMP schedule of the parallelized " + \
+          "loops: static, dynamic, guided, auto, or runtime, optionally " + \
+          "followed by a comma and a chunk size")
+    print("`--pool' runs the parallelized loops and forked recursive " + \
+          "calls on the CPU with a work stealing pool of threads instead")
+    print("`--threads' sets the number of threads that OpenMP or the pool " + \
+          "runs the parallelized loops with")
+    print("`--simd' runs the innermost loops that are not parallelized " + \
+          "with SIMD instructions where their iterations are independent")
     exit(-1)
 
 
+def int_flag(name):
+    '''
+    Remove the flag 'name' and the number after it from the command line
+    arguments and return the number, or None if the flag is not given.
+    '''
+
+    if name not in sys.argv:
+        return None
+
+    i = sys.argv.index(name)
+    if i + 1 >= len(sys.argv) or not sys.argv[i + 1].isdigit():
+        usage(sys.argv[0])
+
+    val = int(sys.argv[i + 1])
+    del sys.argv[i:i + 2]
+    return val
+
+
+def schedule_flag():
+    '''
+    Remove the --schedule flag and the OpenMP schedule after it from the
+    command line arguments and return the schedule, or None if the flag is
+    not given.
+    '''
+
+    if '--schedule' not in sys.argv:
+        return None
+
+    i = sys.argv.index('--schedule')
+    if i + 1 >= len(sys.argv):
+        usage(sys.argv[0])
+
+    schedule = sys.argv[i + 1]
+    kind = schedule.split(',')[0]
+    chunk = schedule[len(kind) + 1:]
+    if kind not in ['static', 'dynamic', 'guided', 'auto', 'runtime'] or \
+       (',' in schedule and not chunk.isdigit()):
+        usage(sys.argv[0])
+
+    del sys.argv[i:i + 2]
+    return schedule
+
+
 def main():
+    # The optional --check-races flag can be anywhere in the arguments.
+    check_races = '--check-races' in sys.argv
+    if check_races:
+        sys.argv.remove('--check-races')
+
+    # The optional --tile-size, --unroll, and --memo-size flags are followed
+    # by a number.
+    tile_size = int_flag('--tile-size')
+    unroll = int_flag('--unroll')
+    if unroll is None:
+        unroll = 1
+    memo_size = int_flag('--memo-size')
+
+    # The optional --openmp and --pool flags run the parallelized loops on the
+    # CPU, with the OpenMP schedule given by --schedule and the number of
+    # threads given by --threads.
+    target = 'cuda'
+    for (flag, flag_target) in [('--openmp', 'openmp'), ('--pool', 'pool')]:
+        if flag in sys.argv:
+            if target != 'cuda':
+                usage(sys.argv[0])
+
+            sys.argv.remove(flag)
+            target = flag_target
+    omp_schedule = schedule_flag()
+    threads = int_flag('--threads')
+
+    # The optional --simd flag runs the innermost sequential loops with SIMD
+    # instructions.
+    simd = '--simd' in sys.argv
+    if simd:
+        sys.argv.remove('--simd')
+
     if len(sys.argv) != 3 and len(sys.argv) != 4:
         usage(sys.argv[0])
 
@@ -22,7 +122,9 @@ def main():
     # and CUDA. The second command line arguments should be a boolean: True to
     # parallelize the code, and false to just convert it to C++.
     g = Generator(sys.argv[1])
-    parallelized = g.generate(int(sys.argv[2]))
+    parallelized = g.generate(int(sys.argv[2]), check_races, tile_size,
+                              unroll, memo_size, target, omp_schedule,
+                              threads, simd)
 
     # Check if the code was or was not supposed to be parallelizable but it was
     # not or was parallelized, respectively.
@@ -0,0 +1,4314 @@
+import error
+from expr import *
+from primitives import prim_binary_funcs, prim_other_funcs, impure_prims, \
+                       trapping_prims, eval_prim
+from type_checker import TypeChecker
+
+import copy
+
+
+# Primitive functions whose result only depends on their arguments.
+pure_prims = [f for f in list(prim_binary_funcs) + list(prim_other_funcs)
+              if f not in impure_prims]
+
+# Functions whose body has at most this many expressions are inlined into the
+# loops that call them.
+inline_size_limit = 40
+
+# Innermost loops with at most this many iterations, known before the program
+# runs, are replaced by a copy of their body for each iteration.
+full_unroll_limit = 16
+
+# Loops are only unrolled if the copies of their body have at most this many
+# expressions in total.
+unroll_size_limit = 200
+
+# A function is copied for at most this many different sets of constant
+# arguments that it is called with.
+specialize_limit = 4
+
+# Recursive functions with int arguments and no side effects remember this many
+# results by default.
+memo_table_size = 4096
+
+# Perfect loop nests are split into tiles whose list elements fit in half of a
+# cache of this many bytes.
+tile_cache_bytes = 32 * 1024
+
+# Calls to functions without side effects on literal arguments are computed
+# while compiling if it takes at most this many steps.
+eval_step_limit = 100000
+
+# Ifs in parallel loops and innermost sequential loops whose branches set at
+# most this many variables or list elements are run without a branch.
+select_size_limit = 4
+
+# Independent recursive calls run at the same time until this many of them are
+# nested, and, when the calls split a range of list elements, only for ranges
+# of at least this many elements.
+fork_depth_limit = 4
+fork_min_size = 2048
+
+
+class EvaluationStopped(Exception):
+    ''' The value of a call cannot be computed while compiling. '''
+    pass
+
+
+class LoopExited(Exception):
+    ''' A Break was run while computing a call during compiling. '''
+    pass
+
+
+class Optimizer:
+    '''
+    Rewrite type checked expressions into equivalent expressions that are
+    cheaper to run. The optimizer runs after the type checker and before the
+    analyzer, so every transformation here applies to both the sequential and
+    the parallelized output.
+    '''
+
+    def __init__(self, _parsed_exprs):
+        self.parsed_exprs = _parsed_exprs  # Type list of Expr's
+        self._used_names = []              # Type list of strings
+        self._global_names = []            # Type list of strings
+        self._temps = []                   # Type list of strings
+        self._tmp_ind = 0                  # The number of temporaries so far
+        self._changed = False              # True if the current pass changed
+                                           # the code.
+        self._defines = {}                 # Map from function name to Define
+        self._inlinable = []               # Names of functions to inline
+        self._pure_funcs = []              # Names of functions that have no
+                                           # side effects.
+        self._evaluated = {}               # Map from (name, arguments) to the
+                                           # value of a call, or None if it
+                                           # cannot be computed.
+        self._eval_steps = 0               # Steps taken by the current call
+                                           # being computed.
+
+
+    def __sub_exprs(self, expr):
+        ''' Return the direct subexpressions of 'expr' in evaluation order. '''
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            return []
+        elif expr.exprClass == ExprEnum.CREATE_VAR:
+            return [expr.val]
+        elif expr.exprClass == ExprEnum.SET_VAR:
+            return [expr.val]
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            return []
+        elif expr.exprClass == ExprEnum.DEFINE:
+            return list(expr.body)
+        elif expr.exprClass == ExprEnum.CALL:
+            return list(expr.params)
+        elif expr.exprClass == ExprEnum.IF:
+            return [expr.cond] + expr.then + expr.otherwise
+        elif expr.exprClass == ExprEnum.LOOP:
+            return [expr.init, expr.test, expr.update] + expr.body
+        elif expr.exprClass == ExprEnum.LIST:
+            return [expr.size]
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            return [expr.index]
+        elif expr.exprClass == ExprEnum.LIST_SET:
+            return [expr.index, expr.val]
+        elif expr.exprClass == ExprEnum.PRIM_FUNC:
+            return []
+        elif expr.exprClass == ExprEnum.PARA_LOOP:
+            return [expr.start_index, expr.end_index] + expr.body
+        elif expr.exprClass == ExprEnum.SCAN:
+            term = [] if expr.term is None else [expr.term]
+            return [expr.start_index, expr.end_index] + term
+        elif expr.exprClass == ExprEnum.SCATTER_LOOP:
+            return [expr.start_index, expr.end_index, expr.key, expr.term]
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            val = [] if expr.val is None else [expr.val]
+            return [expr.start_index, expr.end_index] + val
+        elif expr.exprClass == ExprEnum.BREAK:
+            return []
+        elif expr.exprClass == ExprEnum.FIND_LOOP:
+            return [expr.start_index, expr.end_index] + expr.body + \
+                   [expr.cond] + expr.found
+        elif expr.exprClass == ExprEnum.SELECT:
+            return [expr.cond, expr.then_val, expr.else_val]
+        elif expr.exprClass == ExprEnum.TASKS:
+            return list(expr.body)
+        elif expr.exprClass == ExprEnum.FORK:
+            cutoff = [] if expr.cutoff is None else [expr.cutoff]
+            return cutoff + expr.body
+        else:
+            error_str = f'unknown expression type: {expr.exprClass}'
+            raise error.InternalError(expr.loc, error_str)
+
+
+    def __map_sub_exprs(self, expr, f):
+        ''' Replace each direct subexpression 'e' of 'expr' with f(e). '''
+
+        def map_list(lst):
+            for (i, e) in enumerate(lst):
+                lst[i] = f(e)
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            pass
+        elif expr.exprClass == ExprEnum.CREATE_VAR:
+            expr.val = f(expr.val)
+        elif expr.exprClass == ExprEnum.SET_VAR:
+            expr.val = f(expr.val)
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            pass
+        elif expr.exprClass == ExprEnum.DEFINE:
+            map_list(expr.body)
+        elif expr.exprClass == ExprEnum.CALL:
+            map_list(expr.params)
+        elif expr.exprClass == ExprEnum.IF:
+            expr.cond = f(expr.cond)
+            map_list(expr.then)
+            map_list(expr.otherwise)
+        elif expr.exprClass == ExprEnum.LOOP:
+            expr.init = f(expr.init)
+            expr.test = f(expr.test)
+            expr.update = f(expr.update)
+            map_list(expr.body)
+        elif expr.exprClass == ExprEnum.LIST:
+            expr.size = f(expr.size)
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            expr.index = f(expr.index)
+        elif expr.exprClass == ExprEnum.LIST_SET:
+            expr.index = f(expr.index)
+            expr.val = f(expr.val)
+        elif expr.exprClass == ExprEnum.PRIM_FUNC:
+            pass
+        elif expr.exprClass == ExprEnum.PARA_LOOP:
+            expr.start_index = f(expr.start_index)
+            expr.end_index = f(expr.end_index)
+            map_list(expr.body)
+        elif expr.exprClass == ExprEnum.SCAN:
+            expr.start_index = f(expr.start_index)
+            expr.end_index = f(expr.end_index)
+
+            if expr.term is not None:
+                expr.term = f(expr.term)
+        elif expr.exprClass == ExprEnum.SCATTER_LOOP:
+            expr.start_index = f(expr.start_index)
+            expr.end_index = f(expr.end_index)
+            expr.key = f(expr.key)
+            expr.term = f(expr.term)
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            expr.start_index = f(expr.start_index)
+            expr.end_index = f(expr.end_index)
+
+            if expr.val is not None:
+                expr.val = f(expr.val)
+        elif expr.exprClass == ExprEnum.BREAK:
+            pass
+        elif expr.exprClass == ExprEnum.FIND_LOOP:
+            expr.start_index = f(expr.start_index)
+            expr.end_index = f(expr.end_index)
+            map_list(expr.body)
+            expr.cond = f(expr.cond)
+            map_list(expr.found)
+        elif expr.exprClass == ExprEnum.SELECT:
+            expr.cond = f(expr.cond)
+            expr.then_val = f(expr.then_val)
+            expr.else_val = f(expr.else_val)
+        elif expr.exprClass == ExprEnum.TASKS:
+            map_list(expr.body)
+        elif expr.exprClass == ExprEnum.FORK:
+            if expr.cutoff is not None:
+                expr.cutoff = f(expr.cutoff)
+
+            map_list(expr.body)
+        else:
+            error_str = f'unknown expression type: {expr.exprClass}'
+            raise error.InternalError(expr.loc, error_str)
+
+
+    def __bodies(self, expr):
+        ''' Return the lists of statements directly nested in 'expr'. '''
+
+        if expr.exprClass == ExprEnum.DEFINE:
+            return [expr.body]
+        elif expr.exprClass == ExprEnum.IF:
+            return [expr.then, expr.otherwise]
+        elif expr.exprClass == ExprEnum.LOOP:
+            return [expr.body]
+        elif expr.exprClass == ExprEnum.PARA_LOOP:
+            return [expr.body]
+        elif expr.exprClass == ExprEnum.FIND_LOOP:
+            return [expr.found]
+        elif expr.exprClass == ExprEnum.TASKS or \
+             expr.exprClass == ExprEnum.FORK:
+            return [expr.body]
+
+        return []
+
+
+    def __deep_find_writes(self, expr):
+        '''
+        Return a list of names of the variables set or created and the lists
+        created or with an element set either directly or indirectly by the
+        given expression. The size of each created list is included as
+        '<name>.size'.
+        '''
+
+        writes = []
+
+        if expr.exprClass == ExprEnum.CREATE_VAR or \
+           expr.exprClass == ExprEnum.SET_VAR or \
+           expr.exprClass == ExprEnum.LIST_SET:
+            writes.append(expr.name)
+        elif expr.exprClass == ExprEnum.LIST:
+            writes += [expr.name, f'{expr.name}.size']
+        elif expr.exprClass == ExprEnum.LOOP:
+            if expr.init.exprClass == ExprEnum.CREATE_VAR or \
+               expr.init.exprClass == ExprEnum.SET_VAR:
+                writes.append(expr.init.name)
+        elif expr.exprClass == ExprEnum.PARA_LOOP or \
+             expr.exprClass == ExprEnum.FIND_LOOP:
+            writes.append(expr.index_name)
+        elif expr.exprClass == ExprEnum.SCAN or \
+             expr.exprClass == ExprEnum.SCATTER_LOOP:
+            writes += [expr.name, expr.index_name]
+        elif expr.exprClass == ExprEnum.LIST_OP and expr.op != 'compare':
+            writes.append(expr.name)
+
+        for e in self.__sub_exprs(expr):
+            writes += self.__deep_find_writes(e)
+
+        return writes
+
+
+    def __deep_find_reads(self, expr):
+        ''' Return a list of names of every variable read by the expression. '''
+
+        reads = []
+
+        if expr.exprClass == ExprEnum.GET_VAR:
+            reads.append(expr.name)
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            reads.append(expr.name)
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            reads += self.__list_op_reads(expr)
+
+        for e in self.__sub_exprs(expr):
+            reads += self.__deep_find_reads(e)
+
+        return reads
+
+
+    def __deep_find_list_reads(self, expr):
+        ''' Return a list of names of every list read by list_at. '''
+
+        reads = []
+
+        if expr.exprClass == ExprEnum.LIST_AT:
+            reads.append(expr.name)
+        elif expr.exprClass == ExprEnum.LIST_OP:
+            reads += self.__list_op_reads(expr)
+
+        for e in self.__sub_exprs(expr):
+            reads += self.__deep_find_list_reads(e)
+
+        return reads
+
+
+    def __list_op_reads(self, expr):
+        ''' Return the names of the lists whose elements a ListOp reads. '''
+
+        reads = [] if expr.src is None else [expr.src]
+        if expr.op == 'compare':
+            reads.append(expr.name)
+
+        return reads
+
+
+    def __deep_has_user_call(self, expr):
+        ''' Return true if the expression calls a user defined function. '''
+
+        if expr.exprClass == ExprEnum.CALL and \
+           expr.name not in prim_binary_funcs and \
+           expr.name not in prim_other_funcs:
+            return True
+
+        for e in self.__sub_exprs(expr):
+            if self.__deep_has_user_call(e):
+                return True
+
+        return False
+
+
+    def __breaks_loop(self, expr):
+        '''
+        Return true if the expression contains a Break that leaves the loop
+        the expression is in, rather than a loop nested in the expression.
+        '''
+
+        if expr.exprClass == ExprEnum.BREAK:
+            return True
+        elif expr.exprClass == ExprEnum.LOOP:
+            return False
+
+        return any([self.__breaks_loop(e) for e in self.__sub_exprs(expr)])
+
+
+    def __is_pure(self, expr, allow_traps):
+        '''
+        Return true if evaluating the expression has no side effects and its
+        value only depends on the variables it reads. If 'allow_traps' is false,
+        then expressions that could crash the program, such as a division by a
+        variable or reading a list element that may be out of bounds, are not
+        considered pure.
+        '''
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            return True
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            return True
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            return allow_traps and self.__is_pure(expr.index, allow_traps)
+        elif expr.exprClass == ExprEnum.CALL:
+            if expr.name not in pure_prims:
+                return False
+
+            if not allow_traps and expr.name in trapping_prims:
+                divisor = expr.params[1]
+                if divisor.exprClass != ExprEnum.LITERAL or divisor.val == 0:
+                    return False
+
+            for p in expr.params:
+                if not self.__is_pure(p, allow_traps):
+                    return False
+
+            return True
+        elif expr.exprClass == ExprEnum.SELECT:
+            return all([self.__is_pure(e, allow_traps)
+                        for e in self.__sub_exprs(expr)])
+
+        return False
+
+
+    def __expr_size(self, expr):
+        ''' Return the number of nodes in the expression tree. '''
+        return 1 + sum([self.__expr_size(e) for e in self.__sub_exprs(expr)])
+
+
+    def __fresh_name(self, prefix='opt_tmp', single_assignment=True):
+        '''
+        Return a variable name starting with 'prefix' that is not used anywhere
+        in the code. If 'single_assignment' is true, the variable is a
+        temporary that is created once and never set.
+        '''
+
+        while True:
+            self._tmp_ind += 1
+            name = f'{prefix}{self._tmp_ind}'
+
+            if name not in self._used_names:
+                self._used_names.append(name)
+
+                if single_assignment:
+                    self._temps.append(name)
+
+                return name
+
+
+    def __collect_names(self):
+        ''' Record every name in the code so that new names do not clash. '''
+
+        def collect(expr):
+            if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.DEFINE,
+                                  ExprEnum.LIST, ExprEnum.PRIM_FUNC]:
+                self._used_names.append(expr.name)
+
+            if expr.exprClass == ExprEnum.DEFINE:
+                self._used_names += [arg[1] for arg in expr.args]
+
+            for e in self.__sub_exprs(expr):
+                collect(e)
+
+        for e in self.parsed_exprs:
+            collect(e)
+
+            # Functions can set variables created outside of any function.
+            if e.exprClass == ExprEnum.CREATE_VAR or \
+               e.exprClass == ExprEnum.LIST:
+                self._global_names.append(e.name)
+
+
+    def __replace_equal(self, expr, target, name):
+        '''
+        Return 'expr' with every subexpression equal to 'target' replaced by a
+        read of the variable 'name'.
+        '''
+
+        if Expr.equal(expr, target):
+            get_var = GetVar(expr.loc, name)
+            get_var.type = target.type
+            return get_var
+
+        self.__map_sub_exprs(expr,
+                             lambda e: self.__replace_equal(e, target, name))
+        return expr
+
+
+    def __is_loop_invariant(self, expr, variant):
+        '''
+        Return true if the expression always has the same value inside a loop
+        that writes the 'variant' names, and if it is safe to evaluate it
+        before the loop even when the loop would not evaluate it.
+        '''
+
+        if not self.__is_pure(expr, allow_traps=False):
+            return False
+
+        for name in self.__deep_find_reads(expr):
+            if name in variant:
+                return False
+
+            if '.' in name and name[:name.find('.')] in variant:
+                return False
+
+        return True
+
+
+    def __find_loop_invariants(self, expr, variant, found):
+        '''
+        Add the largest loop invariant subexpressions of 'expr' that are worth
+        storing in a temporary to 'found'.
+        '''
+
+        worth_hoisting = \
+            (expr.exprClass == ExprEnum.CALL) or \
+            (expr.exprClass == ExprEnum.GET_VAR and expr.name.endswith('.size'))
+
+        if worth_hoisting and expr.type in [Type.INT, Type.FLOAT] and \
+           self.__is_loop_invariant(expr, variant):
+            for f in found:
+                if Expr.equal(f, expr):
+                    return
+
+            found.append(expr)
+            return
+
+        for e in self.__sub_exprs(expr):
+            self.__find_loop_invariants(e, variant, found)
+
+
+    def __hoist_loop_invariants(self, loop):
+        '''
+        Remove loop invariant expressions from the loop and return a list of
+        CreateVar expressions that compute them once and must be placed just
+        before the loop.
+        '''
+
+        hoisted = []
+
+        variant = self.__deep_find_writes(loop)
+        if self.__deep_has_user_call(loop):
+            variant += self._global_names
+
+        # Temporaries made for inner loops may be invariant in this loop too,
+        # in which case the whole temporary is moved. Temporaries are only
+        # assigned once, so they are no longer variant after being moved.
+        for e in list(loop.body):
+            if e.exprClass == ExprEnum.CREATE_VAR and e.name in self._temps:
+                others = [v for v in variant if v != e.name]
+
+                if self.__is_loop_invariant(e.val, others):
+                    loop.body.remove(e)
+                    hoisted.append(e)
+                    variant = others
+
+        invariants = []
+        for e in [loop.test, loop.update] + loop.body:
+            self.__find_loop_invariants(e, variant, invariants)
+
+        for inv in invariants:
+            name = self.__fresh_name()
+            hoisted.append(CreateVar(inv.loc, inv.type, name, inv))
+
+            loop.test = self.__replace_equal(loop.test, inv, name)
+            loop.update = self.__replace_equal(loop.update, inv, name)
+
+            for (i, e) in enumerate(loop.body):
+                loop.body[i] = self.__replace_equal(e, inv, name)
+
+        return hoisted
+
+
+    def __find_evaluated_exprs(self, expr, found):
+        '''
+        Add to 'found' every pure Call that is always evaluated when 'expr' is
+        evaluated, so it is safe to evaluate it just before 'expr'.
+        '''
+
+        if expr.exprClass == ExprEnum.IF:
+            self.__find_evaluated_exprs(expr.cond, found)
+            return
+        elif expr.exprClass == ExprEnum.LOOP:
+            self.__find_evaluated_exprs(expr.init, found)
+            return
+        elif expr.exprClass in [ExprEnum.DEFINE, ExprEnum.PARA_LOOP]:
+            return
+
+        if expr.exprClass == ExprEnum.CALL and \
+           expr.type in [Type.INT, Type.FLOAT] and \
+           self.__is_pure(expr, allow_traps=True) and \
+           len(self.__deep_find_reads(expr)) > 0:
+            found.append(expr)
+
+        sub_exprs = self.__sub_exprs(expr)
+
+        # The second argument of 'and' and 'or' is not always evaluated.
+        if expr.exprClass == ExprEnum.CALL and expr.name in ['and', 'or']:
+            sub_exprs = sub_exprs[:1]
+
+        for e in sub_exprs:
+            self.__find_evaluated_exprs(e, found)
+
+
+    def __eliminate_common_subexprs(self, body):
+        '''
+        Store pure expressions that are computed more than once in the body in
+        a temporary so they are only computed once.
+        '''
+
+        while True:
+            # Find each candidate along with the index of its statement.
+            occurrences = []
+            for (i, e) in enumerate(body):
+                found = []
+                self.__find_evaluated_exprs(e, found)
+                occurrences += [(f, i) for f in found]
+
+            # Try the largest expressions first so that their subexpressions
+            # are shared along with them.
+            occurrences.sort(key=lambda x: -self.__expr_size(x[0]))
+
+            replaced = False
+            for (target, first) in occurrences:
+                matches = [i for (e, i) in occurrences
+                           if Expr.equal(e, target)]
+                if len(matches) < 2:
+                    continue
+
+                last = max(matches)
+
+                # The value must not change between the first and the last use.
+                # The variable set by the last statement is only set after the
+                # statement's value is computed.
+                writes = []
+                for e in body[first:last]:
+                    writes += self.__deep_find_writes(e)
+
+                for e in self.__sub_exprs(body[last]):
+                    writes += self.__deep_find_writes(e)
+
+                # User defined functions can set global variables and the
+                # elements of lists passed to them.
+                if any([self.__deep_has_user_call(e)
+                        for e in body[first:last + 1]]):
+                    writes += self._global_names
+                    writes += self.__deep_find_list_reads(target)
+
+                reads = self.__deep_find_reads(target)
+                if any([r in writes for r in reads]):
+                    continue
+
+                name = self.__fresh_name()
+                for i in range(first, last + 1):
+                    body[i] = self.__replace_equal(body[i], target, name)
+
+                body.insert(first, CreateVar(target.loc, target.type, name,
+                                             target))
+                replaced = True
+                break
+
+            if not replaced:
+                return
+
+
+    def __optimize_body(self, body):
+        ''' Optimize each statement in a list of statements. '''
+
+        new_body = []
+
+        for e in body:
+            # Inner statement lists are optimized first so that temporaries
+            # made for inner loops can be moved out of outer loops.
+            for b in self.__bodies(e):
+                self.__optimize_body(b)
+
+            if e.exprClass == ExprEnum.LOOP:
+                new_body += self.__hoist_loop_invariants(e)
+
+            new_body.append(e)
+
+        body[:] = new_body
+        self.__eliminate_common_subexprs(body)
+
+
+    def __call_graph(self):
+        '''
+        Return a dictionary mapping the name of each user defined function to
+        the names of the user defined functions it calls directly.
+        '''
+
+        def find_calls(expr):
+            calls = []
+
+            if expr.exprClass == ExprEnum.CALL and expr.name in self._defines:
+                calls.append(expr.name)
+
+            for e in self.__sub_exprs(expr):
+                calls += find_calls(e)
+
+            return calls
+
+        return {name: find_calls(d) for (name, d) in self._defines.items()}
+
+
+    def __is_recursive(self, name, graph):
+        ''' Return true if the function can call itself, maybe indirectly. '''
+
+        seen = []
+        to_visit = list(graph[name])
+
+        while len(to_visit) > 0:
+            f = to_visit.pop()
+
+            if f == name:
+                return True
+
+            if f not in seen:
+                seen.append(f)
+                to_visit += graph[f]
+
+        return False
+
+
+    def __local_names(self, define):
+        ''' Return the names of the arguments and variables of a function. '''
+
+        names = [arg[1] for arg in define.args]
+
+        def find_locals(expr):
+            if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+                names.append(expr.name)
+
+            for e in self.__sub_exprs(expr):
+                find_locals(e)
+
+        for e in define.body:
+            find_locals(e)
+
+        return names
+
+
+    def __is_pure_function(self, define, pure):
+        '''
+        Return true if the function has no side effects and its result only
+        depends on its arguments, assuming that the functions in 'pure' do
+        too. The function may only call primitive functions other than print,
+        rand, srand, and time and the functions in 'pure', may only set the
+        elements of lists that it creates, and may not use variables created
+        outside of it.
+        '''
+
+        local_names = self.__local_names(define)
+        created = []
+
+        def find_created(expr):
+            if expr.exprClass == ExprEnum.LIST:
+                created.append(expr.name)
+
+            for e in self.__sub_exprs(expr):
+                find_created(e)
+
+        def is_pure(expr):
+            if expr.exprClass == ExprEnum.CALL:
+                if expr.name in impure_prims:
+                    return False
+                if expr.name not in prim_binary_funcs and \
+                   expr.name not in prim_other_funcs and \
+                   expr.name not in pure:
+                    return False
+            elif expr.exprClass == ExprEnum.LIST_SET:
+                if expr.name not in created:
+                    return False
+
+            return all([is_pure(e) for e in self.__sub_exprs(expr)])
+
+        for e in define.body:
+            find_created(e)
+
+        for e in define.body:
+            if not is_pure(e):
+                return False
+
+            for name in self.__deep_find_reads(e) + self.__deep_find_writes(e):
+                base = name[:name.find('.')] if '.' in name else name
+
+                if base not in local_names:
+                    return False
+
+        return True
+
+
+    def __constant_args(self, call, callee, consts):
+        '''
+        Return a map from the position of each argument of the call that is
+        known before the program runs to a tuple (kind, value), where 'kind'
+        is 'val' for an int or float literal and 'size' for a list with a
+        literal size. 'consts' maps the keys of the variables of the caller
+        to their constant values.
+        '''
+
+        args = {}
+        local_names = self.__local_names(callee)
+
+        for (i, (p, (arg_type, arg_name))) in enumerate(zip(call.params,
+                                                            callee.args)):
+            if p.exprClass == ExprEnum.LITERAL and \
+               arg_type in [Type.INT, Type.FLOAT]:
+                args[i] = ('val', p.val)
+            elif p.exprClass == ExprEnum.GET_VAR and p.env is not None and \
+                 arg_type in [Type.LIST_INT, Type.LIST_FLOAT,
+                              Type.LIST_STRING] and \
+                 local_names.count(arg_name) == 1:
+                size = consts.get(self.__binding(p, f'{p.name}.size'))
+                if size is not None:
+                    args[i] = ('size', size.val)
+
+        return args
+
+
+    def __specialize_define(self, define, args):
+        '''
+        Return a copy of the function for calls with the constant arguments
+        in 'args', as returned by __constant_args(). The int and float
+        arguments become variables created at the start of the body, and the
+        sizes of the list arguments become literals.
+        '''
+
+        clone = copy.deepcopy(define)
+        clone.name = self.__fresh_name(f'{define.name}_spec', False)
+        loc = define.loc
+
+        clone.args = []
+        prefix = []
+        for (i, (arg_type, arg_name)) in enumerate(define.args):
+            if i in args and args[i][0] == 'val':
+                prefix.append(CreateVar(loc, arg_type, arg_name,
+                                        Literal(loc, arg_type, args[i][1])))
+                continue
+
+            clone.args.append((arg_type, arg_name))
+
+            if i in args:
+                size = args[i][1]
+                for (j, e) in enumerate(clone.body):
+                    clone.body[j] = self.__replace_reads(
+                        e, f'{arg_name}.size',
+                        lambda: Literal(loc, Type.INT, size))
+
+        clone.body = prefix + clone.body
+        return clone
+
+
+    def __specialize_calls(self):
+        '''
+        Replace each call to a non-recursive user defined function that passes
+        literals or lists with a literal size by a call to a copy of the
+        function for those arguments, so that constant propagation can use
+        the arguments in the copy. Copies are shared by calls with the same
+        constant arguments, and a function that is no longer called after
+        this is removed.
+        '''
+
+        defines = [e for e in self.parsed_exprs
+                   if e.exprClass == ExprEnum.DEFINE]
+        graph = self.__call_graph()
+        copies = {}  # Map from (name, constant arguments) to the copy's name
+        counts = {}  # Map from function name to its number of copies
+
+        def find_calls(expr, calls):
+            if expr.exprClass == ExprEnum.CALL and \
+               expr.name in self._defines:
+                calls.append(expr)
+
+            for e in self.__sub_exprs(expr):
+                find_calls(e, calls)
+
+        for d in defines:
+            consts = {}
+            unknown_sets = []
+            for e in d.body:
+                self.__find_constant_vars(e, consts, unknown_sets)
+
+            calls = []
+            find_calls(d, calls)
+
+            for call in calls:
+                callee = self._defines[call.name]
+                if callee.name == 'main' or \
+                   self.__is_recursive(callee.name, graph):
+                    continue
+
+                args = self.__constant_args(call, callee, consts)
+                if len(args) == 0:
+                    continue
+
+                key = (callee.name, tuple(sorted(args.items())))
+                if key not in copies:
+                    if counts.get(callee.name, 0) >= specialize_limit:
+                        continue
+
+                    counts[callee.name] = counts.get(callee.name, 0) + 1
+                    clone = self.__specialize_define(callee, args)
+                    copies[key] = clone.name
+
+                    index = self.parsed_exprs.index(callee)
+                    self.parsed_exprs.insert(index + counts[callee.name],
+                                             clone)
+
+                call.name = copies[key]
+                call.params = [p for (i, p) in enumerate(call.params)
+                               if i not in args or args[i][0] != 'val']
+
+        # Remove the functions that are only called through their copies.
+        calls = []
+        for e in self.parsed_exprs:
+            find_calls(e, calls)
+
+        called = [call.name for call in calls]
+        self.parsed_exprs[:] = [e for e in self.parsed_exprs
+                                if e.exprClass != ExprEnum.DEFINE or
+                                e.name not in counts or e.name in called]
+        self._defines = {e.name: e for e in self.parsed_exprs
+                         if e.exprClass == ExprEnum.DEFINE}
+
+
+    def __pure_functions(self):
+        '''
+        Return the names of the user defined functions that have no side
+        effects and whose result only depends on their arguments.
+        '''
+
+        # Start by assuming every function is pure, so that recursive calls do
+        # not make a function impure, and remove functions until nothing
+        # changes.
+        pure = list(self._defines)
+
+        changed = True
+        while changed:
+            changed = False
+
+            for name in list(pure):
+                if not self.__is_pure_function(self._defines[name], pure):
+                    pure.remove(name)
+                    changed = True
+
+        return pure
+
+
+    def __evaluate(self, expr, scopes):
+        '''
+        Return the value of the expression by running it with the variables
+        in 'scopes', a list of maps from names to values with the innermost
+        scope last. Int values are Python ints and lists are Python lists
+        that have None for the elements that were never set. Expressions
+        that do not have a value return None. Raise EvaluationStopped if the
+        value cannot be computed while compiling or if it takes more than
+        eval_step_limit steps.
+        '''
+
+        self._eval_steps += 1
+        if self._eval_steps > eval_step_limit:
+            raise EvaluationStopped()
+
+        def scope_of(name):
+            for scope in scopes[::-1]:
+                if name in scope:
+                    return scope
+
+            raise EvaluationStopped()
+
+        def int_val(e):
+            val = self.__evaluate(e, scopes)
+            if not isinstance(val, int):
+                raise EvaluationStopped()
+
+            return val
+
+        def run(body):
+            scopes.append({})
+            try:
+                for e in body:
+                    self.__evaluate(e, scopes)
+            finally:
+                scopes.pop()
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            if expr.type != Type.INT:
+                raise EvaluationStopped()
+
+            return expr.val
+        elif expr.exprClass == ExprEnum.CREATE_VAR:
+            if expr.type != Type.INT:
+                raise EvaluationStopped()
+
+            scopes[-1][expr.name] = int_val(expr.val)
+        elif expr.exprClass == ExprEnum.SET_VAR:
+            val = int_val(expr.val)
+            scope_of(expr.name)[expr.name] = val
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            if expr.name.endswith('.size'):
+                name = expr.name[:-len('.size')]
+                return len(scope_of(name)[name])
+
+            return scope_of(expr.name)[expr.name]
+        elif expr.exprClass == ExprEnum.CALL:
+            # The second argument of 'and' and 'or' is only evaluated if it
+            # can change the result.
+            if expr.name in ['and', 'or']:
+                first = int_val(expr.params[0]) != 0
+                if first == (expr.name == 'or'):
+                    return int(first)
+
+                return int(int_val(expr.params[1]) != 0)
+            elif expr.name in pure_prims:
+                val = eval_prim(expr.name, [int_val(p) for p in expr.params])
+            elif expr.name in self._pure_funcs:
+                define = self._defines[expr.name]
+                args = [self.__evaluate(p, scopes) for p in expr.params]
+                val = self.__evaluate_call(define, args)
+            else:
+                val = None
+
+            if val is None:
+                raise EvaluationStopped()
+
+            return val
+        elif expr.exprClass == ExprEnum.IF:
+            if int_val(expr.cond) != 0:
+                run(expr.then)
+            else:
+                run(expr.otherwise)
+        elif expr.exprClass == ExprEnum.LOOP:
+            scopes.append({})
+            self.__evaluate(expr.init, scopes)
+
+            while int_val(expr.test) != 0:
+                try:
+                    run(expr.body)
+                except LoopExited:
+                    break
+
+                self.__evaluate(expr.update, scopes)
+
+            scopes.pop()
+        elif expr.exprClass == ExprEnum.LIST:
+            size = int_val(expr.size)
+            if expr.elem_type != Type.INT or size < 0 or \
+               size > eval_step_limit:
+                raise EvaluationStopped()
+
+            scopes[-1][expr.name] = [None] * size
+        elif expr.exprClass == ExprEnum.LIST_AT:
+            lst = scope_of(expr.name)[expr.name]
+            index = int_val(expr.index)
+            if index < 0 or index >= len(lst) or lst[index] is None:
+                raise EvaluationStopped()
+
+            return lst[index]
+        elif expr.exprClass == ExprEnum.LIST_SET:
+            lst = scope_of(expr.name)[expr.name]
+            index = int_val(expr.index)
+            val = int_val(expr.val)
+            if index < 0 or index >= len(lst):
+                raise EvaluationStopped()
+
+            lst[index] = val
+        elif expr.exprClass == ExprEnum.BREAK:
+            raise LoopExited()
+        else:
+            raise EvaluationStopped()
+
+        return None
+
+
+    def __evaluate_call(self, define, args):
+        '''
+        Return the int result of calling the function with the values 'args'
+        while compiling, or raise EvaluationStopped if it cannot be computed.
+        '''
+
+        scopes = [{arg[1]: val for (arg, val) in zip(define.args, args)}]
+
+        val = None
+        for e in define.body:
+            val = self.__evaluate(e, scopes)
+
+        if not isinstance(val, int):
+            raise EvaluationStopped()
+
+        return val
+
+
+    def __evaluate_pure_calls(self, expr):
+        '''
+        Return 'expr' with each call of a function without side effects on
+        int literals replaced by the literal value of the call, if the value
+        can be computed while compiling.
+        '''
+
+        self.__map_sub_exprs(expr, self.__evaluate_pure_calls)
+
+        if expr.exprClass != ExprEnum.CALL or \
+           expr.name not in self._pure_funcs or \
+           self._defines[expr.name].type != Type.INT:
+            return expr
+
+        for p in expr.params:
+            if p.exprClass != ExprEnum.LITERAL or p.type != Type.INT:
+                return expr
+
+        key = (expr.name, tuple([p.val for p in expr.params]))
+        if key not in self._evaluated:
+            self._eval_steps = 0
+
+            try:
+                self._evaluated[key] = self.__evaluate_call(
+                    self._defines[expr.name], list(key[1]))
+            except (EvaluationStopped, RecursionError):
+                self._evaluated[key] = None
+
+        if self._evaluated[key] is None:
+            return expr
+
+        self._changed = True
+        return Literal(expr.loc, Type.INT, self._evaluated[key])
+
+
+    def __can_inline(self, define, graph):
+        '''
+        Return true if calls to the function should be replaced by the body of
+        the function. Only small functions that are not recursive and that do
+        not use variables created outside of the function are inlined.
+        '''
+
+        if self.__is_recursive(define.name, graph):
+            return False
+
+        if sum([self.__expr_size(e) for e in define.body]) > inline_size_limit:
+            return False
+
+        local_names = self.__local_names(define)
+        for e in define.body:
+            for name in self.__deep_find_reads(e) + self.__deep_find_writes(e):
+                base = name[:name.find('.')] if '.' in name else name
+
+                if base not in local_names:
+                    return False
+
+        return True
+
+
+    def __find_inline_call(self, expr):
+        '''
+        Return the first call to a function that can be inlined that is always
+        evaluated when 'expr' is evaluated, or None if there is no such call.
+        '''
+
+        if expr.exprClass == ExprEnum.IF:
+            return self.__find_inline_call(expr.cond)
+        elif expr.exprClass == ExprEnum.LOOP:
+            return self.__find_inline_call(expr.init)
+        elif expr.exprClass in [ExprEnum.DEFINE, ExprEnum.PARA_LOOP]:
+            return None
+
+        sub_exprs = self.__sub_exprs(expr)
+
+        if expr.exprClass == ExprEnum.CALL:
+            if expr.name in self._inlinable:
+                return expr
+
+            # The second argument of 'and' and 'or' is not always evaluated.
+            if expr.name in ['and', 'or']:
+                sub_exprs = sub_exprs[:1]
+
+        for e in sub_exprs:
+            call = self.__find_inline_call(e)
+            if call is not None:
+                return call
+
+        return None
+
+
+    def __contains(self, expr, sub_expr):
+        ''' Return true if 'sub_expr' is 'expr' or one of its subexpressions. '''
+
+        if expr is sub_expr:
+            return True
+
+        for e in self.__sub_exprs(expr):
+            if self.__contains(e, sub_expr):
+                return True
+
+        return False
+
+
+    def __can_move_before(self, expr, call, written_lists):
+        '''
+        Return true if the body of 'call' can run before the rest of the
+        statement 'expr' containing it. The parts of the statement that do not
+        contain the call must not have side effects or read lists that the
+        function may set. If 'written_lists' is None, the function may set any
+        list.
+        '''
+
+        if expr is call:
+            return True
+
+        if not self.__contains(expr, call):
+            if not self.__is_pure(expr, allow_traps=True):
+                return False
+
+            list_reads = self.__deep_find_list_reads(expr)
+            if written_lists is None:
+                return len(list_reads) == 0
+
+            return not any([name in written_lists for name in list_reads])
+
+        if expr.exprClass == ExprEnum.IF:
+            return self.__can_move_before(expr.cond, call, written_lists)
+        elif expr.exprClass == ExprEnum.LOOP:
+            return self.__can_move_before(expr.init, call, written_lists)
+
+        # The expressions that contain the call are evaluated after it.
+        for e in self.__sub_exprs(expr):
+            if not self.__can_move_before(e, call, written_lists):
+                return False
+
+        return True
+
+
+    def __rename_vars(self, expr, renames):
+        ''' Rename every variable in the expression using 'renames'. '''
+
+        if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR,
+                              ExprEnum.GET_VAR, ExprEnum.LIST,
+                              ExprEnum.LIST_AT, ExprEnum.LIST_SET]:
+            if '.' in expr.name:
+                dot = expr.name.find('.')
+                base = expr.name[:dot]
+                expr.name = renames.get(base, base) + expr.name[dot:]
+            else:
+                expr.name = renames.get(expr.name, expr.name)
+
+        for e in self.__sub_exprs(expr):
+            self.__rename_vars(e, renames)
+
+
+    def __expand_call(self, call):
+        '''
+        Return a tuple with the list of statements that run the body of the
+        called function and the expression for the value the function returns.
+        Every variable of the function gets a new name so that it cannot clash
+        with the variables at the call site.
+        '''
+
+        define = self._defines[call.name]
+        body = copy.deepcopy(define.body)
+        stmts = []
+        renames = {}
+
+        written = []
+        for e in body:
+            written += self.__deep_find_writes(e)
+
+        # Lists are passed by reference, so the list argument is used directly.
+        # Other arguments are passed by value, so they are copied unless the
+        # argument is a variable that the function does not set. The function
+        # cannot set the variables at the call site, so the variable keeps its
+        # value while the function body runs.
+        for ((arg_type, arg_name), param) in zip(define.args, call.params):
+            if arg_type in [Type.LIST_INT, Type.LIST_FLOAT, Type.LIST_STRING]:
+                renames[arg_name] = param.name
+            elif param.exprClass == ExprEnum.GET_VAR and \
+                 arg_name not in written:
+                renames[arg_name] = param.name
+            else:
+                new_name = self.__fresh_name(f'{arg_name}_inl', False)
+                renames[arg_name] = new_name
+                stmts.append(CreateVar(call.loc, arg_type, new_name, param))
+
+        for name in self.__local_names(define)[len(define.args):]:
+            if name not in renames:
+                renames[name] = self.__fresh_name(f'{name}_inl', False)
+
+        for e in body:
+            self.__rename_vars(e, renames)
+
+        return (stmts + body[:-1], body[-1])
+
+
+    def __written_lists(self, call):
+        '''
+        Return the names of the lists at the call site that the called function
+        may set, or None if the function may set any list.
+        '''
+
+        define = self._defines[call.name]
+        if any([self.__deep_has_user_call(e) for e in define.body]):
+            return None
+
+        written = []
+        for e in define.body:
+            written += self.__deep_find_writes(e)
+
+        lists = []
+        for ((arg_type, arg_name), param) in zip(define.args, call.params):
+            if arg_name in written and param.exprClass == ExprEnum.GET_VAR:
+                lists.append(param.name)
+
+        return lists
+
+
+    def __inline_calls(self, body, in_loop):
+        '''
+        Replace calls to small functions made inside loops with the body of the
+        function. 'in_loop' is true if the body is part of a loop.
+        '''
+
+        i = 0
+        while i < len(body):
+            e = body[i]
+
+            for b in self.__bodies(e):
+                self.__inline_calls(b, in_loop or e.exprClass == ExprEnum.LOOP)
+
+            call = self.__find_inline_call(e) if in_loop else None
+
+            # List arguments must be list variables so the function body can
+            # refer to them by name.
+            if call is not None:
+                define = self._defines[call.name]
+                for ((arg_type, _), param) in zip(define.args, call.params):
+                    if arg_type in [Type.LIST_INT, Type.LIST_FLOAT,
+                                    Type.LIST_STRING] and \
+                       param.exprClass != ExprEnum.GET_VAR:
+                        call = None
+                        break
+
+            if call is None or \
+               not self.__can_move_before(e, call, self.__written_lists(call)):
+                i += 1
+                continue
+
+            (stmts, ret_expr) = self.__expand_call(call)
+
+            if e is call:
+                # The returned value is not used.
+                if not self.__is_pure(ret_expr, allow_traps=True):
+                    stmts.append(ret_expr)
+            else:
+                self.__map_sub_exprs(e, lambda x: self.__replace_expr(x, call,
+                                                                      ret_expr))
+                stmts.append(e)
+
+            # The new statements are checked again since they may call other
+            # functions that can be inlined.
+            body[i:i + 1] = stmts
+
+
+    def __replace_expr(self, expr, old, new):
+        ''' Return 'expr' with the subexpression 'old' replaced by 'new'. '''
+
+        if expr is old:
+            return new
+
+        self.__map_sub_exprs(expr, lambda e: self.__replace_expr(e, old, new))
+        return expr
+
+
+    def __inline_functions(self, defines):
+        ''' Inline calls to small user defined functions inside loops. '''
+
+        self._defines = {d.name: d for d in defines}
+
+        graph = self.__call_graph()
+        self._inlinable = [d.name for d in defines
+                           if self.__can_inline(d, graph)]
+
+        for d in defines:
+            self.__inline_calls(d.body, False)
+
+
+    def __is_simple_invariant(self, expr, index, writes):
+        '''
+        Return true if the expression is an int literal or a variable other
+        than the loop index that is not in 'writes'.
+        '''
+
+        if expr.exprClass == ExprEnum.LITERAL:
+            return expr.type == Type.INT
+        elif expr.exprClass == ExprEnum.GET_VAR:
+            base = expr.name[:expr.name.find('.')] if '.' in expr.name \
+                   else expr.name
+            return expr.name != index and expr.name not in writes and \
+                   base not in writes
+
+        return False
+
+
+    def __loop_bounds(self, loop):
+        '''
+        Return a tuple (index, start, end, inclusive) if the loop counts its
+        index up by one from 'start' while the index is less than 'end', or
+        less than or equal to 'end' if 'inclusive' is true. 'start' and 'end'
+        are literals or variables that the loop does not set. Return None if
+        the loop does not have this form or if it can break out early.
+        '''
+
+        init = loop.init
+        if init.exprClass != ExprEnum.CREATE_VAR or init.type != Type.INT:
+            return None
+
+        # A loop that can break out early may stop before the end.
+        if any([self.__breaks_loop(e) for e in loop.body]):
+            return None
+
+        index = init.name
+
+        writes = []
+        for e in [loop.test] + loop.body:
+            writes += self.__deep_find_writes(e)
+
+        # The index must only be set by the update, and inner loops must not
+        # create another variable with the same name.
+        if index in writes:
+            return None
+
+        def is_invariant(e):
+            return self.__is_simple_invariant(e, index, writes)
+
+        start = init.val
+        if not is_invariant(start):
+            return None
+
+        test = loop.test
+        if test.exprClass != ExprEnum.CALL or test.name not in ['<', '<='] or \
+           test.params[0].exprClass != ExprEnum.GET_VAR or \
+           test.params[0].name != index or not is_invariant(test.params[1]):
+            return None
+
+        end = test.params[1]
+
+        update = loop.update
+        if update.exprClass != ExprEnum.SET_VAR or update.name != index or \
+           update.val.exprClass != ExprEnum.CALL or update.val.name != '+':
+            return None
+
+        params = update.val.params
+        is_index = [p.exprClass == ExprEnum.GET_VAR and p.name == index
+                    for p in params]
+        is_one = [p.exprClass == ExprEnum.LITERAL and p.val == 1
+                  for p in params]
+
+        if not ((is_index[0] and is_one[1]) or (is_one[0] and is_index[1])):
+            return None
+
+        return (index, start, end, test.name == '<=')
+
+
+    def __int_get(self, loc, name):
+        ''' Return a GetVar expression for an int variable. '''
+        e = GetVar(loc, name)
+        e.type = Type.INT
+        return e
+
+
+    def __int_call(self, loc, name, params):
+        ''' Return a Call expression for a primitive function on ints. '''
+        e = Call(loc, name, params)
+        e.type = Type.INT
+        return e
+
+
+    def __int_set(self, loc, name, val):
+        ''' Return a SetVar expression for an int variable. '''
+        e = SetVar(loc, name, val)
+        e.type = Type.INT
+        return e
+
+
+    def __replace_reads(self, expr, name, make_expr):
+        '''
+        Return 'expr' with every read of the variable 'name' replaced by a new
+        expression made by calling 'make_expr'.
+        '''
+
+        if expr.exprClass == ExprEnum.GET_VAR and expr.name == name:
+            return make_expr()
+
+        self.__map_sub_exprs(expr, lambda e: self.__replace_reads(e, name,
+                                                                  make_expr))
+        return expr
+
+
+    def __find_induction_var(self, loop, bounds):
+        '''
+        Return a tuple (stmt_index, name, op, step) for a variable that is
+        changed by a constant 'step' in each iteration of the loop by the
+        statement at 'stmt_index' in the loop body. 'op' is '+' or '-'. Return
+        None if there is no such variable.
+        '''
+
+        (index, _, _, _) = bounds
+
+        writes = self.__deep_find_writes(loop)
+        header_reads = []
+        for e in [loop.init, loop.test, loop.update]:
+            header_reads += self.__deep_find_reads(e)
+
+        for (i, e) in enumerate(loop.body):
+            if e.exprClass != ExprEnum.SET_VAR or e.type != Type.INT or \
+               e.name == index or e.name in self._global_names or \
+               writes.count(e.name) != 1 or e.name in header_reads:
+                continue
+
+            val = e.val
+            if val.exprClass != ExprEnum.CALL or val.name not in ['+', '-']:
+                continue
+
+            # Find which parameter reads the variable and which is the step.
+            for (j, p) in enumerate(val.params):
+                if p.exprClass != ExprEnum.GET_VAR or p.name != e.name:
+                    continue
+
+                # Subtracting the variable from the step is not a constant
+                # change.
+                if val.name == '-' and j == 1:
+                    continue
+
+                step = val.params[1 - j]
+
+                if step.exprClass == ExprEnum.LITERAL:
+                    return (i, e.name, val.name, step)
+
+                if step.exprClass == ExprEnum.GET_VAR and \
+                   step.name != e.name and step.name not in writes:
+                    return (i, e.name, val.name, step)
+
+        return None
+
+
+    def __rewrite_induction_vars(self, loop):
+        '''
+        Replace variables that the loop changes by a constant amount in each
+        iteration with a closed form expression of the loop index, so that the
+        loop no longer sets them. Return a list of statements that must be
+        placed after the loop to give the variables their final values.
+        '''
+
+        bounds = self.__loop_bounds(loop)
+        if bounds is None:
+            return []
+
+        (index, start, end, inclusive) = bounds
+        after_loop = []
+
+        while True:
+            found = self.__find_induction_var(loop, bounds)
+            if found is None:
+                return after_loop
+
+            (stmt_ind, name, op, step) = found
+            loc = loop.body[stmt_ind].loc
+
+            def iterations(extra):
+                ''' Return (index - start + extra). '''
+                iters = self.__int_call(loc, '-', [self.__int_get(loc, index),
+                                                   copy.deepcopy(start)])
+                if extra != 0:
+                    iters = self.__int_call(loc, '+', [iters,
+                                                       Literal(loc, Type.INT,
+                                                               extra)])
+                return iters
+
+            def value(extra):
+                ''' Return the value of the variable after some iterations. '''
+                change = self.__int_call(loc, '*', [iterations(extra),
+                                                    copy.deepcopy(step)])
+                return self.__int_call(loc, op, [self.__int_get(loc, name),
+                                                 change])
+
+            # Reads before the set see the value from before this iteration,
+            # and reads after it see the value after this iteration.
+            for i in range(len(loop.body)):
+                if i < stmt_ind:
+                    loop.body[i] = self.__replace_reads(loop.body[i], name,
+                                                        lambda: value(0))
+                elif i > stmt_ind:
+                    loop.body[i] = self.__replace_reads(loop.body[i], name,
+                                                        lambda: value(1))
+
+            del loop.body[stmt_ind]
+
+            # After the loop, the variable has changed once per iteration.
+            iters = self.__int_call(loc, '-', [copy.deepcopy(end),
+                                               copy.deepcopy(start)])
+            if inclusive:
+                iters = self.__int_call(loc, '+', [iters,
+                                                   Literal(loc, Type.INT, 1)])
+
+            final = self.__int_call(loc, op, [
+                self.__int_get(loc, name),
+                self.__int_call(loc, '*', [iters, copy.deepcopy(step)])])
+
+            cond = self.__int_call(loc, '<=' if inclusive else '<',
+                                   [copy.deepcopy(start), copy.deepcopy(end)])
+            after_loop.append(If(loc, cond, [self.__int_set(loc, name, final)],
+                                 []))
+
+
+    def __rewrite_all_induction_vars(self, body):
+        ''' Rewrite the induction variables of every loop in the body. '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__rewrite_all_induction_vars(b)
+
+            new_body.append(e)
+
+            if e.exprClass == ExprEnum.LOOP:
+                new_body += self.__rewrite_induction_vars(e)
+
+        body[:] = new_body
+
+
+    def __find_reducible_mult(self, expr, index, invariant):
+        '''
+        Return a multiplication in the expression of the form
+        (index + a) * b, where 'a' is optional and 'a' and 'b' are invariant,
+        or None if there is none. The multiplication is returned as a tuple
+        (mult, offset, factor), where offset is the expression (index + a).
+        '''
+
+        if expr.exprClass == ExprEnum.CALL and expr.name == '*':
+            for j in range(2):
+                offset = expr.params[j]
+                factor = expr.params[1 - j]
+
+                if not invariant(factor):
+                    continue
+
+                if offset.exprClass == ExprEnum.GET_VAR and \
+                   offset.name == index:
+                    return (expr, offset, factor)
+
+                if offset.exprClass == ExprEnum.CALL and \
+                   offset.name in ['+', '-'] and \
+                   offset.params[0].exprClass == ExprEnum.GET_VAR and \
+                   offset.params[0].name == index and \
+                   invariant(offset.params[1]):
+                    return (expr, offset, factor)
+
+        for e in self.__sub_exprs(expr):
+            found = self.__find_reducible_mult(e, index, invariant)
+            if found is not None:
+                return found
+
+        return None
+
+
+    def __reduce_loop_strength(self, loop):
+        '''
+        Replace multiplications of the loop index by an invariant value with a
+        variable that is increased by that value in each iteration. Return the
+        list of statements that must be placed before the loop.
+        '''
+
+        bounds = self.__loop_bounds(loop)
+        if bounds is None:
+            return []
+
+        (index, start, _, _) = bounds
+        before_loop = []
+
+        writes = self.__deep_find_writes(loop)
+
+        def invariant(e):
+            return self.__is_simple_invariant(e, index, writes)
+
+        while True:
+            found = None
+            for e in loop.body:
+                found = self.__find_reducible_mult(e, index, invariant)
+                if found is not None:
+                    break
+
+            if found is None:
+                return before_loop
+
+            (mult, offset, factor) = found
+            loc = mult.loc
+            name = self.__fresh_name('opt_iv', False)
+
+            # The variable starts at the value of the multiplication for the
+            # first iteration.
+            first = copy.deepcopy(mult)
+            first = self.__replace_reads(first, index,
+                                         lambda: copy.deepcopy(start))
+            first = self.__simplify_identities(self.__fold_constants(first))
+            before_loop.append(CreateVar(loc, Type.INT, name, first))
+
+            for (i, e) in enumerate(loop.body):
+                loop.body[i] = self.__replace_equal(e, mult, name)
+
+            step = self.__int_call(loc, '+', [self.__int_get(loc, name),
+                                              copy.deepcopy(factor)])
+            loop.body.append(self.__int_set(loc, name, step))
+
+
+    def __reduce_all_strength(self, body):
+        ''' Strength reduce every sequential loop in the body. '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__reduce_all_strength(b)
+
+            if e.exprClass == ExprEnum.LOOP:
+                new_body += self.__reduce_loop_strength(e)
+
+            new_body.append(e)
+
+        body[:] = new_body
+
+
+    def __nest_values(self, body, sets):
+        '''
+        Return a map from the name of each variable created directly in the
+        body and never set to the value it is created with.
+        '''
+
+        return {e.name: e.val for e in body
+                if e.exprClass == ExprEnum.CREATE_VAR and e.name not in sets}
+
+
+    def __substitute_values(self, expr, values):
+        '''
+        Return a copy of 'expr' with the reads of the variables in 'values'
+        replaced by their values, repeatedly.
+        '''
+
+        if expr.exprClass == ExprEnum.GET_VAR and expr.name in values:
+            # A value can read a variable with the same name created outside
+            # of the nest.
+            rest = {k: v for (k, v) in values.items() if k != expr.name}
+            return self.__substitute_values(values[expr.name], rest)
+
+        expr = copy.copy(expr)
+        if expr.exprClass == ExprEnum.CALL:
+            expr.params = [self.__substitute_values(p, values)
+                           for p in expr.params]
+
+        return expr
+
+
+    def __split_terms(self, expr):
+        '''
+        Return a list of tuples (sign, term) such that the expression is the
+        sum of sign * term over the list, where 'sign' is 1 or -1, by splitting
+        additions and subtractions.
+        '''
+
+        terms = []
+
+        def split(e, sign):
+            if e.exprClass == ExprEnum.CALL and e.name in ['+', '-']:
+                split(e.params[0], sign)
+                split(e.params[1], sign if e.name == '+' else -sign)
+            else:
+                terms.append((sign, e))
+
+        split(expr, 1)
+        return terms
+
+
+    def __row_major_stride(self, expr, outer_index, inner_index, writes):
+        '''
+        Return 's' if the expression is (outer_index * s + inner_index) plus or
+        minus values that are the same in every iteration of the nest, in any
+        order, where 's' is a literal or a variable. Return None otherwise.
+        '''
+
+        stride = None
+        found_inner = False
+
+        for (sign, e) in self.__split_terms(expr):
+            reads = self.__deep_find_reads(e)
+
+            if e.exprClass == ExprEnum.GET_VAR and e.name == inner_index and \
+               sign == 1 and not found_inner:
+                found_inner = True
+            elif e.exprClass == ExprEnum.CALL and e.name == '*' and \
+                 sign == 1 and stride is None:
+                for j in range(2):
+                    p = e.params[j]
+                    s = e.params[1 - j]
+                    if p.exprClass == ExprEnum.GET_VAR and \
+                       p.name == outer_index and \
+                       self.__is_simple_invariant(s, outer_index, writes):
+                        stride = s
+
+                if stride is None:
+                    return None
+            elif not self.__is_pure(e, True) or \
+                 any([r in writes for r in reads]):
+                return None
+
+        return stride if found_inner else None
+
+
+    def __perfect_nest(self, outer):
+        '''
+        Return a tuple (inner, outer_bounds, inner_bounds, list_uses, created,
+        values, writes) if the loop is a perfect nest of two loops that count
+        up by one, the bounds of the inner loop do not change in the outer
+        loop, and the nest only keeps values from one iteration to the next in
+        lists. Return None otherwise.
+
+        The outer loop body may create variables with pure values before the
+        inner loop, such as temporaries made by loop-invariant code motion, if
+        the nest never sets them, since computing them again for each
+        iteration of the inner loop does not change the result.
+
+        'list_uses' are the list_at and list_set expressions in the nest,
+        'created' are the names created in the nest, 'values' maps the
+        variables created in the nest that are never set to their values, and
+        'writes' are the names written by the nest, including both indices.
+        '''
+
+        inner = outer.body[-1]
+        if inner.exprClass != ExprEnum.LOOP:
+            return None
+
+        prefix = outer.body[:-1]
+        for e in prefix:
+            if e.exprClass != ExprEnum.CREATE_VAR or \
+               not self.__is_pure(e.val, False):
+                return None
+
+        outer_bounds = self.__loop_bounds(outer)
+        inner_bounds = self.__loop_bounds(inner)
+        if outer_bounds is None or inner_bounds is None:
+            return None
+
+        (index, _, _, _) = outer_bounds
+        (_, start, end, _) = inner_bounds
+
+        writes = self.__deep_find_writes(outer)
+        for e in [start, end]:
+            if not self.__is_simple_invariant(e, index, writes):
+                return None
+
+        created = []
+        sets = []
+        list_uses = []
+        allowed = [True]
+
+        def find(expr):
+            if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+                created.append(expr.name)
+            elif expr.exprClass == ExprEnum.SET_VAR:
+                sets.append(expr.name)
+            elif expr.exprClass == ExprEnum.LIST_SET or \
+                 expr.exprClass == ExprEnum.LIST_AT:
+                list_uses.append(expr)
+            elif expr.exprClass == ExprEnum.CALL:
+                # Reordering calls with side effects would change the output.
+                if expr.name not in pure_prims:
+                    allowed[0] = False
+            elif expr.exprClass != ExprEnum.LITERAL and \
+                 expr.exprClass != ExprEnum.GET_VAR and \
+                 expr.exprClass != ExprEnum.IF and \
+                 expr.exprClass != ExprEnum.LOOP:
+                allowed[0] = False
+
+            for e in self.__sub_exprs(expr):
+                find(e)
+
+        for e in outer.body:
+            find(e)
+
+        if not allowed[0]:
+            return None
+
+        # Variables created outside of the nest would carry values from one
+        # outer iteration to the next, and variables created before the inner
+        # loop would carry values from one inner iteration to the next.
+        for name in sets:
+            if name not in created or name in [e.name for e in prefix]:
+                return None
+
+        values = self.__nest_values(prefix, sets)
+        values.update(self.__nest_values(inner.body, sets))
+
+        return (inner, outer_bounds, inner_bounds, list_uses, created, values,
+                writes)
+
+
+    def __independent_strides(self, nest, index, other_index):
+        '''
+        Return a list of strides if the iterations of the loop of the nest
+        with the index 'index' are independent, so that any order of the
+        iterations of the nest that keeps the iterations of the other loop
+        with the same 'index' in order gives the same result. Return None
+        otherwise.
+
+        Each list that the nest sets must be used at the same index everywhere
+        in the nest. The index is either 'index', or a row-major index
+        (index * s + other_index) plus values that do not change. Two
+        iterations with different values of 'index' only use the same element
+        through a row-major index if the other loop has more than 's'
+        iterations, so each such 's' is returned to be checked before the
+        nest is changed.
+        '''
+
+        (_, _, _, list_uses, created, values, writes) = nest
+
+        strides = []
+        set_lists = [e.name for e in list_uses
+                     if e.exprClass == ExprEnum.LIST_SET and
+                     e.name not in created]
+
+        for name in set(set_lists):
+            indices = [self.__substitute_values(e.index, values)
+                       for e in list_uses if e.name == name]
+
+            for i in indices[1:]:
+                if not Expr.equal(i, indices[0]):
+                    return None
+
+            i = indices[0]
+            if i.exprClass == ExprEnum.GET_VAR and i.name == index:
+                continue
+
+            stride = self.__row_major_stride(i, index, other_index, writes)
+            if stride is None:
+                return None
+
+            strides.append(stride)
+
+        return strides
+
+
+    def __iterations_check(self, loc, bounds, strides):
+        '''
+        Return a condition that is true if the loop with the given bounds has
+        at most 's' iterations for each 's' in 'strides', which is a literal
+        if it is known before the program runs. Return None if the condition
+        is always false.
+        '''
+
+        (_, start, end, inclusive) = bounds
+
+        iters = self.__int_call(loc, '-', [copy.deepcopy(end),
+                                           copy.deepcopy(start)])
+        if inclusive:
+            iters = self.__int_call(loc, '+', [iters,
+                                               Literal(loc, Type.INT, 1)])
+
+        iters = self.__simplify_identities(self.__fold_constants(iters))
+
+        cond = Literal(loc, Type.INT, 1)
+        for s in strides:
+            # A loop from 0 to 's' has exactly 's' iterations.
+            if Expr.equal(iters, s):
+                continue
+
+            check = self.__int_call(loc, '<=', [copy.deepcopy(iters),
+                                                copy.deepcopy(s)])
+            check = self.__simplify_identities(self.__fold_constants(check))
+
+            if check.exprClass != ExprEnum.LITERAL:
+                cond = check if cond.exprClass == ExprEnum.LITERAL else \
+                       self.__int_call(loc, 'and', [cond, check])
+            elif check.val == 0:
+                return None
+
+        return cond
+
+
+    def __index_stride(self, expr, index):
+        '''
+        Return how much the value of the index expression changes when
+        'index' increases by one, or None if that is not a known constant.
+        '''
+
+        stride = 0
+
+        for (sign, e) in self.__split_terms(expr):
+            if index not in self.__deep_find_reads(e):
+                continue
+
+            if e.exprClass == ExprEnum.GET_VAR:
+                stride += sign
+                continue
+
+            if e.exprClass != ExprEnum.CALL or e.name != '*':
+                return None
+
+            factors = [p for p in e.params
+                       if p.exprClass != ExprEnum.GET_VAR or p.name != index]
+            if len(factors) != 1 or \
+               factors[0].exprClass != ExprEnum.LITERAL or \
+               factors[0].type != Type.INT:
+                return None
+
+            stride += sign * factors[0].val
+
+        return stride
+
+
+    def __stride_cost(self, nest, index):
+        '''
+        Return the number of list uses in the nest whose element moves by more
+        than one position, or by an unknown amount, when 'index' increases by
+        one.
+        '''
+
+        (_, _, _, list_uses, _, values, _) = nest
+
+        cost = 0
+        for e in list_uses:
+            stride = self.__index_stride(
+                self.__substitute_values(e.index, values), index)
+
+            if stride is None or abs(stride) > 1:
+                cost += 1
+
+        return cost
+
+
+    def __parallel_index(self, nest, index):
+        '''
+        Return true if each list that the nest sets is only used at exactly
+        'index', so that the analyzer can run the loop with that index in
+        parallel once it is the outer loop.
+        '''
+
+        (_, _, _, list_uses, created, _, _) = nest
+
+        set_lists = [e.name for e in list_uses
+                     if e.exprClass == ExprEnum.LIST_SET and
+                     e.name not in created]
+
+        for e in list_uses:
+            if e.name in set_lists and \
+               (e.index.exprClass != ExprEnum.GET_VAR or
+                e.index.name != index):
+                return False
+
+        return True
+
+
+    def __interchange_nest(self, outer, parallel):
+        '''
+        Return an expression that runs a perfect nest of two loops with the
+        inner loop outside if that is faster and gives the same result, or
+        None otherwise. If 'parallel' is true, the nest is about to be
+        analyzed for parallelization, so a nest whose loops can only be
+        parallelized with the inner loop outside is interchanged, and a nest
+        whose loops can both be parallelized has the loop that makes
+        neighboring GPU threads use neighboring elements outside. Otherwise,
+        the loop that makes consecutive iterations use neighboring elements is
+        placed inside.
+
+        The iterations of one of the loops must be independent. If they are
+        only independent for some iteration counts, the returned expression is
+        an If that runs the original nest otherwise.
+        '''
+
+        if outer.trusted:
+            return None
+
+        nest = self.__perfect_nest(outer)
+        if nest is None:
+            return None
+
+        (inner, outer_bounds, inner_bounds, _, _, _, _) = nest
+        if inner.trusted:
+            return None
+
+        index = outer_bounds[0]
+        inner_index = inner_bounds[0]
+
+        if parallel and self.__parallel_index(nest, index) != \
+           self.__parallel_index(nest, inner_index):
+            swap = self.__parallel_index(nest, inner_index)
+        elif parallel and self.__parallel_index(nest, index):
+            swap = self.__stride_cost(nest, inner_index) < \
+                   self.__stride_cost(nest, index)
+        else:
+            swap = self.__stride_cost(nest, index) < \
+                   self.__stride_cost(nest, inner_index)
+
+        if not swap:
+            return None
+
+        strides = self.__independent_strides(nest, index, inner_index)
+        bounds = inner_bounds
+        if strides is None:
+            strides = self.__independent_strides(nest, inner_index, index)
+            bounds = outer_bounds
+
+        if strides is None:
+            return None
+
+        cond = self.__iterations_check(outer.loc, bounds, strides)
+        if cond is None:
+            return None
+
+        original = copy.deepcopy(outer)
+
+        # Swap the loop headers. Variables created before the inner loop can
+        # read the outer index, so they move into the new inner loop.
+        (outer.init, inner.init) = (inner.init, outer.init)
+        (outer.test, inner.test) = (inner.test, outer.test)
+        (outer.update, inner.update) = (inner.update, outer.update)
+        (outer.no_para, inner.no_para) = (inner.no_para, outer.no_para)
+        inner.body = outer.body[:-1] + inner.body
+        outer.body = [inner]
+
+        self._changed = True
+
+        if cond.exprClass == ExprEnum.LITERAL:
+            return outer
+
+        return If(outer.loc, cond, [outer], [original])
+
+
+    def __interchange_all_loops(self, body, parallel):
+        '''
+        Interchange every perfect loop nest in the body where that is faster.
+        'parallel' is true if the loops directly in the body may be
+        parallelized.
+        '''
+
+        for (i, e) in enumerate(body):
+            if e.exprClass == ExprEnum.LOOP:
+                swapped = self.__interchange_nest(e, parallel)
+                if swapped is not None:
+                    body[i] = swapped
+                    continue
+
+            # The analyzer only parallelizes the outermost loops.
+            for b in self.__bodies(e):
+                self.__interchange_all_loops(b, parallel and
+                                             e.exprClass == ExprEnum.IF)
+
+
+    def __tile_size(self, outer, indices, values):
+        '''
+        Return the largest power of two T up to 1024 such that the list
+        elements used by T by T iterations of the loop nest fit in half of the
+        cache, or None if no list element is used more than once by the nest.
+        A list indexed by a product of one index with another value is assumed
+        to use T * T elements, and a list indexed by one or both indices is
+        assumed to use T elements.
+        '''
+
+        powers = {}
+
+        def has_mult(expr):
+            if expr.exprClass == ExprEnum.CALL and expr.name == '*':
+                return True
+
+            return any([has_mult(e) for e in self.__sub_exprs(expr)])
+
+        def find(expr):
+            if expr.exprClass in [ExprEnum.LIST_AT, ExprEnum.LIST_SET]:
+                list_index = self.__substitute_values(expr.index, values)
+                used = set([n for n in self.__deep_find_reads(list_index)
+                            if n in indices])
+                power = 0
+                if len(used) == 2 and has_mult(list_index):
+                    power = 2
+                elif len(used) > 0:
+                    power = 1
+
+                powers[expr.name] = max(powers.get(expr.name, 0), power)
+
+            for e in self.__sub_exprs(expr):
+                find(e)
+
+        find(outer)
+
+        if len(powers) == 0 or max(powers.values()) == 0:
+            return None
+
+        def footprint(tile):
+            # Ints and floats are 4 bytes and chars are smaller.
+            return 4 * sum([tile ** p for p in powers.values()])
+
+        tile = 8
+        while tile < 1024 and footprint(2 * tile) <= tile_cache_bytes // 2:
+            tile *= 2
+
+        return tile
+
+
+    def __strip_mine(self, loop, bounds, tile):
+        '''
+        Change the loop to only run the iterations from a new variable up to
+        the end of its tile, and return a new loop that steps that variable
+        over the range of the original loop 'tile' iterations at a time. The
+        new loop is returned with an empty body except for setting the end of
+        the current tile.
+        '''
+
+        (index, start, end, inclusive) = bounds
+        loc = loop.loc
+        first = self.__fresh_name('opt_tile', False)
+        last = self.__fresh_name('opt_tile_end', False)
+        test_name = '<=' if inclusive else '<'
+
+        step = self.__int_call(loc, '+', [self.__int_get(loc, first),
+                                          Literal(loc, Type.INT, tile)])
+        tile_loop = Loop(loc, CreateVar(loc, Type.INT, first,
+                                        copy.deepcopy(start)),
+                         self.__int_call(loc, test_name,
+                                         [self.__int_get(loc, first),
+                                          copy.deepcopy(end)]),
+                         self.__int_set(loc, first, step), [], loop.no_para,
+                         False)
+
+        # The last tile may have fewer iterations than the others.
+        size = tile if not inclusive else tile - 1
+        last_val = self.__int_call(loc, '+', [self.__int_get(loc, first),
+                                              Literal(loc, Type.INT, size)])
+        too_far = self.__int_call(loc, '>', [self.__int_get(loc, last),
+                                             copy.deepcopy(end)])
+        tile_loop.body = [CreateVar(loc, Type.INT, last, last_val),
+                          If(loc, too_far,
+                             [self.__int_set(loc, last, copy.deepcopy(end))],
+                             [])]
+
+        loop.init.val = self.__int_get(loc, first)
+        loop.test = self.__int_call(loc, test_name,
+                                    [self.__int_get(loc, index),
+                                     self.__int_get(loc, last)])
+
+        return tile_loop
+
+
+    def __tile_nest(self, outer, tile_size):
+        '''
+        Return an expression that runs the iterations of a perfect nest of two
+        loops in square tiles so that the list elements used by a tile stay in
+        the cache, or None if the loop cannot be tiled. If the nest uses a
+        row-major index, the expression is an If that only runs the tiles when
+        the inner loop is short enough for the index to be one-to-one, and
+        runs the original loop otherwise.
+        '''
+
+        nest = self.__perfect_nest(outer)
+        if nest is None:
+            return None
+
+        (inner, outer_bounds, inner_bounds, _, _, values, _) = nest
+
+        # Tiling keeps the inner iterations of each outer iteration in order,
+        # so the outer iterations must be independent.
+        strides = self.__independent_strides(nest, outer_bounds[0],
+                                             inner_bounds[0])
+        if strides is None:
+            return None
+
+        tile = tile_size
+        if tile is None:
+            tile = self.__tile_size(outer, [outer_bounds[0], inner_bounds[0]],
+                                    values)
+            if tile is None:
+                return None
+
+        # If the inner loop fits in one tile, the tiles run the iterations in
+        # the original order.
+        (_, start, end, inclusive) = inner_bounds
+        if start.exprClass == ExprEnum.LITERAL and \
+           end.exprClass == ExprEnum.LITERAL and \
+           end.val - start.val + (1 if inclusive else 0) <= tile:
+            return None
+
+        loc = outer.loc
+        cond = self.__iterations_check(loc, inner_bounds, strides)
+        if cond is None:
+            return None
+
+        original = copy.deepcopy(outer)
+
+        outer_tiles = self.__strip_mine(outer, outer_bounds, tile)
+        inner_tiles = self.__strip_mine(inner, inner_bounds, tile)
+
+        outer_tiles.body.append(inner_tiles)
+        inner_tiles.body.append(outer)
+
+        if cond.exprClass == ExprEnum.LITERAL:
+            return outer_tiles
+
+        return If(loc, cond, [outer_tiles], [original])
+
+
+    def __tile_all_loops(self, body, tile_size):
+        '''
+        Tile every perfect loop nest in the body that runs sequentially.
+        '''
+
+        for (i, e) in enumerate(body):
+            if e.exprClass == ExprEnum.LOOP:
+                tiled = self.__tile_nest(e, tile_size)
+                if tiled is not None:
+                    body[i] = tiled
+                    continue
+
+            for b in self.__bodies(e):
+                self.__tile_all_loops(b, tile_size)
+
+
+    def __list_elem_types(self, define):
+        '''
+        Return a map from the name of each list the function can use to the
+        type of its elements.
+        '''
+
+        elem_types = {Type.LIST_INT: Type.INT, Type.LIST_FLOAT: Type.FLOAT,
+                      Type.LIST_STRING: Type.STRING}
+        lists = {}
+
+        def find(expr):
+            if expr.exprClass == ExprEnum.LIST:
+                lists[expr.name] = expr.elem_type
+            elif expr.exprClass == ExprEnum.CREATE_VAR and \
+                 expr.type in elem_types:
+                lists[expr.name] = elem_types[expr.type]
+
+            for e in self.__sub_exprs(expr):
+                find(e)
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.LIST:
+                lists[e.name] = e.elem_type
+
+        for (arg_type, name) in define.args:
+            if arg_type in elem_types:
+                lists[name] = elem_types[arg_type]
+
+        find(define)
+        return lists
+
+
+    def __find_list_aliases(self):
+        '''
+        Return a map from each function name to a map from the name of each
+        list the function uses to the names of the other lists in the function
+        that may have the same elements. Each list expression creates new
+        elements, so two lists can only have the same elements if a call
+        passes the same list to both of them, or if one is set to the other,
+        like `(set b (get a))'.
+        '''
+
+        defines = [e for e in self.parsed_exprs
+                   if e.exprClass == ExprEnum.DEFINE]
+        by_name = {d.name: d for d in defines}
+        global_lists = [e.name for e in self.parsed_exprs
+                        if e.exprClass == ExprEnum.LIST]
+
+        # Map from (function name, list name) to the places that created the
+        # elements of the list. 'unknown' is used for a list that comes from
+        # a function return value.
+        origins = {}
+        for d in defines:
+            created = [n[:-len('.size')] for n in self.__deep_find_writes(d)
+                       if n.endswith('.size')]
+
+            for name in self.__list_elem_types(d):
+                places = []
+                if name in global_lists:
+                    places.append(('', name))
+                if name in created:
+                    places.append((d.name, name))
+
+                origins[(d.name, name)] = places
+
+        def origin(func, param):
+            if param.exprClass == ExprEnum.GET_VAR:
+                if (func, param.name) in origins:
+                    return origins[(func, param.name)]
+                if param.name in global_lists:
+                    return [('', param.name)]
+
+            return ['unknown']
+
+        def find_calls(func, expr, calls):
+            if expr.exprClass == ExprEnum.CALL and expr.name in by_name:
+                calls.append((func, expr))
+
+            for e in self.__sub_exprs(expr):
+                find_calls(func, e, calls)
+
+        calls = []
+        for e in self.parsed_exprs:
+            find_calls(e.name if e.exprClass == ExprEnum.DEFINE else '', e,
+                       calls)
+
+        # A list that is created or set from another list gets its elements.
+        def find_assigns(func, expr, assigns):
+            if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR] and \
+               (func, expr.name) in origins:
+                assigns.append((func, expr.name, expr.val))
+
+            for e in self.__sub_exprs(expr):
+                find_assigns(func, e, assigns)
+
+        assigns = []
+        for d in defines:
+            find_assigns(d.name, d, assigns)
+
+        # Pass the origins of the lists to the called functions and to the
+        # lists set from them until nothing changes.
+        changed = True
+        while changed:
+            changed = False
+
+            for (func, name, val) in assigns:
+                places = origins[(func, name)]
+                for place in origin(func, val):
+                    if place not in places:
+                        places.append(place)
+                        changed = True
+
+            for (func, call) in calls:
+                callee = by_name[call.name]
+                for (param, (arg_type, name)) in zip(call.params,
+                                                     callee.args):
+                    if (callee.name, name) not in origins:
+                        continue
+
+                    places = origins[(callee.name, name)]
+                    for place in origin(func, param):
+                        if place not in places:
+                            places.append(place)
+                            changed = True
+
+        aliases = {}
+        for d in defines:
+            names = list(self.__list_elem_types(d))
+            aliases[d.name] = {}
+
+            for a in names:
+                a_places = origins[(d.name, a)]
+                aliases[d.name][a] = [
+                    b for b in names if b != a and
+                    ('unknown' in a_places or
+                     'unknown' in origins[(d.name, b)] or
+                     any([p in a_places for p in origins[(d.name, b)]]))]
+
+        return aliases
+
+
+    def __forward_list_loads(self, body, aliases):
+        '''
+        Replace each read of a list element that a variable created earlier in
+        the body already holds with a read of that variable, as long as the
+        list element and the variable are not changed in between.
+        '''
+
+        available = []  # Type list of (ListAt, string) tuples
+
+        for (i, e) in enumerate(body):
+            for b in self.__bodies(e):
+                self.__forward_list_loads(b, aliases)
+
+            if self.__deep_has_user_call(e):
+                available = []
+                continue
+
+            writes = self.__deep_find_writes(e)
+
+            def is_killed(load, name):
+                changed = [load.name, name] + aliases.get(load.name, []) + \
+                          self.__deep_find_reads(load.index)
+                return any([n in writes for n in changed])
+
+            # The value of a variable or list element is computed before it is
+            # set, so every available load can be used in the value.
+            for (load, name) in available:
+                if not is_killed(load, name):
+                    e = self.__replace_equal(e, load, name)
+                elif e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR]:
+                    e.val = self.__replace_equal(e.val, load, name)
+                elif e.exprClass == ExprEnum.LIST_SET:
+                    e.index = self.__replace_equal(e.index, load, name)
+                    e.val = self.__replace_equal(e.val, load, name)
+
+            body[i] = e
+            available = [(load, name) for (load, name) in available
+                         if not is_killed(load, name)]
+
+            if e.exprClass == ExprEnum.CREATE_VAR and \
+               e.val.exprClass == ExprEnum.LIST_AT and \
+               self.__is_pure(e.val.index, True) and \
+               e.name not in self.__deep_find_reads(e.val.index):
+                available.append((copy.deepcopy(e.val), e.name))
+
+
+    def __list_accesses(self, expr, direct):
+        '''
+        Return a list of the ListAt and ListSet expressions in the expression.
+        If 'direct' is true, only the accesses that are made every time the
+        expression is evaluated are returned, leaving out those in the
+        branches of an If or a Select and in loops.
+        '''
+
+        accesses = []
+
+        if expr.exprClass == ExprEnum.LIST_AT or \
+           expr.exprClass == ExprEnum.LIST_SET:
+            accesses.append(expr)
+
+        if direct and (expr.exprClass == ExprEnum.IF or
+                       expr.exprClass == ExprEnum.SELECT):
+            return accesses + self.__list_accesses(expr.cond, direct)
+        elif direct and expr.exprClass == ExprEnum.LOOP:
+            return accesses
+
+        for e in self.__sub_exprs(expr):
+            accesses += self.__list_accesses(e, direct)
+
+        return accesses
+
+
+    def __list_op_names(self, expr):
+        ''' Return the names of the lists used by ListOps in the expression. '''
+
+        names = []
+
+        if expr.exprClass == ExprEnum.LIST_OP:
+            names.append(expr.name)
+            if expr.src is not None:
+                names.append(expr.src)
+
+        for e in self.__sub_exprs(expr):
+            names += self.__list_op_names(e)
+
+        return names
+
+
+    def __replace_list_elem(self, expr, list_name, name, elem_type):
+        '''
+        Return 'expr' with every read of an element of the list 'list_name'
+        replaced by a read of the variable 'name' and every set of an element
+        replaced by a set of the variable. The list must only be used at one
+        index in the expression.
+        '''
+
+        if expr.exprClass == ExprEnum.LIST_AT and expr.name == list_name:
+            get_var = GetVar(expr.loc, name)
+            get_var.type = elem_type
+            return get_var
+
+        self.__map_sub_exprs(expr, lambda e: self.__replace_list_elem(
+                                                e, list_name, name, elem_type))
+
+        if expr.exprClass == ExprEnum.LIST_SET and expr.name == list_name:
+            set_var = SetVar(expr.loc, name, expr.val)
+            set_var.type = elem_type
+            return set_var
+
+        return expr
+
+
+    def __scalar_replace_loop(self, loop, aliases, elem_types):
+        '''
+        Return a list of statements that replace the loop, where each list
+        element that the loop uses at the same index in every iteration is
+        read into a variable before the loop, used through that variable in
+        the loop, and written back after the loop if the loop sets it. Return
+        None if no list element can be replaced.
+        '''
+
+        bounds = self.__loop_bounds(loop)
+        if bounds is None:
+            return None
+
+        (index, start, end, inclusive) = bounds
+
+        # The elements used by the GPU or by another function cannot be kept
+        # in a variable.
+        for e in loop.body:
+            if self.__deep_has_user_call(e) or \
+               self.__contains_parallel_loop(e):
+                return None
+
+        writes = [index]
+        accesses = []
+        for e in loop.body:
+            writes += self.__deep_find_writes(e)
+            accesses += self.__list_accesses(e, False)
+
+        header_lists = []
+        for e in [loop.test, loop.update]:
+            header_lists += [a.name for a in self.__list_accesses(e, False)]
+
+        # The lists filled, copied, or compared by a library routine use the
+        # elements in memory.
+        op_lists = []
+        for e in loop.body:
+            op_lists += self.__list_op_names(e)
+
+        direct = []
+        for e in loop.body:
+            direct += self.__list_accesses(e, True)
+
+        elems = []
+        for a in direct:
+            list_name = a.name
+            if list_name in [elem[0] for elem in elems] or \
+               list_name in header_lists or \
+               any([n in op_lists
+                    for n in [list_name] + aliases.get(list_name, [])]) or \
+               f'{list_name}.size' in writes or \
+               list_name not in elem_types:
+                continue
+
+            if not self.__is_pure(a.index, True) or \
+               any([n in writes for n in self.__deep_find_reads(a.index)]):
+                continue
+
+            same = [b for b in accesses if b.name == list_name]
+            if not all([Expr.equal(b.index, a.index) for b in same]):
+                continue
+
+            # A list with the same elements must not be set by the loop, or
+            # used by the loop if the element is set.
+            is_set = any([b.exprClass == ExprEnum.LIST_SET for b in same])
+            others = [b for b in accesses
+                      if b.name in aliases.get(list_name, [])]
+
+            if any([b.exprClass == ExprEnum.LIST_SET for b in others]) or \
+               (is_set and len(others) > 0):
+                continue
+
+            elems.append((list_name, a.index, is_set))
+
+        if len(elems) == 0:
+            return None
+
+        loc = loop.loc
+        test_name = '<=' if inclusive else '<'
+        runs = self.__fold_constants(
+            self.__int_call(loc, test_name, [copy.deepcopy(start),
+                                             copy.deepcopy(end)]))
+
+        # There is nothing to gain for a loop that never runs.
+        if runs.exprClass == ExprEnum.LITERAL and runs.val == 0:
+            return None
+
+        loads = []
+        stores = []
+        for (list_name, elem_index, is_set) in elems:
+            elem_type = elem_types[list_name]
+            name = self.__fresh_name('opt_elem', False)
+
+            for (i, e) in enumerate(loop.body):
+                loop.body[i] = self.__replace_list_elem(e, list_name, name,
+                                                        elem_type)
+
+            load = ListAt(loc, list_name, copy.deepcopy(elem_index))
+            load.type = elem_type
+            loads.append(CreateVar(loc, elem_type, name, load))
+
+            if is_set:
+                get_var = GetVar(loc, name)
+                get_var.type = elem_type
+                stores.append(ListSet(loc, list_name,
+                                      copy.deepcopy(elem_index), get_var))
+
+        stmts = loads + [loop] + stores
+        if runs.exprClass == ExprEnum.LITERAL:
+            return stmts
+
+        # The elements must only be read if the loop reads them.
+        return [If(loc, runs, stmts, [])]
+
+
+    def __contains_parallel_loop(self, expr):
+        ''' Return true if the expression contains a non-sequential loop. '''
+
+        if expr.exprClass in [ExprEnum.PARA_LOOP, ExprEnum.SCAN,
+                              ExprEnum.SCATTER_LOOP, ExprEnum.FIND_LOOP]:
+            return True
+
+        return any([self.__contains_parallel_loop(e)
+                    for e in self.__sub_exprs(expr)])
+
+
+    def __scalar_replace_all_loops(self, body, aliases, elem_types):
+        ''' Keep the list elements used by each sequential loop in variables. '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__scalar_replace_all_loops(b, aliases, elem_types)
+
+            replaced = None
+            if e.exprClass == ExprEnum.LOOP:
+                replaced = self.__scalar_replace_loop(e, aliases, elem_types)
+
+            new_body += [e] if replaced is None else replaced
+
+        body[:] = new_body
+
+
+    def __rename_scoped(self, expr, renames):
+        '''
+        Rename the uses of the variables and lists in 'renames' in the
+        expression. A variable or list created in a nested scope hides the
+        one with the same name outside of it for the rest of that scope.
+        '''
+
+        if expr.exprClass == ExprEnum.IF:
+            self.__rename_scoped(expr.cond, renames)
+            for b in [expr.then, expr.otherwise]:
+                inner = dict(renames)
+                for e in b:
+                    self.__rename_scoped(e, inner)
+                    if e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+                        inner.pop(e.name, None)
+            return
+
+        if expr.exprClass in [ExprEnum.SET_VAR, ExprEnum.GET_VAR,
+                              ExprEnum.LIST_AT, ExprEnum.LIST_SET,
+                              ExprEnum.LIST_OP]:
+            if '.' in expr.name:
+                dot = expr.name.find('.')
+                base = expr.name[:dot]
+                expr.name = renames.get(base, base) + expr.name[dot:]
+            else:
+                expr.name = renames.get(expr.name, expr.name)
+
+        if expr.exprClass == ExprEnum.LIST_OP and expr.src is not None:
+            expr.src = renames.get(expr.src, expr.src)
+
+        for e in self.__sub_exprs(expr):
+            self.__rename_scoped(e, renames)
+
+
+    def __unrolled_copy(self, body, index, make_index, rename):
+        '''
+        Return a copy of the loop body that reads a new expression made by
+        calling 'make_index' instead of the loop index. If 'rename' is true,
+        the variables and lists created directly in the body get new names so
+        that the copy can be placed next to another copy or in the scope
+        around the loop. The uses before such a variable is created still
+        refer to the variable with the same name outside of the loop.
+        '''
+
+        body = copy.deepcopy(body)
+
+        renames = {}
+        for (i, e) in enumerate(body):
+            self.__rename_scoped(e, renames)
+
+            if rename and e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+                renames[e.name] = self.__fresh_name(f'{e.name}_unr', False)
+                e.name = renames[e.name]
+
+            e = self.__replace_reads(e, index, make_index)
+            body[i] = self.__simplify_identities(self.__fold_constants(e))
+
+        return body
+
+
+    def __unroll_loop(self, loop, factor):
+        '''
+        Return a list of statements that replace the loop with copies of its
+        body, or None if the loop is not unrolled. Only innermost loops that
+        count up by one are unrolled. A loop with a few iterations known
+        before the program runs is replaced by one copy of its body for each
+        iteration. Otherwise, if 'factor' is at least 2, the loop runs
+        'factor' copies of its body per iteration, followed by a loop for the
+        remaining iterations.
+        '''
+
+        for e in loop.body:
+            if self.__contains_loop(e):
+                return None
+
+        bounds = self.__loop_bounds(loop)
+        if bounds is None:
+            return None
+
+        (index, start, end, inclusive) = bounds
+        loc = loop.loc
+        size = sum([self.__expr_size(e) for e in loop.body])
+
+        if start.exprClass == ExprEnum.LITERAL and \
+           end.exprClass == ExprEnum.LITERAL:
+            iters = end.val - start.val + (1 if inclusive else 0)
+
+            if iters <= full_unroll_limit and \
+               iters * size <= unroll_size_limit:
+                stmts = []
+                for k in range(max(iters, 0)):
+                    stmts += self.__unrolled_copy(
+                        loop.body, index,
+                        lambda: Literal(loc, Type.INT, start.val + k), True)
+
+                return stmts
+
+        if factor < 2 or factor * size > unroll_size_limit:
+            return None
+
+        # The unrolled loop stops at the last multiple of 'factor' iterations.
+        iters = self.__int_call(loc, '-', [copy.deepcopy(end),
+                                           copy.deepcopy(start)])
+        if inclusive:
+            iters = self.__int_call(loc, '+', [iters,
+                                               Literal(loc, Type.INT, 1)])
+
+        whole = self.__int_call(loc, '*', [
+            self.__int_call(loc, '/', [iters, Literal(loc, Type.INT, factor)]),
+            Literal(loc, Type.INT, factor)])
+        end_name = self.__fresh_name('opt_unroll_end')
+        main_end = self.__int_call(loc, '+', [copy.deepcopy(start), whole])
+
+        body = []
+        for k in range(factor):
+            body += self.__unrolled_copy(
+                loop.body, index,
+                lambda: self.__int_call(loc, '+', [
+                    self.__int_get(loc, index), Literal(loc, Type.INT, k)]),
+                k > 0)
+
+        step = self.__int_call(loc, '+', [self.__int_get(loc, index),
+                                          Literal(loc, Type.INT, factor)])
+        main = Loop(loc, CreateVar(loc, Type.INT, index, copy.deepcopy(start)),
+                    self.__int_call(loc, '<', [self.__int_get(loc, index),
+                                               self.__int_get(loc, end_name)]),
+                    self.__int_set(loc, index, step), body, loop.no_para,
+                    loop.trusted)
+        main.env = loop.env
+
+        # The original loop runs the remaining iterations.
+        loop.init.val = self.__int_get(loc, end_name)
+
+        return [CreateVar(loc, Type.INT, end_name,
+                          self.__simplify_identities(main_end)), main, loop]
+
+
+    def __contains_loop(self, expr):
+        ''' Return true if the expression contains a loop. '''
+
+        if expr.exprClass in [ExprEnum.LOOP, ExprEnum.PARA_LOOP,
+                              ExprEnum.SCAN, ExprEnum.SCATTER_LOOP,
+                              ExprEnum.FIND_LOOP]:
+            return True
+
+        return any([self.__contains_loop(e) for e in self.__sub_exprs(expr)])
+
+
+    def __unroll_all_loops(self, body, factor):
+        ''' Unroll every innermost sequential loop in the body. '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__unroll_all_loops(b, factor)
+
+            unrolled = None
+            if e.exprClass == ExprEnum.LOOP:
+                unrolled = self.__unroll_loop(e, factor)
+
+            new_body += [e] if unrolled is None else unrolled
+
+        body[:] = new_body
+
+
+    def __select(self, loc, cond, then_val, else_val):
+        ''' Return a Select expression with the type of its values. '''
+        e = Select(loc, cond, then_val, else_val)
+        e.type = then_val.type
+        return e
+
+
+    def __old_value(self, stmt):
+        '''
+        Return an expression that reads the variable or list element that
+        'stmt' sets, before 'stmt' runs.
+        '''
+
+        if stmt.exprClass == ExprEnum.SET_VAR:
+            e = GetVar(stmt.loc, stmt.name)
+        else:
+            e = ListAt(stmt.loc, stmt.name, copy.deepcopy(stmt.index))
+
+        e.type = stmt.val.type
+        return e
+
+
+    def __same_target(self, e1, e2):
+        ''' Return true if two sets change the same variable or element. '''
+
+        if e1.exprClass != e2.exprClass or e1.name != e2.name:
+            return False
+
+        return e1.exprClass == ExprEnum.SET_VAR or \
+               Expr.equal(e1.index, e2.index)
+
+
+    def __convert_if(self, expr):
+        '''
+        Return a list of statements without branches that replace the If
+        'expr', where each variable or list element that a branch sets is set
+        to a Select of its new and old value. Return None if the If cannot be
+        converted.
+
+        Only Ifs whose branches have at most select_size_limit sets of int or
+        float variables and list elements, with values that have no side
+        effects, are converted. A list element set in only one branch is
+        written even if the condition does not hold, so the condition must
+        read the same element to show that the index is in bounds.
+        '''
+
+        if expr.exprClass != ExprEnum.IF:
+            return None
+
+        stmts = expr.then + expr.otherwise
+        if len(stmts) == 0 or len(stmts) > select_size_limit:
+            return None
+
+        writes = []
+        for e in stmts:
+            if e.exprClass not in [ExprEnum.SET_VAR, ExprEnum.LIST_SET] or \
+               e.val.type not in [Type.INT, Type.FLOAT] or \
+               not self.__is_pure(e.val, True):
+                return None
+
+            if e.exprClass == ExprEnum.LIST_SET and \
+               not self.__is_pure(e.index, True):
+                return None
+
+            writes.append(e.name)
+
+        loc = expr.loc
+
+        # A variable or element set in both branches needs no old value.
+        if len(expr.then) == 1 and len(expr.otherwise) == 1 and \
+           self.__same_target(expr.then[0], expr.otherwise[0]):
+            stmt = expr.then[0]
+            stmt.val = self.__select(loc, expr.cond, stmt.val,
+                                     expr.otherwise[0].val)
+            return [stmt]
+
+        cond_reads = self.__list_accesses(expr.cond, False)
+        for e in stmts:
+            if e.exprClass != ExprEnum.LIST_SET:
+                continue
+
+            if not any([Expr.equal(a, self.__old_value(e))
+                        for a in cond_reads]) or \
+               any([n in writes for n in self.__deep_find_reads(e.index)]):
+                return None
+
+        # The branches may change what the condition reads, so a condition
+        # used by several sets is computed once into a variable.
+        new_body = []
+        if len(stmts) == 1:
+            make_cond = lambda: expr.cond
+        else:
+            name = self.__fresh_name('opt_cond')
+            new_body.append(CreateVar(loc, expr.cond.type, name, expr.cond))
+            new_body[-1].type = expr.cond.type
+
+            def make_cond():
+                e = GetVar(loc, name)
+                e.type = expr.cond.type
+                return e
+
+        for e in expr.then:
+            e.val = self.__select(loc, make_cond(), e.val, self.__old_value(e))
+            new_body.append(e)
+
+        for e in expr.otherwise:
+            e.val = self.__select(loc, make_cond(), self.__old_value(e), e.val)
+            new_body.append(e)
+
+        return new_body
+
+
+    def __convert_all_ifs(self, body, convert):
+        '''
+        Convert the Ifs in the body of each parallel loop and each innermost
+        sequential loop into statements without branches. If 'convert' is
+        true, the body itself is one of those loop bodies.
+        '''
+
+        new_body = []
+
+        for e in body:
+            if e.exprClass == ExprEnum.PARA_LOOP:
+                inner = True
+            elif e.exprClass == ExprEnum.LOOP:
+                inner = convert or \
+                        not any([self.__contains_loop(b) for b in e.body])
+            elif e.exprClass == ExprEnum.IF:
+                inner = convert
+            else:
+                inner = False
+
+            # Nested Ifs are converted first, so that the If around them may
+            # then be converted too.
+            for b in self.__bodies(e):
+                self.__convert_all_ifs(b, inner)
+
+            converted = None
+            if convert:
+                converted = self.__convert_if(e)
+
+            new_body += [e] if converted is None else converted
+
+        body[:] = new_body
+
+
+    def __task_effects(self, expr, summaries, aliases={}):
+        '''
+        Return a tuple (reads, writes, ordered) for a statement, where 'reads'
+        and 'writes' are sets of the names of the variables and lists created
+        outside of the statement that it reads and writes, including through
+        the user defined functions it calls, and 'ordered' is true if the
+        statement calls print, rand, srand, or time, directly or through a
+        function, and so must run in order with the other such statements.
+        'summaries' maps each function name to a tuple in the same form,
+        where the lists that are arguments of the function are given by their
+        position. 'aliases' maps the name of each list to the names of the
+        lists that may have the same elements, which the statement also reads
+        or writes when it reads or writes the list.
+        '''
+
+        writes = set(self.__deep_find_writes(expr))
+        reads = set(self.__deep_find_reads(expr))
+        created = set()
+        ordered = False
+
+        def visit(e):
+            nonlocal ordered
+
+            if e.exprClass == ExprEnum.CALL and e.name in impure_prims:
+                ordered = True
+            elif e.exprClass == ExprEnum.CALL and e.name in summaries:
+                (r, w, o) = summaries[e.name]
+                ordered = ordered or o
+
+                for (names, found) in [(reads, r), (writes, w)]:
+                    for n in found:
+                        if isinstance(n, str):
+                            names.add(n)
+                        elif e.params[n].exprClass == ExprEnum.GET_VAR:
+                            names.add(e.params[n].name)
+                        else:
+                            ordered = True
+            elif e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+                created.add(e.name)
+            elif e.exprClass in [ExprEnum.PARA_LOOP, ExprEnum.SCAN,
+                                 ExprEnum.SCATTER_LOOP, ExprEnum.FIND_LOOP]:
+                created.add(e.index_name)
+
+            for sub in self.__sub_exprs(e):
+                visit(sub)
+
+        visit(expr)
+
+        for names in [reads, writes]:
+            for n in list(names):
+                names |= set(aliases.get(n, []))
+
+        # The size of a list never changes after the list is created.
+        def outside(names):
+            return {n for n in names
+                    if n not in created and not n.endswith('.size')}
+
+        writes = outside(writes)
+        return (outside(reads) | writes, writes, ordered)
+
+
+    def __function_effects(self):
+        '''
+        Return a dictionary that maps each user defined function to a tuple
+        (reads, writes, ordered) as described in __task_effects, for a call of
+        the function. A function that remembers its results also writes
+        '<name>()', its table of results.
+        '''
+
+        summaries = {name: (set(), set(), False) for name in self._defines}
+        aliases = self.__find_list_aliases()
+
+        # Recursive functions need their own effects, so repeat until nothing
+        # changes.
+        changed = True
+        while changed:
+            changed = False
+
+            for (name, define) in self._defines.items():
+                local_names = self.__local_names(define)
+                list_args = [arg[1] if arg[0] in [Type.LIST_INT,
+                                                  Type.LIST_FLOAT,
+                                                  Type.LIST_STRING] else None
+                             for arg in define.args]
+
+                def summarize(names):
+                    result = set()
+
+                    for n in names:
+                        if n in list_args:
+                            result.add(list_args.index(n))
+                        elif n not in local_names:
+                            result.add(n)
+
+                    return result
+
+                (reads, writes, ordered) = (set(), set(), False)
+                for e in define.body:
+                    (r, w, o) = self.__task_effects(e, summaries,
+                                                    aliases[name])
+                    reads |= summarize(r)
+                    writes |= summarize(w)
+                    ordered = ordered or o
+
+                if define.memo_size > 0:
+                    writes.add(f'{name}()')
+                    reads.add(f'{name}()')
+
+                if (reads, writes, ordered) != summaries[name]:
+                    summaries[name] = (reads, writes, ordered)
+                    changed = True
+
+        return summaries
+
+
+    def __heavy_functions(self):
+        '''
+        Return the names of the user defined functions that contain a loop,
+        are recursive, or call such a function, since a call of one of them
+        may take long enough to be worth running as a task.
+        '''
+
+        graph = self.__call_graph()
+        heavy = [name for (name, define) in self._defines.items()
+                 if any([self.__contains_loop(e) for e in define.body]) or
+                    self.__is_recursive(name, graph)]
+
+        changed = True
+        while changed:
+            changed = False
+
+            for (name, calls) in graph.items():
+                if name not in heavy and any([f in heavy for f in calls]):
+                    heavy.append(name)
+                    changed = True
+
+        return heavy
+
+
+    def __repeated_functions(self):
+        '''
+        Return the names of the user defined functions that may be called
+        many times: those called in a loop or by a recursive function, the
+        recursive functions themselves, and every function they call.
+        '''
+
+        graph = self.__call_graph()
+        repeated = [name for name in self._defines
+                    if self.__is_recursive(name, graph)]
+
+        def find_calls(expr, in_loop):
+            if expr.exprClass == ExprEnum.CALL and in_loop and \
+               expr.name in self._defines and expr.name not in repeated:
+                repeated.append(expr.name)
+
+            in_loop = in_loop or \
+                      expr.exprClass in [ExprEnum.LOOP, ExprEnum.PARA_LOOP,
+                                         ExprEnum.SCAN, ExprEnum.SCATTER_LOOP,
+                                         ExprEnum.FIND_LOOP]
+            for e in self.__sub_exprs(expr):
+                find_calls(e, in_loop)
+
+        for define in self._defines.values():
+            find_calls(define, False)
+
+        changed = True
+        while changed:
+            changed = False
+
+            for name in list(repeated):
+                for f in graph[name]:
+                    if f not in repeated:
+                        repeated.append(f)
+                        changed = True
+
+        return repeated
+
+
+    def __is_task(self, expr, heavy):
+        '''
+        Return true if the statement is worth running as a task: it runs a
+        loop, fills, copies, or compares a list, or calls a function in
+        'heavy'. Statements that create a variable or list are not tasks,
+        since the code after them uses what they create.
+        '''
+
+        if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.LIST]:
+            return False
+
+        def find(e):
+            if e.exprClass == ExprEnum.LIST_OP or \
+               (e.exprClass == ExprEnum.CALL and e.name in heavy):
+                return True
+
+            return any([find(sub) for sub in self.__sub_exprs(e)])
+
+        return self.__contains_loop(expr) or find(expr)
+
+
+    def __schedule_tasks(self, define, summaries, heavy, global_lists,
+                         aliases):
+        '''
+        Run the statements of the function body that are worth it as
+        concurrent tasks. Each statement first waits for the earlier tasks
+        that write something it uses or use something it writes, and the
+        function waits for every task before its result is computed. The body
+        is only changed if at least two tasks can run at the same time.
+        '''
+
+        # The last expression is the result of the function.
+        body = define.body[:-1]
+
+        # List arguments and lists created outside of any function may have
+        # the same elements, so they are treated as a single list, and so are
+        # the lists that 'aliases' says may have the same elements.
+        aliased = global_lists + \
+                  [arg[1] for arg in define.args
+                   if arg[0] in [Type.LIST_INT, Type.LIST_FLOAT,
+                                 Type.LIST_STRING]]
+        classes = {}
+
+        def merge(a, b):
+            (key, old) = (classes.get(a, a), classes.get(b, b))
+            for n in list(classes) + [b]:
+                if classes.get(n, n) == old:
+                    classes[n] = key
+
+        for n in aliased:
+            merge('<list arguments>', n)
+        for (a, others) in aliases.items():
+            for b in others:
+                merge(a, b)
+
+        def canonical(names):
+            return {classes.get(n, n) for n in names}
+
+        is_task = []
+        reads_of = []
+        writes_of = []
+        waits = []
+        after = []       # The tasks that finish before each statement starts
+        waited = set()   # The tasks that the function has waited for
+
+        for e in body:
+            (reads, writes, ordered) = self.__task_effects(e, summaries,
+                                                           aliases)
+            (reads, writes) = (canonical(reads), canonical(writes))
+
+            deps = [j for j in range(len(is_task))
+                    if is_task[j] and j not in waited and
+                       (len(writes_of[j] & reads) > 0 or
+                        len(reads_of[j] & writes) > 0)]
+
+            # A task that another dependency waits for is already finished.
+            implied = set()
+            for j in deps:
+                implied |= after[j]
+
+            waits.append([j for j in deps if j not in implied])
+            after.append(set(deps) | implied | waited)
+
+            task = not ordered and self.__is_task(e, heavy)
+            is_task.append(task)
+
+            reads_of.append(reads)
+            writes_of.append(writes)
+
+            if not task:
+                waited |= after[-1]
+
+        tasks = [k for k in range(len(body)) if is_task[k]]
+        if not any([j not in after[k] for k in tasks for j in tasks if j < k]):
+            return
+
+        # Only the tasks that no other statement waits for need to be joined.
+        finished = waited.copy()
+        for k in tasks:
+            finished |= after[k]
+
+        joins = [k for k in tasks if k not in finished]
+
+        define.body[:] = [Tasks(define.loc, body, is_task, waits, joins),
+                          define.body[-1]]
+
+
+    def __is_midpoint(self, expr, lo, hi):
+        '''
+        Return true if the expression is (lo + hi) / 2 or lo + (hi - lo) / c
+        for a positive literal c, where 'lo' and 'hi' are variable names, so
+        that its value is between the values of the two variables.
+        '''
+
+        def is_var(e, name):
+            return e.exprClass == ExprEnum.GET_VAR and e.name == name
+
+        def is_call(e, name):
+            return e.exprClass == ExprEnum.CALL and e.name == name
+
+        def is_positive(e):
+            return e.exprClass == ExprEnum.LITERAL and e.type == Type.INT and \
+                   e.val > 0
+
+        if is_call(expr, '/'):
+            (num, den) = expr.params
+            return is_call(num, '+') and is_positive(den) and den.val == 2 and \
+                   ((is_var(num.params[0], lo) and
+                     is_var(num.params[1], hi)) or
+                    (is_var(num.params[0], hi) and is_var(num.params[1], lo)))
+
+        if not is_call(expr, '+'):
+            return False
+
+        (a, b) = expr.params
+        for (first, second) in [(a, b), (b, a)]:
+            if is_var(first, lo) and is_call(second, '/') and \
+               is_positive(second.params[1]) and \
+               is_call(second.params[0], '-') and \
+               is_var(second.params[0].params[0], hi) and \
+               is_var(second.params[0].params[1], lo):
+                return True
+
+        return False
+
+
+    def __uses_range(self, define, pos, lo_pos, hi_pos):
+        '''
+        Return true if a call of the recursive function 'define' only uses
+        the elements of its list argument at position 'pos' from the int
+        argument at position 'lo_pos' up to but not including the one at
+        position 'hi_pos'. Every use must be at the index of a loop that counts over the
+        range, in a fill or copy of the range, or in a recursive call on the
+        range or a part of it split at a midpoint, so this holds for every
+        call if it holds inside the function.
+        '''
+
+        list_name = define.args[pos][1]
+        (lo, hi) = (define.args[lo_pos][1], define.args[hi_pos][1])
+
+        writes = []
+        for e in define.body:
+            writes += self.__deep_find_writes(e)
+
+        if lo in writes or hi in writes:
+            return False
+
+        midpoints = []
+
+        def find_midpoints(e):
+            if e.exprClass == ExprEnum.CREATE_VAR and e.type == Type.INT and \
+               writes.count(e.name) == 1 and \
+               self.__is_midpoint(e.val, lo, hi):
+                midpoints.append(e.name)
+
+            for sub in self.__sub_exprs(e):
+                find_midpoints(sub)
+
+        for e in define.body:
+            find_midpoints(e)
+
+        # The range from a midpoint to another is only inside the range from
+        # 'lo' to 'hi' when 'lo' is not greater than 'hi'.
+        def is_part(start, end):
+            if start.exprClass != ExprEnum.GET_VAR or \
+               end.exprClass != ExprEnum.GET_VAR:
+                return False
+
+            return (start.name == lo and end.name in [hi] + midpoints) or \
+                   (start.name in midpoints and end.name == hi)
+
+        def is_list(e):
+            return e.exprClass == ExprEnum.GET_VAR and e.name == list_name
+
+        def check(expr, indices):
+            if expr.exprClass in [ExprEnum.LIST_AT, ExprEnum.LIST_SET] and \
+               expr.name == list_name:
+                if expr.index.exprClass != ExprEnum.GET_VAR or \
+                   expr.index.name not in indices:
+                    return False
+            elif expr.exprClass == ExprEnum.CALL and \
+                 any([is_list(e) for e in expr.params]):
+                if expr.name != define.name or \
+                   [is_list(e) for e in expr.params].count(True) != 1 or \
+                   not is_list(expr.params[pos]) or \
+                   not is_part(expr.params[lo_pos], expr.params[hi_pos]):
+                    return False
+
+                return all([check(e, indices) for e in expr.params
+                            if not is_list(e)])
+            elif is_list(expr):
+                # Any other use of the whole list, like setting another list
+                # to it, may use its elements outside of the range.
+                return False
+            elif expr.exprClass == ExprEnum.LIST_OP and \
+                 list_name in [expr.name, expr.src]:
+                if not is_part(expr.start_index, expr.end_index):
+                    return False
+            elif expr.exprClass in [ExprEnum.PARA_LOOP, ExprEnum.SCAN,
+                                    ExprEnum.SCATTER_LOOP, ExprEnum.FIND_LOOP]:
+                # Kernels copy whole lists to and from the device.
+                if list_name in self.__deep_find_reads(expr) + \
+                                self.__deep_find_writes(expr):
+                    return False
+            elif expr.exprClass == ExprEnum.LOOP:
+                bounds = self.__loop_bounds(expr)
+                if bounds is not None:
+                    (index, start, end, inclusive) = bounds
+                    if not inclusive and is_part(start, end):
+                        return all([check(e, indices) for e in
+                                    [expr.init, expr.test, expr.update]]) and \
+                               all([check(e, indices + [index])
+                                    for e in expr.body])
+
+            return all([check(e, indices) for e in self.__sub_exprs(expr)])
+
+        return all([check(e, []) for e in define.body])
+
+
+    def __fork_range(self, define, summary):
+        '''
+        Return a tuple (lo, hi) of the positions of two int arguments of the
+        recursive function 'define' such that a call only uses the elements
+        of its list arguments from the argument at 'lo' up to but not
+        including the one at 'hi'. Return None if the function uses no lists
+        or there are no such arguments.
+        '''
+
+        lists = [n for n in summary[0] if not isinstance(n, str)]
+        if len(lists) == 0:
+            return None
+
+        ints = [k for k in range(len(define.args))
+                if define.args[k][0] == Type.INT]
+
+        for lo in ints:
+            for hi in ints:
+                if lo != hi and all([self.__uses_range(define, pos, lo, hi)
+                                     for pos in lists]):
+                    return (lo, hi)
+
+        return None
+
+
+    def __fork_calls(self, define, body, summary, span):
+        '''
+        Replace each run of at least two adjacent statements of the body that
+        call the recursive function 'define', or set a variable to such a
+        call, with a Fork when the calls do not use each other's results and
+        either write no lists or write disjoint ranges of them. 'span' is the
+        result of __fork_range.
+        '''
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__fork_calls(define, b, summary, span)
+
+        list_types = [Type.LIST_INT, Type.LIST_FLOAT, Type.LIST_STRING]
+        written = [n for n in summary[1] if not isinstance(n, str)]
+
+        def call_of(e):
+            if e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR] and \
+               e.val.type in [Type.INT, Type.FLOAT]:
+                e = e.val
+
+            if e.exprClass != ExprEnum.CALL or e.name != define.name or \
+               not all([self.__is_pure(p, True) for p in e.params]):
+                return None
+
+            return e
+
+        def reads_list(e):
+            return e.exprClass == ExprEnum.LIST_AT or \
+                   any([reads_list(sub) for sub in self.__sub_exprs(e)])
+
+        def arg_reads(call):
+            names = set()
+            for (arg, p) in zip(define.args, call.params):
+                if arg[0] not in list_types:
+                    names |= set(self.__deep_find_reads(p))
+
+            return names
+
+        def independent(s1, s2):
+            (c1, c2) = (call_of(s1), call_of(s2))
+
+            for (s, c) in [(s1, c2), (s2, c1)]:
+                if s.exprClass != ExprEnum.CALL and s.name in arg_reads(c):
+                    return False
+
+            if s1.exprClass != ExprEnum.CALL and \
+               s2.exprClass != ExprEnum.CALL and s1.name == s2.name:
+                return False
+
+            if len(written) == 0:
+                return True
+
+            # Each call only uses its own range of every list it is given, so
+            # calls on disjoint ranges never use the same element, even if two
+            # of the lists are the same.
+            if span is None or any([reads_list(p) for p in c1.params] +
+                                   [reads_list(p) for p in c2.params]):
+                return False
+
+            (lo, hi) = span
+            return Expr.equal(c1.params[hi], c2.params[lo]) or \
+                   Expr.equal(c2.params[hi], c1.params[lo])
+
+        cutoff = None
+        if span is not None:
+            (lo, hi) = span
+            size = self.__int_call(define.loc, '-',
+                                   [self.__int_get(define.loc,
+                                                   define.args[hi][1]),
+                                    self.__int_get(define.loc,
+                                                   define.args[lo][1])])
+            cutoff = self.__int_call(define.loc, '>=',
+                                     [size, Literal(define.loc, Type.INT,
+                                                    fork_min_size)])
+
+        new_body = []
+        run = []
+
+        def end_run():
+            if len(run) < 2:
+                new_body.extend(run)
+            else:
+                decls = [(e.type, e.name) for e in run
+                         if e.exprClass == ExprEnum.CREATE_VAR]
+                calls = []
+                for e in run:
+                    if e.exprClass == ExprEnum.CREATE_VAR:
+                        e = SetVar(e.loc, e.name, e.val)
+                        e.type = e.val.type
+
+                    calls.append(e)
+
+                new_body.append(Fork(run[0].loc, calls, decls,
+                                     copy.deepcopy(cutoff), fork_depth_limit))
+
+            run.clear()
+
+        for e in body:
+            if call_of(e) is None:
+                end_run()
+                new_body.append(e)
+                continue
+
+            if not all([independent(s, e) for s in run]):
+                end_run()
+
+            run.append(e)
+
+        end_run()
+        body[:] = new_body
+
+
+    def __fold_constants(self, expr):
+        '''
+        Return 'expr' with every primitive call on int literals replaced by the
+        literal value of the call.
+        '''
+
+        self.__map_sub_exprs(expr, self.__fold_constants)
+
+        if expr.exprClass != ExprEnum.CALL or expr.name not in pure_prims:
+            return expr
+
+        for p in expr.params:
+            if p.exprClass != ExprEnum.LITERAL or p.type != Type.INT:
+                return expr
+
+        val = eval_prim(expr.name, [p.val for p in expr.params])
+        if val is None:
+            return expr
+
+        self._changed = True
+        return Literal(expr.loc, Type.INT, val)
+
+
+    def __simplify_identities(self, expr, returned=False):
+        '''
+        Return 'expr' with additions and subtractions of zero and
+        multiplications by one replaced by the other argument. If 'returned'
+        is true, 'expr' is the last expression of a function body, so it is
+        only replaced by a literal, get, or call.
+        '''
+
+        self.__map_sub_exprs(expr, self.__simplify_identities)
+
+        if expr.exprClass != ExprEnum.CALL or \
+           expr.name not in ['+', '-', '*']:
+            return expr
+
+        def is_int(e, val):
+            return e.exprClass == ExprEnum.LITERAL and e.type == Type.INT and \
+                   e.val == val
+
+        def can_return(e):
+            return not returned or \
+                   e.exprClass in [ExprEnum.LITERAL, ExprEnum.GET_VAR,
+                                   ExprEnum.CALL]
+
+        (a, b) = expr.params
+        identity = 1 if expr.name == '*' else 0
+
+        if is_int(b, identity) and can_return(a):
+            self._changed = True
+            return a
+
+        if expr.name != '-' and is_int(a, identity) and can_return(b):
+            self._changed = True
+            return b
+
+        return expr
+
+
+    def __fold_branches(self, body):
+        '''
+        Replace each If expression in the body that has a literal condition with
+        the statements of the branch that is always taken. An If expression does
+        not start a new scope, so the statements can be moved into the body.
+        '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__fold_branches(b)
+
+            if e.exprClass == ExprEnum.IF and \
+               e.cond.exprClass == ExprEnum.LITERAL and \
+               e.cond.type == Type.INT:
+                new_body += e.then if e.cond.val != 0 else e.otherwise
+                self._changed = True
+            else:
+                new_body.append(e)
+
+        body[:] = new_body
+
+
+    def __binding(self, expr, name):
+        '''
+        Return a key for the variable that 'name' refers to in the environment
+        of 'expr'. Variables in different scopes that have the same name get
+        different keys. Variables in sibling scopes may share a key, so a key
+        that is created more than once is never treated as a constant.
+        '''
+
+        return (name, expr.env.get_index_for_name(name))
+
+
+    def __find_constant_vars(self, expr, consts, unknown_sets):
+        '''
+        Add each variable created or set by the expression to 'consts', mapping
+        its key to the Literal it always holds, or to None if it can hold more
+        than one value. The names of variables set by expressions that have no
+        environment are added to 'unknown_sets'.
+        '''
+
+        if expr.exprClass == ExprEnum.CREATE_VAR and expr.env is not None:
+            key = self.__binding(expr, expr.name)
+            is_const = expr.val.exprClass == ExprEnum.LITERAL and \
+                       expr.type in [Type.INT, Type.FLOAT]
+
+            consts[key] = expr.val if is_const and key not in consts else None
+        elif expr.exprClass == ExprEnum.SET_VAR:
+            if expr.env is None:
+                unknown_sets.append(expr.name)
+            else:
+                consts[self.__binding(expr, expr.name)] = None
+
+                # Setting a list to another list also changes its size.
+                if expr.type in [Type.LIST_INT, Type.LIST_FLOAT,
+                                 Type.LIST_STRING]:
+                    key = self.__binding(expr, f'{expr.name}.size')
+                    consts[key] = None
+        elif expr.exprClass == ExprEnum.LIST and expr.env is not None:
+            # The size of a list never changes after it is created.
+            key = self.__binding(expr, f'{expr.name}.size')
+            is_const = expr.size.exprClass == ExprEnum.LITERAL
+
+            consts[key] = expr.size if is_const and key not in consts else None
+
+        for e in self.__sub_exprs(expr):
+            self.__find_constant_vars(e, consts, unknown_sets)
+
+
+    def __replace_constant_vars(self, expr, consts):
+        '''
+        Return 'expr' with every read of a constant variable replaced by the
+        variable's value.
+        '''
+
+        if expr.exprClass == ExprEnum.GET_VAR:
+            if expr.env is None:
+                return expr
+
+            lit = consts.get(self.__binding(expr, expr.name))
+            if lit is None:
+                return expr
+
+            self._changed = True
+            return Literal(expr.loc, lit.type, lit.val)
+
+        self.__map_sub_exprs(expr,
+                             lambda e: self.__replace_constant_vars(e, consts))
+        return expr
+
+
+    def __propagate_constants(self, define):
+        '''
+        Fold constant expressions in the function and replace reads of
+        variables that always hold the same literal with that literal. This is
+        repeated until nothing changes, since replacing a variable may let more
+        expressions be folded and folding may make more variables constant.
+        '''
+
+        while True:
+            self._changed = False
+
+            for (i, e) in enumerate(define.body):
+                returned = i == len(define.body) - 1
+                define.body[i] = self.__fold_constants(e)
+                define.body[i] = self.__evaluate_pure_calls(define.body[i])
+                define.body[i] = self.__simplify_identities(define.body[i],
+                                                            returned)
+
+            self.__fold_branches(define.body)
+
+            consts = {}
+            unknown_sets = []
+            for e in define.body:
+                self.__find_constant_vars(e, consts, unknown_sets)
+
+            for key in consts:
+                if key[0] in unknown_sets:
+                    consts[key] = None
+
+            for (i, e) in enumerate(define.body):
+                define.body[i] = self.__replace_constant_vars(e, consts)
+
+            if not self._changed:
+                return
+
+
+    def __read_keys(self, expr, env):
+        '''
+        Return the keys of every variable read by the expression. Expressions
+        that were not given an environment by the type checker, such as the
+        extra arguments of print, use the environment 'env' of their parent.
+        '''
+
+        if expr.env is not None:
+            env = expr.env
+
+        keys = []
+        if expr.exprClass == ExprEnum.GET_VAR:
+            keys.append((expr.name, env.get_index_for_name(expr.name)))
+
+        for e in self.__sub_exprs(expr):
+            keys += self.__read_keys(e, env)
+
+        return keys
+
+
+    def __find_nested_write_keys(self, expr, is_stmt, keys):
+        '''
+        Add to 'keys' the key of every variable that is created or set by an
+        expression that is not a statement in a list of statements, since those
+        expressions cannot be removed on their own.
+        '''
+
+        if expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR] and \
+           not is_stmt and expr.env is not None:
+            keys.append(self.__binding(expr, expr.name))
+
+        stmts = []
+        for b in self.__bodies(expr):
+            stmts += b
+
+        for e in self.__sub_exprs(expr):
+            self.__find_nested_write_keys(e, e in stmts, keys)
+
+
+    def __is_removable_store(self, expr):
+        '''
+        Return true if the expression is a CreateVar or SetVar whose variable
+        could be unused. Variables created outside of functions may be read by
+        other functions, so their stores are never removed.
+        '''
+
+        return expr.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR] and \
+               expr.type in [Type.INT, Type.FLOAT] and \
+               expr.env is not None and \
+               expr.name not in self._global_names
+
+
+    def __remove_stores(self, body, is_dead):
+        '''
+        Remove each CreateVar and SetVar in the body for which 'is_dead' is true.
+        If computing the stored value has side effects, the value is still
+        computed.
+        '''
+
+        new_body = []
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__remove_stores(b, is_dead)
+
+            if self.__is_removable_store(e) and is_dead(e):
+                self._changed = True
+
+                if not self.__is_pure(e.val, allow_traps=True):
+                    new_body.append(e.val)
+
+                continue
+
+            # An If expression that does nothing can be removed.
+            if e.exprClass == ExprEnum.IF and len(e.then) == 0 and \
+               len(e.otherwise) == 0 and \
+               self.__is_pure(e.cond, allow_traps=True):
+                self._changed = True
+                continue
+
+            new_body.append(e)
+
+        body[:] = new_body
+
+
+    def __remove_unused_vars(self, define):
+        ''' Remove every store to a variable that is never read. '''
+
+        read_keys = []
+        nested_keys = []
+
+        for e in define.body:
+            read_keys += self.__read_keys(e, define.env)
+            self.__find_nested_write_keys(e, True, nested_keys)
+
+        def is_dead(e):
+            key = self.__binding(e, e.name)
+            return key not in read_keys and key not in nested_keys
+
+        self.__remove_stores(define.body, is_dead)
+
+
+    def __remove_dead_sets(self, body, live, break_live=None):
+        '''
+        Remove each SetVar in the body whose value is always set again or never
+        read afterwards. 'live' holds the keys of variables that may be read
+        after the body, and 'break_live' those that may be read after a Break
+        in the body leaves the loop. Return the keys of variables that may be
+        read before they are set when the body starts.
+        '''
+
+        live = list(live)
+
+        for i in range(len(body) - 1, -1, -1):
+            e = body[i]
+
+            if e.exprClass == ExprEnum.SET_VAR and \
+               self.__is_removable_store(e) and \
+               self.__binding(e, e.name) not in live:
+                self._changed = True
+
+                if self.__is_pure(e.val, allow_traps=True):
+                    del body[i]
+                    continue
+
+                # The value must still be computed for its side effects.
+                body[i] = e.val
+                live += self.__read_keys(e.val, e.env)
+            elif e.exprClass in [ExprEnum.CREATE_VAR, ExprEnum.SET_VAR] and \
+                 e.env is not None:
+                key = self.__binding(e, e.name)
+                live = [k for k in live if k != key]
+                live += self.__read_keys(e.val, e.env)
+            elif e.exprClass == ExprEnum.IF:
+                then_live = self.__remove_dead_sets(e.then, live, break_live)
+                else_live = self.__remove_dead_sets(e.otherwise, live,
+                                                    break_live)
+                live = self.__read_keys(e.cond, e.env) + then_live + else_live
+            elif e.exprClass == ExprEnum.LOOP:
+                # Any variable read in the loop may be read by a later
+                # iteration, and the body may not run at all, so nothing set in
+                # the body is dead after the loop.
+                live += self.__read_keys(e, e.env)
+                self.__remove_dead_sets(e.body, live, live)
+            elif e.exprClass == ExprEnum.BREAK:
+                # The statements after a Break do not run.
+                live = list(break_live)
+            else:
+                live += self.__read_keys(e, e.env)
+
+        return live
+
+
+    def __full_list_writes(self, loop, lists, aliases):
+        '''
+        Return the names of the lists in 'lists' that have every element set by
+        the loop, in a way that does not depend on the elements of the list.
+        'lists' maps list names to the size expression of the list, and
+        'aliases' maps list names to the lists that may have the same elements.
+        '''
+
+        init = loop.init
+        if init.exprClass != ExprEnum.CREATE_VAR or \
+           init.val.exprClass != ExprEnum.LITERAL or init.val.val != 0:
+            return []
+
+        index = init.name
+
+        # The update should add one to the index.
+        update = loop.update
+        if update.exprClass != ExprEnum.SET_VAR or update.name != index:
+            return []
+
+        one = Literal(update.loc, Type.INT, 1)
+        index_expr = GetVar(update.loc, index)
+        index_expr.type = Type.INT
+        incr = Call(update.loc, '+', [index_expr, one])
+        if not Expr.equal(update.val, incr):
+            return []
+
+        # The test should compare the index to the size of the list.
+        test = loop.test
+        if test.exprClass != ExprEnum.CALL or test.name != '<' or \
+           not Expr.equal(test.params[0], index_expr):
+            return []
+
+        end = test.params[1]
+
+        for e in loop.body:
+            if index in self.__deep_find_writes(e) or self.__breaks_loop(e):
+                return []
+
+        written = []
+        reads = self.__deep_find_reads(loop)
+
+        for e in loop.body:
+            if e.exprClass != ExprEnum.LIST_SET or e.name not in lists or \
+               not Expr.equal(e.index, index_expr) or \
+               any([n in reads for n in [e.name] + aliases.get(e.name, [])]):
+                continue
+
+            size = lists[e.name]
+            covers_list = \
+                (end.exprClass == ExprEnum.GET_VAR and \
+                 end.name == f'{e.name}.size') or \
+                (end.exprClass == ExprEnum.LITERAL and \
+                 size.exprClass == ExprEnum.LITERAL and end.val == size.val)
+
+            if covers_list and e.name not in written:
+                written.append(e.name)
+
+        return written
+
+
+    def __refers_to_list(self, expr, name):
+        ''' Return true if the expression reads or sets the list 'name'. '''
+
+        if expr.exprClass in [ExprEnum.LIST_AT, ExprEnum.LIST_SET,
+                              ExprEnum.GET_VAR, ExprEnum.LIST] and \
+           expr.name == name:
+            return True
+
+        for e in self.__sub_exprs(expr):
+            if self.__refers_to_list(e, name):
+                return True
+
+        return False
+
+
+    def __remove_dead_list_inits(self, body, lists, aliases):
+        '''
+        Remove the list_set expressions of loops that set every element of a
+        list when the next use of the list is another loop that sets every
+        element of the list again. 'lists' maps the names of the lists created
+        in the function to their size expressions. 'aliases' maps list names
+        to the lists that may have the same elements, and a use of any of
+        those lists is a use of the list.
+        '''
+
+        for e in body:
+            for b in self.__bodies(e):
+                self.__remove_dead_list_inits(b, lists, aliases)
+
+        for (i, e) in enumerate(body):
+            if e.exprClass != ExprEnum.LOOP:
+                continue
+
+            for name in self.__full_list_writes(e, lists, aliases):
+                names = [name] + aliases.get(name, [])
+
+                def refers(expr):
+                    return any([self.__refers_to_list(expr, n) for n in names])
+
+                # Every use of the list in this loop must be a list_set that
+                # can be removed.
+                sets = [s for s in e.body
+                        if s.exprClass == ExprEnum.LIST_SET and s.name == name]
+                others = [s for s in e.body if s not in sets]
+
+                if any([refers(s) for s in others]) or \
+                   not all([self.__is_pure(s.index, allow_traps=True) and \
+                            self.__is_pure(s.val, allow_traps=True)
+                            for s in sets]):
+                    continue
+
+                # Find the next statement that uses the list.
+                for later in body[i + 1:]:
+                    if not refers(later):
+                        continue
+
+                    if later.exprClass == ExprEnum.LOOP and \
+                       name in self.__full_list_writes(later, lists, aliases):
+                        e.body[:] = others
+                        self._changed = True
+
+                    break
+
+        # Remove the loops that no longer do anything. These loops always
+        # terminate since they count up to the size of a list.
+        body[:] = [e for e in body
+                   if e.exprClass != ExprEnum.LOOP or len(e.body) > 0]
+
+
+    def __eliminate_dead_code(self, define):
+        '''
+        Remove stores to variables that are never read, stores that are always
+        overwritten before being read, and loops that initialize a list that is
+        completely overwritten before being read. This is repeated until
+        nothing changes, since removing a store may make other stores dead.
+        '''
+
+        # Lists created more than once in the function are ignored so that
+        # lists in different scopes are not confused.
+        list_exprs = []
+
+        def find_lists(expr):
+            if expr.exprClass == ExprEnum.LIST:
+                list_exprs.append(expr)
+
+            for e in self.__sub_exprs(expr):
+                find_lists(e)
+
+        find_lists(define)
+
+        names = [l.name for l in list_exprs]
+        lists = {l.name: l.size for l in list_exprs
+                 if names.count(l.name) == 1 and l.name not in self._global_names}
+
+        aliases = self.__find_list_aliases()[define.name]
+
+        while True:
+            self._changed = False
+
+            self.__remove_unused_vars(define)
+            self.__remove_dead_sets(define.body, [])
+            self.__remove_dead_list_inits(define.body, lists, aliases)
+
+            if not self._changed:
+                return
+
+
+    def __reset_types(self, expr):
+        '''
+        Undo the type and environment information added by the type checker
+        so that the code can be type checked again after it is changed.
+        '''
+
+        expr.env = None
+
+        if expr.exprClass in [ExprEnum.SET_VAR, ExprEnum.GET_VAR,
+                              ExprEnum.CALL, ExprEnum.LIST,
+                              ExprEnum.LIST_AT]:
+            expr.type = Type.UNDETERMINED
+
+        for e in self.__sub_exprs(expr):
+            self.__reset_types(e)
+
+
+    def __retype(self):
+        ''' Type check the code again so new expressions have types and envs. '''
+
+        for e in self.parsed_exprs:
+            self.__reset_types(e)
+
+        TypeChecker(self.parsed_exprs).validate_exprs()
+
+
+    def optimize(self):
+        ''' Optimize each parsed expression. '''
+
+        self.__collect_names()
+
+        defines = [e for e in self.parsed_exprs
+                   if e.exprClass == ExprEnum.DEFINE]
+
+        self.__inline_functions(defines)
+        self.__retype()
+
+        # Constant propagation computes calls of functions without side
+        # effects on literals.
+        self._pure_funcs = self.__pure_functions()
+
+        for e in defines:
+            self.__propagate_constants(e)
+
+        self.__retype()
+
+        # Calls with constant arguments use a copy of the function that
+        # constant propagation can then simplify.
+        self.__specialize_calls()
+        self.__retype()
+        self._pure_funcs = self.__pure_functions()
+
+        defines = [e for e in self.parsed_exprs
+                   if e.exprClass == ExprEnum.DEFINE]
+
+        # Rewriting induction variables leaves arithmetic on the loop start
+        # value that constant propagation can simplify.
+        for e in defines:
+            self.__rewrite_all_induction_vars(e.body)
+
+        self.__retype()
+
+        for e in defines:
+            self.__propagate_constants(e)
+
+        self.__retype()
+
+        for e in defines:
+            self.__eliminate_dead_code(e)
+
+        self.__retype()
+
+        for e in defines:
+            self.__optimize_body(e.body)
+
+        self.__retype()
+
+
+    def memoize_functions(self, memo_size=None):
+        '''
+        Make each recursive function that has no side effects, only int
+        arguments, and an int or float result remember the results of its
+        recent calls in a table with 'memo_size' entries, so that calls with
+        the same arguments are not computed again. If 'memo_size' is None,
+        memo_table_size entries are used, and if it is 0, no results are
+        remembered.
+        '''
+
+        if memo_size is None:
+            memo_size = memo_table_size
+
+        if memo_size == 0:
+            return
+
+        self._defines = {e.name: e for e in self.parsed_exprs
+                         if e.exprClass == ExprEnum.DEFINE}
+        graph = self.__call_graph()
+
+        for name in self.__pure_functions():
+            define = self._defines[name]
+
+            if len(define.args) > 0 and \
+               all([arg[0] == Type.INT for arg in define.args]) and \
+               define.type in [Type.INT, Type.FLOAT] and \
+               self.__is_recursive(name, graph):
+                define.memo_size = memo_size
+
+
+    def tile_loops(self, tile_size=None):
+        '''
+        Run each perfect nest of two sequential loops whose outer iterations
+        are independent in tiles, so that the list elements used by a tile are
+        reused from the cache. If 'tile_size' is None, the number of iterations
+        of each loop in a tile is chosen from the lists the nest uses, and if
+        it is 0, no loops are tiled. Like strength reduction, this must run
+        after the analyzer so that loops that can run on the GPU are not
+        tiled.
+        '''
+
+        if tile_size == 0:
+            return
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__tile_all_loops(e.body, tile_size)
+
+
+    def interchange_loops(self, parallel):
+        '''
+        Swap the loops of each perfect nest of two loops where the other order
+        uses the cache better, or, if 'parallel' is true, where the other
+        order lets the analyzer run the outer loop in parallel. This must run
+        just before the analyzer, since the best order depends on whether the
+        loops will be parallelized.
+        '''
+
+        self._changed = False
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__interchange_all_loops(e.body, parallel)
+
+        if self._changed:
+            self.__retype()
+
+
+    def unroll_loops(self, factor=1):
+        '''
+        Replace each innermost sequential loop with a few iterations known
+        before the program runs by a copy of its body for each iteration. If
+        'factor' is at least 2, other innermost loops that count up by one run
+        'factor' copies of their body per iteration, and if it is 0, no loops
+        are unrolled. This must run after strength reduction, which only
+        handles loops that count by one.
+        '''
+
+        if factor == 0:
+            return
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__unroll_all_loops(e.body, factor)
+
+
+    def replace_scalars(self):
+        '''
+        Keep each list element that a sequential loop uses at the same index
+        in every iteration in a variable while the loop runs, and reuse list
+        elements already read into a variable. The lists that may have the
+        same elements as another list are found from the calls in the whole
+        program. Like strength reduction, this adds variables that every
+        iteration of a loop sets, so it must run after the analyzer.
+        '''
+
+        aliases = self.__find_list_aliases()
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                elem_types = self.__list_elem_types(e)
+                self.__forward_list_loads(e.body, aliases[e.name])
+                self.__scalar_replace_all_loops(e.body, aliases[e.name],
+                                                elem_types)
+
+
+    def convert_ifs(self):
+        '''
+        Replace each small If in the body of a parallel loop or an innermost
+        sequential loop, whose branches only set variables and list elements,
+        by sets of a value chosen by the condition, so that GPU threads do not
+        take different branches and the C++ compiler can vectorize the loop.
+        Like strength reduction, this must run after the analyzer, which does
+        not know about Select expressions.
+        '''
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__convert_all_ifs(e.body, False)
+
+
+    def schedule_tasks(self):
+        '''
+        Run the statements of each function that contain loops or calls of
+        functions with loops as concurrent tasks when they do not use each
+        other's variables and lists, and run the independent recursive calls
+        of each recursive function at the same time. This must run last,
+        after every pass that changes loops, since the generator runs each
+        task as it is.
+        '''
+
+        self._defines = {e.name: e for e in self.parsed_exprs
+                         if e.exprClass == ExprEnum.DEFINE}
+        summaries = self.__function_effects()
+        heavy = self.__heavy_functions()
+        global_lists = [e.name for e in self.parsed_exprs
+                        if e.exprClass == ExprEnum.LIST]
+        aliases = self.__find_list_aliases()
+
+        # Starting threads in every call of a function that is called many
+        # times would cost more than it saves.
+        repeated = self.__repeated_functions()
+
+        graph = self.__call_graph()
+
+        for define in self._defines.values():
+            if define.name not in repeated:
+                self.__schedule_tasks(define, summaries, heavy, global_lists,
+                                      aliases[define.name])
+                continue
+
+            # Recursive functions instead run their own independent recursive
+            # calls at the same time, which only works if the calls change no
+            # variables or tables outside of the function.
+            summary = summaries[define.name]
+            if not self.__is_recursive(define.name, graph) or \
+               define.memo_size > 0 or summary[2] or \
+               any([isinstance(n, str) for n in summary[1]]):
+                continue
+
+            # The last expression is the result of the function.
+            body = define.body[:-1]
+            self.__fork_calls(define, body, summary,
+                              self.__fork_range(define, summary))
+            define.body[:-1] = body
+
+
+    def reduce_strength(self):
+        '''
+        Replace multiplications by the index of each sequential loop with
+        additions. This adds a variable that every iteration of the loop sets,
+        which would stop the analyzer from parallelizing the loop, so it must
+        run after the analyzer.
+        '''
+
+        for e in self.parsed_exprs:
+            if e.exprClass == ExprEnum.DEFINE:
+                self.__reduce_all_strength(e.body)
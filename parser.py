@@ -6,7 +6,8 @@ from type import Type
 
 # Keywords cannot be used for function/variable names etc.
 keywords = ['lit', 'val', 'set', 'get', 'define', 'call', 'if', 'then', 'else',
-            'loop', 'seq_loop', 'do', 'list', 'list_at', 'list_set']
+            'loop', 'seq_loop', 'par_loop', 'do', 'break', 'list', 'list_at',
+            'list_set']
 
 
 class Parser:
@@ -191,8 +192,11 @@ class Parser:
             return self.__parse_call(start_point_loc)
         elif word == 'if':
             return self.__parse_if(start_point_loc)
-        elif word == 'loop' or word == 'seq_loop':
-            return self.__parse_loop(start_point_loc, word == 'seq_loop')
+        elif word == 'loop' or word == 'seq_loop' or word == 'par_loop':
+            return self.__parse_loop(start_point_loc, word == 'seq_loop',
+                                     word == 'par_loop')
+        elif word == 'break':
+            return self.__parse_break(start_point_loc)
         elif word == 'list':
             return self.__parse_list(start_point_loc)
         elif word == 'list_at':
@@ -456,7 +460,7 @@ class Parser:
         return If(loc, if_cond, if_then, if_else)
 
 
-    def __parse_loop(self, start_point_loc, no_parallelization):
+    def __parse_loop(self, start_point_loc, no_parallelization, trusted):
         '''
         Private function to parse a single LOOP expression. The _file
         variable should be in a state starting with (without quotes):
@@ -466,6 +470,10 @@ class Parser:
         If 'no_parallelization' is true, then the loop will not be
         parallelized, even if it is possible to do so.
 
+        If 'trusted' is true, then the iterations of the loop are known to be
+        independent, so the loop is parallelized without checking how the
+        iterations use lists.
+
         Returns an instance of Loop()
         '''
 
@@ -492,7 +500,19 @@ class Parser:
         # Now the entire loop expression has been parsed.
         loc = start_point_loc.span(self.__get_point_loc())
         return Loop(loc, loop_init, loop_test, loop_update, loop_body,
-                    no_parallelization)
+                    no_parallelization, trusted)
+
+
+    def __parse_break(self, start_point_loc):
+        '''
+        Private function to parse a single BREAK expression. The '(break)'
+        has already been read, including the final ')'.
+
+        Returns an instance of Break()
+        '''
+
+        loc = start_point_loc.span(self.__get_point_loc())
+        return Break(loc)
 
 
     def __parse_list(self, start_point_loc):
@@ -570,25 +590,26 @@ class Parser:
             self._parsed_exprs.append(PrimFunc(l, ret_type, name, arg_types))
 
         l = Location('primitives', 0, 0, 0, 0)
-        add_prim(l, Type.INT, '+',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '-',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '*',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '/',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '%',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '>',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '>=',     [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '<',      [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '<=',     [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '==',     [Type.INT, Type.INT])
-        add_prim(l, Type.INT, '!=',     [Type.INT, Type.INT])
-        add_prim(l, Type.INT, 'or',     [Type.INT, Type.INT])
-        add_prim(l, Type.INT, 'and',    [Type.INT, Type.INT])
-        add_prim(l, Type.INT, 'xor',    [Type.INT, Type.INT])
-
-        add_prim(l, Type.INT, 'not',    [Type.INT])
-        add_prim(l, Type.INT, 'rand',   [])
-        add_prim(l, Type.INT, 'srand',  [Type.INT])
-        add_prim(l, Type.INT, 'time',   [Type.INT])
+        add_prim(l, Type.INT, '+',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '-',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '*',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '/',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '%',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '>',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '>=',      [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '<',       [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '<=',      [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '==',      [Type.INT, Type.INT])
+        add_prim(l, Type.INT, '!=',      [Type.INT, Type.INT])
+        add_prim(l, Type.INT, 'or',      [Type.INT, Type.INT])
+        add_prim(l, Type.INT, 'and',     [Type.INT, Type.INT])
+        add_prim(l, Type.INT, 'xor',     [Type.INT, Type.INT])
+
+        add_prim(l, Type.INT, 'not',     [Type.INT])
+        add_prim(l, Type.INT, 'rand',    [])
+        add_prim(l, Type.INT, 'rand_at', [Type.INT, Type.INT])
+        add_prim(l, Type.INT, 'srand',   [Type.INT])
+        add_prim(l, Type.INT, 'time',    [Type.INT])
 
 
         # Parse the code in the file.
@@ -0,0 +1,121 @@
+# Map from primitive binary function name to the cpp equivalent function name.
+# Note: If this is updated, Parser.parse() must also be updated for the new
+# primitive functions to pass type checking and be used.
+prim_binary_funcs = {'+': '+',
+                     '-': '-',
+                     '*': '*',
+                     '/': '/',
+                     '%': '%',
+                     '>': '>',
+                     '>=': '>=',
+                     '<': '<',
+                     '<=': '<=',
+                     '==': '==',
+                     '!=': '!=',
+                     'or': '||',
+                     'and': '&&',
+                     'xor': '^'}
+
+# Map from other primitive functions to the cpp equivalent.
+# Note: If this is updated, Parser.parse() must also be updated for the new
+# primitive functions to pass type checking and be used.
+prim_other_funcs = {'print': 'printf',
+                    'not': '!',
+                    'rand': '(int) random',
+                    'rand_at': 'zb_rand_at',
+                    'srand': 'srandom',
+                    'time': 'time'}
+
+# Primitive functions that have side effects or whose result can change between
+# calls. Calls to these functions are never moved, merged, or removed by the
+# optimizer.
+impure_prims = ['print', 'rand', 'srand', 'time']
+
+# Primitive functions that may crash the program (division by zero) and so must
+# not be evaluated in places where the original code would not evaluate them.
+trapping_prims = ['/', '%']
+
+
+# The constants of the Philox-2x32 counter-based generator used by rand_at. The
+# C++ version in the generated code must use the same values.
+philox_multiplier = 0xD256D193
+philox_key_step = 0x9E3779B9
+philox_rounds = 10
+
+
+def rand_at(seed, counter):
+    '''
+    Return the value that rand_at computes for 'seed' and 'counter': the
+    first output word of Philox-2x32 with 'counter' as the counter and 'seed'
+    as the key, shifted so that it is a nonnegative int like rand().
+    '''
+
+    (c0, c1) = (counter & 0xffffffff, 0)
+    key = seed & 0xffffffff
+
+    for _ in range(philox_rounds):
+        product = philox_multiplier * c0
+        (c0, c1) = ((product >> 32) ^ key ^ c1, product & 0xffffffff)
+        key = (key + philox_key_step) & 0xffffffff
+
+    return c0 >> 1
+
+
+def eval_prim(name, vals):
+    '''
+    Return the value that the C++ code computes for the primitive function
+    'name' called on the int values 'vals', or None if the value cannot be
+    computed at compile time (the function is not pure, the call would divide
+    by zero, or the result does not fit in a C++ int).
+    '''
+
+    if name == 'not':
+        result = int(vals[0] == 0)
+    elif name == 'rand_at':
+        result = rand_at(vals[0], vals[1])
+    elif name in prim_binary_funcs and len(vals) == 2:
+        (a, b) = vals
+
+        if name == '+':
+            result = a + b
+        elif name == '-':
+            result = a - b
+        elif name == '*':
+            result = a * b
+        elif name == '/' or name == '%':
+            if b == 0:
+                return None
+
+            # C++ rounds the quotient toward zero.
+            quotient = abs(a) // abs(b)
+            if (a < 0) != (b < 0):
+                quotient = -quotient
+
+            result = quotient if name == '/' else a - b * quotient
+        elif name == '>':
+            result = int(a > b)
+        elif name == '>=':
+            result = int(a >= b)
+        elif name == '<':
+            result = int(a < b)
+        elif name == '<=':
+            result = int(a <= b)
+        elif name == '==':
+            result = int(a == b)
+        elif name == '!=':
+            result = int(a != b)
+        elif name == 'or':
+            result = int(a != 0 or b != 0)
+        elif name == 'and':
+            result = int(a != 0 and b != 0)
+        elif name == 'xor':
+            result = a ^ b
+        else:
+            return None
+    else:
+        return None
+
+    if result < -2**31 or result >= 2**31:
+        return None
+
+    return result
@@ -10,6 +10,7 @@ class TypeChecker:
     def __init__(self, _parsed_exprs):
         self.parsed_exprs = _parsed_exprs  # Type list of Expr's
         self._env = env.Env()
+        self._loop_depth = 0  # The number of loop bodies being validated
 
 
     def __validate_type_of_value(self, loc, t, v):
@@ -52,6 +53,8 @@ class TypeChecker:
             self.__validate_list_set_expr_type(expr)
         elif expr.exprClass == ExprEnum.PRIM_FUNC:
             self.__validate_prim_func_type(expr)
+        elif expr.exprClass == ExprEnum.BREAK:
+            self.__validate_break_expr_type(expr)
         else:
             error_str = f'unknown expression type: {expr.exprClass}'
             raise error.InternalError(expr.loc, error_str)
@@ -143,10 +146,16 @@ class TypeChecker:
             # arg[0] is the type and arg[1] is the name.
             self._env.add(arg[1], [arg[0]], True)
 
-        # Validate all of body expressions.
+        # Validate all of body expressions. A break in the body cannot leave
+        # a loop that calls the function.
+        loop_depth = self._loop_depth
+        self._loop_depth = 0
+
         for e in expr.body:
             self.__validate_single_expr(e)
 
+        self._loop_depth = loop_depth
+
         # The last body expression is returned from the function, so it must
         # have the correct type.
         if len(expr.body) == 0:
@@ -235,13 +244,24 @@ class TypeChecker:
         self.__validate_single_expr(expr.test)
         self.__validate_single_expr(expr.update)
 
+        self._loop_depth += 1
         for e in expr.body:
             self.__validate_single_expr(e)
+        self._loop_depth -= 1
 
         # The body scope ended.
         self._env.pop_scope(expr.loc)
 
 
+    def __validate_break_expr_type(self, expr):
+        ''' Typecheck and add environment data for a single Break Expr. '''
+
+        # A Break leaves the innermost loop, so it must be in a loop body.
+        if self._loop_depth == 0:
+            error_str = f'break used outside of a loop body'
+            raise error.Syntax(expr.loc, error_str)
+
+
     def __validate_list_expr_type(self, expr):
         ''' Typecheck and add environment data for a single List Expr. '''
 